@@ -0,0 +1,77 @@
+# Production server settings, read by gunicorn from this directory:
+#
+#   gunicorn littlelemon.wsgi
+#   GUNICORN_WORKER_CLASS=uvicorn.workers.UvicornWorker gunicorn littlelemon.asgi
+#
+# Set ADMIN_ENABLED=0 and API_DOCS_ENABLED=0 to leave the admin and the API
+# docs out of the workers. /async/orders/events/ streams only under the
+# uvicorn worker; sync workers answer it with a 501.
+
+import gc
+import multiprocessing
+import os
+import time
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'sync')
+threads = int(os.environ.get('GUNICORN_THREADS', 1))
+
+# Without REDIS_URL the caches, throttle counters, idempotency keys and
+# order events live in process memory, and every worker would see its
+# own. Serve from one process then, turning the requested workers into
+# threads. GUNICORN_ALLOW_LOCAL_STATE=1 keeps the workers anyway (for
+# benchmarks, or when none of that matters).
+_requested_workers = workers
+if workers > 1 and not os.environ.get('REDIS_URL') and os.environ.get('GUNICORN_ALLOW_LOCAL_STATE') != '1':
+    workers = 1
+    if worker_class == 'sync':
+        threads = max(threads, _requested_workers)
+
+# Import the app once in the master. Workers are forked from it and share
+# its memory until they write to it, and a new worker starts in a few ms.
+preload_app = True
+
+# Replace each worker after this many requests, give or take the jitter so
+# they do not all restart at once, to bound memory growth
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 2000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 200))
+
+timeout = 30
+graceful_timeout = 30
+keepalive = 5
+accesslog = '-'
+
+_started = time.monotonic()
+
+
+def when_ready(server):
+    server.log.info('Application loaded in %.0f ms', (time.monotonic() - _started) * 1000)
+    if workers < _requested_workers:
+        server.log.warning(
+            'REDIS_URL is not set: running 1 worker instead of %s so caches, throttles and '
+            'order events stay consistent', _requested_workers,
+        )
+    # Move everything loaded so far out of the garbage collector's reach, so
+    # collections in the workers do not write to (and copy) the shared pages
+    gc.freeze()
+
+
+def pre_fork(server, worker):
+    # Connections opened while loading the app must not be shared
+    from django.db import connections
+    connections.close_all()
+
+
+def post_fork(server, worker):
+    worker.forked_at = time.monotonic()
+
+
+def post_worker_init(worker):
+    from restaurant.startup import memory_kib
+
+    memory = memory_kib()
+    worker.log.info(
+        'Worker %s ready in %.0f ms, rss %s KiB, pss %s KiB',
+        worker.pid, (time.monotonic() - worker.forked_at) * 1000, memory['rss_kib'], memory['pss_kib'],
+    )
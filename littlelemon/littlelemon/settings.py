@@ -10,6 +10,8 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
+import time
 from pathlib import Path
 from datetime import timedelta
 
@@ -31,6 +33,12 @@ ALLOWED_HOSTS = []
 
 # Application definition
 
+# The admin and the /swagger/ and /redoc/ docs can be left out of
+# production processes. The docs are only imported on their first request
+# either way.
+ADMIN_ENABLED = os.environ.get('ADMIN_ENABLED', '1') != '0'
+API_DOCS_ENABLED = os.environ.get('API_DOCS_ENABLED', '1') != '0'
+
 INSTALLED_APPS = [
     'django.contrib.admin',
     'django.contrib.auth',
@@ -46,15 +54,23 @@ INSTALLED_APPS = [
     'rest_framework_simplejwt',
     'drf_yasg',
 ]
+if not ADMIN_ENABLED:
+    INSTALLED_APPS.remove('django.contrib.admin')
+if not API_DOCS_ENABLED:
+    INSTALLED_APPS.remove('drf_yasg')
 
 MIDDLEWARE = [
+    'restaurant.middleware.PerfMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'restaurant.middleware.CompressionMiddleware',
+    'django.middleware.http.ConditionalGetMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'restaurant.middleware.ReplicaReadMiddleware',
 ]
 
 ROOT_URLCONF = 'littlelemon.urls'
@@ -80,13 +96,62 @@ WSGI_APPLICATION = 'littlelemon.wsgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
-
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# SQLite by default; set DB_ENGINE=postgres and the DB_* variables below for
+# Postgres. DB_REPLICA_HOST adds a read replica for menu and category GETs.
+
+if os.environ.get('DB_ENGINE') == 'postgres':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('DB_NAME', 'littlelemon'),
+            'USER': os.environ.get('DB_USER', ''),
+            'PASSWORD': os.environ.get('DB_PASSWORD', ''),
+            'HOST': os.environ.get('DB_HOST', ''),
+            'PORT': os.environ.get('DB_PORT', ''),
+            # Keep connections open between requests and ping them before reuse
+            'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 60)),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {},
+        }
     }
-}
+    if os.environ.get('DB_POOL'):
+        # psycopg's pool replaces persistent connections, which Django
+        # refuses to combine with it
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', 2)),
+            'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', 10)),
+        }
+    if os.environ.get('DB_REPLICA_HOST'):
+        DATABASES['replica'] = {
+            **DATABASES['default'],
+            'HOST': os.environ['DB_REPLICA_HOST'],
+            'PORT': os.environ.get('DB_REPLICA_PORT', DATABASES['default']['PORT']),
+            'TEST': {'MIRROR': 'default'},
+        }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('DB_NAME', BASE_DIR / 'db.sqlite3'),
+            'OPTIONS': {
+                # WAL lets readers run alongside the writer; busy_timeout makes
+                # writers wait for the lock instead of failing straight away
+                'init_command': (
+                    'PRAGMA journal_mode=WAL;'
+                    'PRAGMA synchronous=NORMAL;'
+                    'PRAGMA busy_timeout=5000;'
+                ),
+                # Take the write lock at BEGIN so transactions never have to
+                # upgrade a read lock, which SQLite cannot wait for
+                'transaction_mode': 'IMMEDIATE',
+            },
+            # On disk so concurrency tests exercise real file locking
+            'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
+        }
+    }
+
+DATABASE_ROUTERS = ['restaurant.routers.ReadReplicaRouter'] if 'replica' in DATABASES else []
 
 
 # Password validation
@@ -138,7 +203,7 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    'DEFAULT_PAGINATION_CLASS': 'restaurant.pagination.DefaultPagination',
     'PAGE_SIZE': 2,
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend',
@@ -146,8 +211,8 @@ REST_FRAMEWORK = {
         'rest_framework.filters.OrderingFilter',
     ],
     'DEFAULT_THROTTLE_CLASSES': [
-        'rest_framework.throttling.AnonRateThrottle',  # For anonymous users
-        'rest_framework.throttling.UserRateThrottle',  # For authenticated users
+        'restaurant.throttling.SlidingWindowAnonRateThrottle',  # For anonymous users
+        'restaurant.throttling.SlidingWindowUserRateThrottle',  # For authenticated users
     ],
     'DEFAULT_THROTTLE_RATES': {
         'anon': '100/day',        # Anonymous users: 100 requests per day
@@ -164,4 +229,101 @@ SIMPLE_JWT = {
     'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
     'ROTATE_REFRESH_TOKENS': False,
     'BLACKLIST_AFTER_ROTATION': True,
+    # Embeds the user's roles so authorization needs no database lookups
+    'TOKEN_OBTAIN_SERIALIZER': 'restaurant.authentication.RoleTokenObtainPairSerializer',
+}
+
+# Seconds a user's group memberships stay in the process-local role cache.
+# Membership changes made through the ORM invalidate it immediately.
+ROLE_CACHE_TTL = 60
+
+# Caches
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# Local memory by default; point REDIS_URL at a Redis server to share the
+# caches between worker processes. Each kind of data has its own alias, so
+# heavy traffic on one (cached menu pages, say) cannot evict the entries of
+# another. On Redis they share the server under different key prefixes;
+# give it enough memory and a volatile-lru or noeviction policy.
+CACHE_MAX_ENTRIES = {
+    'default': 1000,
+    'menu': 5000,          # responses per menu version and query string
+    'throttle': 50000,     # two counters per user and scope
+    'idempotency': 20000,  # stored responses of cart and order writes
+    'roles': 50000,        # is_active and role version per user
 }
+
+REDIS_URL = os.environ.get('REDIS_URL')
+
+if REDIS_URL:
+    CACHES = {
+        alias: {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+            'KEY_PREFIX': alias,
+        }
+        for alias in CACHE_MAX_ENTRIES
+    }
+else:
+    CACHES = {
+        alias: {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': alias,
+            'OPTIONS': {'MAX_ENTRIES': max_entries},
+        }
+        for alias, max_entries in CACHE_MAX_ENTRIES.items()
+    }
+
+THROTTLE_CACHE_ALIAS = 'throttle'
+
+# Where token authentication keeps each user's is_active flag and role
+# version. Role and user changes made through the ORM drop the entry; the
+# timeout bounds how long a queryset .update() goes unnoticed.
+ROLE_STATE_CACHE_ALIAS = 'roles'
+ROLE_STATE_CACHE_TIMEOUT = 60
+
+# Upper bound for the ?page_size= query parameter
+MAX_PAGE_SIZE = 1000
+
+# Request metrics served at /metrics/: share of requests measured (0 turns
+# them off), samples kept per route for the quantiles, and slow request logs
+# with their slowest queries. Only staff users and scrapers sending
+# PERF_METRICS_TOKEN as a bearer token can read /metrics/
+PERF_SAMPLE_RATE = float(os.environ.get('PERF_SAMPLE_RATE', 1.0))
+PERF_WINDOW = 1024
+PERF_SLOW_REQUEST_MS = int(os.environ.get('PERF_SLOW_REQUEST_MS', 500))
+PERF_SLOW_TOP_QUERIES = 5
+PERF_METRICS_TOKEN = os.environ.get('PERF_METRICS_TOKEN')
+
+# Responses of at least this many bytes are compressed with brotli (when
+# installed) or gzip; brotli quality trades CPU for size (0-11)
+COMPRESSION_MIN_SIZE = 1024
+COMPRESSION_BROTLI_QUALITY = 5
+
+# The OpenAPI schema and docs pages are generated once and cached until the
+# next deploy. Set DEPLOY_ID per release when the cache is shared between
+# processes; otherwise each process start counts as a deploy.
+SCHEMA_CACHE_TIMEOUT = 60 * 60 * 24
+SCHEMA_CACHE_PREFIX = 'schema:' + os.environ.get('DEPLOY_ID', str(int(time.time())))
+
+# Response cache for the menu item and category endpoints
+MENU_CACHE_ALIAS = 'menu'
+MENU_CACHE_TIMEOUT = 300
+
+# Delivered orders older than this many days are moved to the archive
+# tables by `manage.py archive_orders`, this many orders per transaction
+ORDER_ARCHIVE_AFTER_DAYS = int(os.environ.get('ORDER_ARCHIVE_AFTER_DAYS', 365))
+ORDER_ARCHIVE_BATCH_SIZE = 1000
+
+# Idempotency-Key handling for cart and order writes: how long the first
+# response is replayed, how long a duplicate waits for the request holding
+# the key, and when a key held by a crashed request is given up. Use a
+# shared cache (REDIS_URL) when running several processes.
+IDEMPOTENCY_CACHE_ALIAS = 'idempotency'
+IDEMPOTENCY_TTL = 60 * 60 * 24
+IDEMPOTENCY_WAIT = 10
+IDEMPOTENCY_LOCK_TIMEOUT = 60
+
+# Pub/sub used to push Order changes to /async/orders/events/ listeners.
+# LocalBroker only reaches listeners in the same process; RedisBroker
+# reaches every process through a Redis channel.
+ORDER_EVENTS_BROKER = 'restaurant.events.RedisBroker' if REDIS_URL else 'restaurant.events.LocalBroker'
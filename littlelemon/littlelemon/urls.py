@@ -1,29 +1,47 @@
-from django.contrib import admin
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from restaurant.views import (
-    CategoryViewSet, MenuItemViewSet, CartViewSet, OrderViewSet, manager_view, UserViewSet
+    CategoryViewSet, MenuItemViewSet, CartViewSet, OrderViewSet, manager_view, sales_view, metrics_view, UserViewSet
 )
+from restaurant import async_views
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 
-# ✅ Import Swagger tools
-from drf_yasg.views import get_schema_view
-from drf_yasg import openapi
-from rest_framework import permissions
-
-# ✅ Define Swagger schema view
-schema_view = get_schema_view(
-    openapi.Info(
-        title="E-Commerce API",
-        default_version='v1',
-        description="API documentation for E-Commerce project",
-        terms_of_service="https://www.example.com/terms/",
-        contact=openapi.Contact(email="support@example.com"),
-        license=openapi.License(name="BSD License"),
-    ),
-    public=True,
-    permission_classes=(permissions.AllowAny,),
-)
+
+def docs_view(renderer):
+    # drf_yasg takes a while to import, so the schema view is only built on
+    # the first request to the docs
+    view = None
+
+    def lazy_view(request, *args, **kwargs):
+        nonlocal view
+        if view is None:
+            from drf_yasg.views import get_schema_view
+            from drf_yasg import openapi
+            from rest_framework import permissions
+
+            # ✅ Define Swagger schema view
+            schema_view = get_schema_view(
+                openapi.Info(
+                    title="E-Commerce API",
+                    default_version='v1',
+                    description="API documentation for E-Commerce project",
+                    terms_of_service="https://www.example.com/terms/",
+                    contact=openapi.Contact(email="support@example.com"),
+                    license=openapi.License(name="BSD License"),
+                ),
+                public=True,
+                permission_classes=(permissions.AllowAny,),
+            )
+            # Generate the schema once per deploy instead of on every request
+            view = schema_view.with_ui(
+                renderer,
+                cache_timeout=settings.SCHEMA_CACHE_TIMEOUT,
+                cache_kwargs={'key_prefix': settings.SCHEMA_CACHE_PREFIX},
+            )
+        return view(request, *args, **kwargs)
+    return lazy_view
+
 
 # ✅ Register endpoints
 router = DefaultRouter()
@@ -33,8 +51,6 @@ router.register(r'cart', CartViewSet)
 router.register(r'orders', OrderViewSet)
 
 urlpatterns = [
-    path('admin/', admin.site.urls),
-
     # Djoser endpoints for user management and token authentication:
     path('auth/', include('djoser.urls')),
     path('auth/', include('djoser.urls.authtoken')),
@@ -42,13 +58,29 @@ urlpatterns = [
     # Your API endpoints:
     path('', include(router.urls)),
     path('manager-only/', manager_view, name="manager-view"),
+    path('analytics/sales/', sales_view, name="sales-analytics"),
+    path('metrics/', metrics_view, name="metrics"),
+    # Async read endpoints (best served through asgi.py):
+    path('async/menu-items/', async_views.menu_items, name='async-menu-items'),
+    path('async/menu-items/<int:pk>/', async_views.menu_item_detail, name='async-menu-item-detail'),
+    path('async/orders/<int:pk>/status/', async_views.order_status, name='async-order-status'),
+    path('async/orders/events/', async_views.order_events, name='async-order-events'),
+
     path('users/<int:pk>/assign_to_delivery_crew/', UserViewSet.as_view({'post': 'assign_to_delivery_crew'}), name='user-assign-delivery-crew'),
 
     # JWT token endpoints:
     path('api/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+]
+
+if settings.ADMIN_ENABLED:
+    from django.contrib import admin
 
+    urlpatterns.append(path('admin/', admin.site.urls))
+
+if settings.API_DOCS_ENABLED:
     # ✅ Swagger endpoints:
-    path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
-    path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
-]
+    urlpatterns += [
+        path('swagger/', docs_view('swagger'), name='schema-swagger-ui'),
+        path('redoc/', docs_view('redoc'), name='schema-redoc'),
+    ]
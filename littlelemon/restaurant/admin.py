@@ -1,8 +1,11 @@
 from django.contrib import admin
-from .models import Category, MenuItem, Cart, Order, OrderItem
+from .models import Category, MenuItem, Cart, Order, OrderItem, DailySales, ArchivedOrder, ArchivedOrderItem
 
 admin.site.register(Category)
 admin.site.register(MenuItem)
 admin.site.register(Cart)
 admin.site.register(Order)
 admin.site.register(OrderItem)
+admin.site.register(DailySales)
+admin.site.register(ArchivedOrder)
+admin.site.register(ArchivedOrderItem)
@@ -0,0 +1,74 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.utils import timezone
+
+from .models import ArchivedOrder, ArchivedOrderItem, Order, OrderItem
+
+
+def default_cutoff():
+    return timezone.localdate() - timedelta(days=getattr(settings, 'ORDER_ARCHIVE_AFTER_DAYS', 365))
+
+
+def _columns(model):
+    return [field.attname for field in model._meta.concrete_fields]
+
+
+def _delete(connection, model, column, ids):
+    # A plain DELETE: no collector fetching the rows, no model signals
+    qn = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {qn(model._meta.db_table)} WHERE {qn(column)} IN ({", ".join(["%s"] * len(ids))})',
+            ids,
+        )
+
+
+def archive_orders(before=None, batch_size=None):
+    """
+    Moves delivered orders dated before ``before`` (the default cutoff when
+    None), with their items, from Order/OrderItem to the archive tables.
+
+    Works through the orders in primary key order, ``batch_size`` orders
+    (ORDER_ARCHIVE_BATCH_SIZE by default) per transaction, and yields
+    (orders, items, last order id) after every batch. Each batch is copied
+    and deleted atomically, so an interrupted run leaves nothing half moved
+    and the next run simply carries on with the orders that are still live.
+
+    The live rows are deleted without model signals: archived sales stay
+    in the DailySales rollup, and rebuilding it reads both sets of tables.
+    """
+    if before is None:
+        before = default_cutoff()
+    if batch_size is None:
+        batch_size = getattr(settings, 'ORDER_ARCHIVE_BATCH_SIZE', 1000)
+    alias = router.db_for_write(Order)
+    connection = connections[alias]
+    features = connection.features
+    order_columns = _columns(Order)
+    item_columns = _columns(OrderItem)
+    last_id = 0
+    while True:
+        with transaction.atomic(using=alias):
+            ids = list(
+                Order.objects.using(alias)
+                .filter(status=True, date__lt=before, pk__gt=last_id)
+                .select_for_update(skip_locked=features.has_select_for_update_skip_locked)
+                .order_by('pk')
+                .values_list('pk', flat=True)[:batch_size]
+            )
+            if not ids:
+                return
+            orders = Order.objects.using(alias).filter(pk__in=ids)
+            items = OrderItem.objects.using(alias).filter(order_id__in=ids)
+            ArchivedOrder.objects.using(alias).bulk_create(
+                [ArchivedOrder(**row) for row in orders.values(*order_columns)], batch_size=batch_size,
+            )
+            archived_items = ArchivedOrderItem.objects.using(alias).bulk_create(
+                [ArchivedOrderItem(**row) for row in items.values(*item_columns)], batch_size=batch_size,
+            )
+            _delete(connection, OrderItem, 'order_id', ids)
+            _delete(connection, Order, 'id', ids)
+        last_id = ids[-1]
+        yield len(ids), len(archived_items), last_id
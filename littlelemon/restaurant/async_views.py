@@ -0,0 +1,167 @@
+import asyncio
+import json
+import math
+
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse, StreamingHttpResponse
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.settings import api_settings
+
+from .authentication import RoleClaimsJWTAuthentication
+from .events import get_broker, visible_to
+from .models import MenuItem, Order
+from .pagination import get_page_size
+from .roles import get_roles, MANAGER, DELIVERY_CREW
+from .throttling import athrottle
+
+# Async (ASGI native) read endpoints for menu browsing and order status
+# polling. Authentication, throttling and database access all await, so a
+# single event loop can serve many concurrent clients.
+
+MENU_ITEM_FIELDS = ('id', 'title', 'price', 'featured', 'category__title')
+
+# Server-sent events: comment line sent when idle, and the longest a
+# stream stays open before the client has to reconnect
+SSE_KEEPALIVE = 15
+SSE_MAX_DURATION = 300
+
+
+def error(message, status):
+    return JsonResponse({'detail': message}, status=status)
+
+
+async def authorize(request, scopes):
+    # Returns (user, None) or (None, error response)
+    if request.method != 'GET':
+        return None, error(f'Method "{request.method}" not allowed.', 405)
+
+    try:
+        result = await RoleClaimsJWTAuthentication().aauthenticate(request)
+    except AuthenticationFailed as exc:
+        # InvalidToken carries a dict of details, the others a message
+        detail = exc.detail if isinstance(exc.detail, dict) else {'detail': exc.detail}
+        return None, JsonResponse(detail, status=401)
+    if result is None:
+        return None, error('Authentication credentials were not provided.', 401)
+
+    user = result[0]
+    for scope in scopes:
+        wait = await athrottle(scope, user.pk)
+        if wait is not None:
+            response = error(f'Request was throttled. Expected available in {math.ceil(wait)} seconds.', 429)
+            response['Retry-After'] = str(math.ceil(wait))
+            return None, response
+    return user, None
+
+
+def menu_item_data(row):
+    # Same shape as MenuItemSerializer
+    return {
+        'id': row['id'],
+        'title': row['title'],
+        'price': str(row['price']),
+        'featured': row['featured'],
+        'category': row['category__title'],
+    }
+
+
+async def menu_items(request):
+    # GET /async/menu-items/?category=&featured=&after=&page_size=
+    user, response = await authorize(request, ['burst', 'sustained'])
+    if response:
+        return response
+
+    queryset = MenuItem.objects.order_by('id')
+    if request.GET.get('category'):
+        try:
+            category = int(request.GET['category'])
+        except ValueError:
+            return error('Invalid category, expected a category id.', 400)
+        queryset = queryset.filter(category_id=category)
+    if request.GET.get('featured') in ('true', 'false'):
+        queryset = queryset.filter(featured=request.GET['featured'] == 'true')
+    if request.GET.get('after', '').isdigit():
+        # Keyset paging on id
+        queryset = queryset.filter(id__gt=int(request.GET['after']))
+
+    page_size = get_page_size(request.GET, api_settings.PAGE_SIZE)
+    results = [menu_item_data(row) async for row in queryset.values(*MENU_ITEM_FIELDS)[:page_size + 1]]
+    next_after = results[page_size - 1]['id'] if len(results) > page_size else None
+    return JsonResponse({'next_after': next_after, 'results': results[:page_size]})
+
+
+async def menu_item_detail(request, pk):
+    user, response = await authorize(request, ['burst', 'sustained'])
+    if response:
+        return response
+    try:
+        row = await MenuItem.objects.values(*MENU_ITEM_FIELDS).aget(pk=pk)
+    except MenuItem.DoesNotExist:
+        return error('No MenuItem matches the given query.', 404)
+    return JsonResponse(menu_item_data(row))
+
+
+async def order_status(request, pk):
+    # Lightweight status polling with the same visibility as OrderViewSet
+    user, response = await authorize(request, ['burst'])
+    if response:
+        return response
+
+    # Roles were loaded by aauthenticate, so this does not hit the database
+    roles = get_roles(user)
+    queryset = Order.objects.all()
+    if DELIVERY_CREW in roles and MANAGER not in roles:
+        queryset = queryset.filter(delivery_crew_id=user.pk)
+    elif MANAGER not in roles:
+        queryset = queryset.filter(user_id=user.pk)
+
+    try:
+        order = await queryset.values('id', 'status', 'delivery_crew', 'date').aget(pk=pk)
+    except Order.DoesNotExist:
+        return error('No Order matches the given query.', 404)
+    return JsonResponse(order)
+
+
+async def order_events(request):
+    """
+    GET /async/orders/events/?order=<id>&timeout=<seconds>
+
+    Server-sent events stream of Order changes the user is allowed to see.
+    Needs the ASGI server: under WSGI the stream would be buffered and hold
+    a worker until it ends, so it is refused with a 501 instead.
+    """
+    if not isinstance(request, ASGIRequest):
+        return error('Server-sent events need the ASGI server (littlelemon.asgi).', 501)
+    user, response = await authorize(request, ['burst'])
+    if response:
+        return response
+
+    roles = get_roles(user)
+    order_id = request.GET.get('order')
+    try:
+        duration = min(float(request.GET.get('timeout', SSE_MAX_DURATION)), SSE_MAX_DURATION)
+    except ValueError:
+        return error('Invalid timeout.', 400)
+
+    async def stream():
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + duration
+        async with get_broker().subscribe() as subscription:
+            yield ': connected\n\n'
+            while (remaining := deadline - loop.time()) > 0:
+                try:
+                    event = await asyncio.wait_for(subscription.get(), min(SSE_KEEPALIVE, remaining))
+                except asyncio.TimeoutError:
+                    yield ': keepalive\n\n'
+                    continue
+                if order_id and str(event['id']) != order_id:
+                    continue
+                if visible_to(event, user.pk, roles):
+                    data = json.dumps(event, cls=DjangoJSONEncoder)
+                    yield f'event: order\nid: {event["id"]}\ndata: {data}\n\n'
+
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,110 @@
+from asgiref.sync import sync_to_async
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.settings import api_settings
+
+from .roles import arole_state, get_roles, role_state, role_version
+
+# Claims embedded by RoleTokenObtainPairSerializer. They are copied from the
+# refresh token into every access token minted from it.
+ROLES_CLAIM = "roles"
+ROLES_VERSION_CLAIM = "roles_v"
+
+
+class RoleTokenObtainPairSerializer(TokenObtainPairSerializer):
+    # Adds the user's groups to the token pair from TokenObtainPairView
+
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        token["username"] = user.get_username()
+        # Version first: a change made while the roles are read then
+        # leaves the token outdated rather than looking current
+        token[ROLES_VERSION_CLAIM] = role_version(user.pk)
+        token[ROLES_CLAIM] = sorted(get_roles(user))
+        return token
+
+
+class RoleTokenUser(TokenUser):
+    # Stateless user whose roles come straight from the token claims
+
+    def __init__(self, token):
+        super().__init__(token)
+        self._restaurant_roles = frozenset(token[ROLES_CLAIM])
+
+
+class RoleClaimsJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication that trusts the role claims in the token.
+
+    Every request checks that the user still exists, is active and has the
+    role version the token was issued with. Safe requests read that state
+    from the cache, with one query on a miss, and get a RoleTokenUser that
+    touches nothing else. Writes load the User row with its role version
+    in one query, because models need a real instance, and take their
+    roles from the token instead of querying groups. Outdated tokens are
+    rejected, so the client has to obtain a new pair.
+
+    Set on the restaurant views only: other apps (djoser's /auth/users/me/
+    for one) need the full User that JWTAuthentication loads.
+    """
+
+    def authenticate(self, request):
+        self.safe = request.method in SAFE_METHODS
+        return super().authenticate(request)
+
+    def get_user(self, validated_token):
+        if ROLES_VERSION_CLAIM not in validated_token:
+            # Token issued before versioned role claims existed
+            return super().get_user(validated_token)
+
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        if self.safe:
+            self.check_state(validated_token, role_state(user_id))
+            return RoleTokenUser(validated_token)
+
+        try:
+            user = self.user_model.objects.select_related("role_version").get(**{api_settings.USER_ID_FIELD: user_id})
+        except self.user_model.DoesNotExist:
+            user = None
+        version = user.role_version.version if user is not None and hasattr(user, "role_version") else 0
+        self.check_state(validated_token, None if user is None else (user.is_active, version))
+        user._restaurant_roles = frozenset(validated_token[ROLES_CLAIM])
+        return user
+
+    def check_state(self, validated_token, state):
+        # state is (is_active, role version), or None for a deleted user
+        if state is None:
+            raise AuthenticationFailed("User not found", code="user_not_found")
+        is_active, version = state
+        if not is_active:
+            raise AuthenticationFailed("User is inactive", code="user_inactive")
+        if version != validated_token[ROLES_VERSION_CLAIM]:
+            raise AuthenticationFailed("Your roles have changed, please log in again.", code="roles_changed")
+
+    async def aauthenticate(self, request):
+        # Event loop friendly variant for async views. Only GET requests are
+        # served this way; tokens with role claims need at most one async
+        # query.
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+
+        if ROLES_VERSION_CLAIM not in validated_token:
+            # Older token: load the user and their roles off the event loop
+            def load_user():
+                user = self.get_user(validated_token)
+                get_roles(user)
+                return user
+            return await sync_to_async(load_user)(), validated_token
+
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        self.check_state(validated_token, await arole_state(user_id))
+        return RoleTokenUser(validated_token), validated_token
@@ -0,0 +1,95 @@
+from django.db import transaction
+from rest_framework import serializers
+
+from .caching import bump_menu_version
+from .models import Category, MenuItem
+from .search import index_menu_items
+
+BATCH_SIZE = 500
+
+
+class MenuItemRowSerializer(serializers.Serializer):
+    # One row of a bulk menu import; rows with an id update that menu item.
+    # Without featured, new items are not featured and updated ones keep
+    # their flag.
+    id = serializers.IntegerField(required=False, allow_null=True)
+    title = serializers.CharField(max_length=255)
+    price = serializers.DecimalField(max_digits=6, decimal_places=2)
+    featured = serializers.BooleanField(required=False)
+    category = serializers.SlugField()
+
+    def to_internal_value(self, data):
+        # CSV cells arrive as empty strings
+        if isinstance(data, dict):
+            if data.get('id') == '':
+                data = {**data, 'id': None}
+            if data.get('featured') == '':
+                data = {key: value for key, value in data.items() if key != 'featured'}
+        return super().to_internal_value(data)
+
+
+def import_menu_items(rows):
+    """
+    Creates or updates menu items in bulk.
+
+    Every row is validated before anything is written. Categories and
+    existing menu items are each looked up with a single query, and writes
+    go through bulk_create/bulk_update in one transaction. Returns
+    (created, updated, errors); nothing is written when there are errors.
+    """
+    errors = []
+    valid = []
+    for index, row in enumerate(rows):
+        serializer = MenuItemRowSerializer(data=row)
+        if serializer.is_valid():
+            valid.append((index, serializer.validated_data))
+        else:
+            errors.append({'row': index, 'errors': serializer.errors})
+
+    slugs = {data['category'] for _, data in valid}
+    categories = {}
+    for category in Category.objects.filter(slug__in=slugs).order_by('-pk'):
+        # Slugs are not unique; the oldest category wins
+        categories[category.slug] = category
+
+    ids = {data['id'] for _, data in valid if data.get('id')}
+    existing = MenuItem.objects.in_bulk(ids)
+
+    to_create, to_update, seen = [], [], set()
+    for index, data in valid:
+        row_errors = {}
+        category = categories.get(data['category'])
+        if category is None:
+            row_errors['category'] = [f'Unknown category "{data["category"]}".']
+        item_id = data.get('id')
+        if item_id and item_id not in existing:
+            row_errors['id'] = [f'Menu item {item_id} does not exist.']
+        elif item_id and item_id in seen:
+            row_errors['id'] = [f'Menu item {item_id} appears more than once.']
+        seen.add(item_id)
+        if row_errors:
+            errors.append({'row': index, 'errors': row_errors})
+            continue
+
+        if item_id:
+            item = existing[item_id]
+            item.title, item.price, item.featured, item.category = (
+                data['title'], data['price'], data.get('featured', item.featured), category,
+            )
+            to_update.append(item)
+        else:
+            to_create.append(MenuItem(
+                title=data['title'], price=data['price'], featured=data.get('featured', False), category=category,
+            ))
+
+    if errors:
+        errors.sort(key=lambda error: error['row'])
+        return 0, 0, errors
+
+    with transaction.atomic():
+        MenuItem.objects.bulk_create(to_create, batch_size=BATCH_SIZE)
+        MenuItem.objects.bulk_update(to_update, ['title', 'price', 'featured', 'category'], batch_size=BATCH_SIZE)
+        # bulk_create/bulk_update do not send post_save
+        index_menu_items([item.pk for item in to_create + to_update])
+        transaction.on_commit(bump_menu_version)
+    return len(to_create), len(to_update), []
@@ -0,0 +1,88 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+# Every cached menu response embeds this version in its key. Changing a
+# MenuItem or Category bumps the version, which orphans all older entries
+# at once instead of having to find and delete them one by one.
+MENU_VERSION_KEY = "menu:version"
+
+
+def get_cache():
+    return caches[getattr(settings, "MENU_CACHE_ALIAS", "default")]
+
+
+def get_timeout():
+    return getattr(settings, "MENU_CACHE_TIMEOUT", 300)
+
+
+def get_menu_version():
+    cache = get_cache()
+    version = cache.get(MENU_VERSION_KEY)
+    if version is None:
+        # Seed from the clock so an evicted counter never reuses an old version
+        cache.add(MENU_VERSION_KEY, int(time.time() * 1000), timeout=None)
+        version = cache.get(MENU_VERSION_KEY)
+    return version
+
+
+def bump_menu_version():
+    cache = get_cache()
+    try:
+        cache.incr(MENU_VERSION_KEY)
+    except ValueError:
+        cache.set(MENU_VERSION_KEY, int(time.time() * 1000), timeout=None)
+
+
+def menu_cache_key(request, view):
+    # Filter, search, ordering and page parameters all live in the query string
+    params = sorted(request.query_params.lists())
+    parts = [
+        view.basename,
+        view.action,
+        str(view.kwargs.get(view.lookup_url_kwarg or view.lookup_field, "")),
+        request.accepted_renderer.format,
+        request.get_host(),
+        repr(params),
+    ]
+    digest = hashlib.md5("|".join(parts).encode()).hexdigest()
+    return f"menu:{get_menu_version()}:{digest}"
+
+
+class MenuCacheMixin:
+    # Read-through response cache for list/retrieve with ETag support
+
+    def cached_response(self, request, build):
+        key = menu_cache_key(request, self)
+        etag = quote_etag(hashlib.md5(key.encode()).hexdigest())
+        headers = {"ETag": etag}
+
+        # Same version and parameters means the same content, so clients
+        # holding this ETag get a 304 without any cache or database hit.
+        # No Last-Modified: whole-second dates would miss changes made in
+        # the second a client last fetched, and the version catches them.
+        conditional = get_conditional_response(request, etag=etag)
+        if conditional is not None:
+            return Response(status=conditional.status_code, headers=headers)
+
+        cache = get_cache()
+        data = cache.get(key)
+        if data is None:
+            response = build()
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            data = response.data
+            cache.set(key, data, get_timeout())
+        return Response(data, headers=headers)
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(request, lambda: super(MenuCacheMixin, self).list(request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(request, lambda: super(MenuCacheMixin, self).retrieve(request, *args, **kwargs))
@@ -0,0 +1,181 @@
+from decimal import Decimal
+
+from django.db import IntegrityError, connections, router, transaction
+from django.db.models import DecimalField, ExpressionWrapper, F
+from rest_framework import serializers
+
+from .models import Cart, MenuItem
+
+# Cart writes are upserts on the (menuitem, user) unique key. Adding an item
+# that is already in the cart, including two adds of the same item racing
+# each other, updates the existing row in the same INSERT ... ON CONFLICT
+# statement instead of failing on the constraint.
+
+UPSERT_BATCH_SIZE = 100
+
+# Largest quantity a SmallIntegerField holds, and the bound a line price
+# must stay below to fit DecimalField(max_digits=6, decimal_places=2)
+MAX_QUANTITY = 32767
+MAX_PRICE = Decimal('10000')
+
+LIMIT_ERROR = f'A cart line holds at most {MAX_QUANTITY} items and must cost less than {MAX_PRICE}.'
+
+
+def line_fits(quantity, unit_price):
+    return quantity <= MAX_QUANTITY and quantity * unit_price < MAX_PRICE
+
+
+class CartRowSerializer(serializers.Serializer):
+    # One line of a "set cart" request
+    menuitem = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=1, max_value=MAX_QUANTITY)
+    unit_price = serializers.DecimalField(max_digits=6, decimal_places=2, required=False)
+
+
+def add_to_cart(user, menuitem, quantity, unit_price=None):
+    """
+    Adds ``quantity`` of ``menuitem`` to the user's cart.
+
+    An existing row has the quantity added and its price recomputed from
+    ``unit_price``, which defaults to the menu item's price. Returns the
+    resulting Cart row, or raises ValidationError when the line would go
+    over MAX_QUANTITY or MAX_PRICE; the cart is left unchanged then.
+    """
+    if unit_price is None:
+        unit_price = menuitem.price
+    if not line_fits(quantity, unit_price):
+        raise serializers.ValidationError({'quantity': [LIMIT_ERROR]})
+    connection = connections[router.db_for_write(Cart)]
+    rows = [(menuitem.pk, quantity, unit_price)]
+    if connection.vendor in ('sqlite', 'postgresql'):
+        results = _upsert(connection, user.pk, rows, increment=True, returning=True)
+        if not results:
+            # The existing row was left alone by the limit check
+            raise serializers.ValidationError({'quantity': [LIMIT_ERROR]})
+        ((pk, quantity),) = results
+    else:
+        pk, quantity = _add(user.pk, menuitem.pk, quantity, unit_price)
+    return Cart(pk=pk, user=user, menuitem=menuitem, quantity=quantity,
+                unit_price=unit_price, price=quantity * unit_price)
+
+
+def set_cart(user, rows):
+    """
+    Replaces the user's cart with ``rows``, a list of CartRowSerializer data.
+
+    Lines are updated in place, missing ones are deleted and new ones are
+    inserted, using one query to look up menu items, one DELETE and one
+    INSERT ... ON CONFLICT per batch. Returns a list of errors in the bulk
+    import format; nothing is written when there are errors.
+    """
+    errors = []
+    valid = []
+    for index, row in enumerate(rows):
+        serializer = CartRowSerializer(data=row)
+        if serializer.is_valid():
+            valid.append((index, serializer.validated_data))
+        else:
+            errors.append({'row': index, 'errors': serializer.errors})
+
+    prices = dict(
+        MenuItem.objects.filter(pk__in={data['menuitem'] for _, data in valid})
+        .values_list('pk', 'price')
+    )
+    lines, seen = [], set()
+    for index, data in valid:
+        menuitem_id = data['menuitem']
+        if menuitem_id not in prices:
+            errors.append({'row': index, 'errors': {'menuitem': [f'Menu item {menuitem_id} does not exist.']}})
+        elif menuitem_id in seen:
+            errors.append({'row': index, 'errors': {'menuitem': [f'Menu item {menuitem_id} appears more than once.']}})
+        elif not line_fits(data['quantity'], data.get('unit_price', prices[menuitem_id])):
+            errors.append({'row': index, 'errors': {'quantity': [LIMIT_ERROR]}})
+        else:
+            lines.append((menuitem_id, data['quantity'], data.get('unit_price', prices[menuitem_id])))
+        seen.add(menuitem_id)
+
+    if errors:
+        errors.sort(key=lambda error: error['row'])
+        return errors
+
+    alias = router.db_for_write(Cart)
+    connection = connections[alias]
+    with transaction.atomic(using=alias):
+        Cart.objects.filter(user_id=user.pk).exclude(menuitem_id__in=seen).delete()
+        if connection.vendor in ('sqlite', 'postgresql'):
+            _upsert(connection, user.pk, lines, increment=False)
+        else:
+            for menuitem_id, quantity, unit_price in lines:
+                Cart.objects.update_or_create(
+                    user_id=user.pk, menuitem_id=menuitem_id,
+                    defaults={'quantity': quantity, 'unit_price': unit_price, 'price': quantity * unit_price},
+                )
+    return []
+
+
+def _upsert(connection, user_id, rows, increment, returning=False):
+    # rows: (menuitem_id, quantity, unit_price); with ``increment`` the
+    # quantity is added to an existing row, otherwise it replaces it. The
+    # new rows must already be within the limits; an increment that would
+    # take a row over them leaves it unchanged and out of the RETURNING rows
+    qn = connection.ops.quote_name
+    table = qn(Cart._meta.db_table)
+    columns = ', '.join(qn(column) for column in ('user_id', 'menuitem_id', 'quantity', 'unit_price', 'price'))
+    quantity = f'excluded.{qn("quantity")}'
+    if increment:
+        quantity = f'{table}.{qn("quantity")} + {quantity}'
+    updates = (
+        f'{qn("quantity")} = {quantity}, '
+        f'{qn("unit_price")} = excluded.{qn("unit_price")}, '
+        f'{qn("price")} = ({quantity}) * excluded.{qn("unit_price")}'
+    )
+    if increment:
+        updates += (
+            f' WHERE {quantity} <= {MAX_QUANTITY}'
+            f' AND ({quantity}) * excluded.{qn("unit_price")} < {int(MAX_PRICE)}'
+        )
+    suffix = f' RETURNING {qn("id")}, {qn("quantity")}' if returning else ''
+
+    results = []
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), UPSERT_BATCH_SIZE):
+            batch = rows[start:start + UPSERT_BATCH_SIZE]
+            params = []
+            for menuitem_id, quantity_value, unit_price in batch:
+                params += [
+                    user_id,
+                    menuitem_id,
+                    quantity_value,
+                    connection.ops.adapt_decimalfield_value(unit_price),
+                    connection.ops.adapt_decimalfield_value(quantity_value * unit_price),
+                ]
+            cursor.execute(
+                f'INSERT INTO {table} ({columns}) VALUES {", ".join(["(%s, %s, %s, %s, %s)"] * len(batch))} '
+                f'ON CONFLICT ({qn("menuitem_id")}, {qn("user_id")}) DO UPDATE SET {updates}{suffix}',
+                params,
+            )
+            if returning:
+                results += cursor.fetchall()
+    return results
+
+
+def _add(user_id, menuitem_id, quantity, unit_price):
+    # Fallback for databases without ON CONFLICT
+    rows = Cart.objects.filter(user_id=user_id, menuitem_id=menuitem_id)
+    changes = {
+        'quantity': F('quantity') + quantity,
+        'unit_price': unit_price,
+        'price': (F('quantity') + quantity) * unit_price,
+    }
+    within_limits = rows.alias(
+        new_price=ExpressionWrapper((F('quantity') + quantity) * unit_price, output_field=DecimalField()),
+    ).filter(quantity__lte=MAX_QUANTITY - quantity, new_price__lt=MAX_PRICE)
+    if not within_limits.update(**changes):
+        try:
+            with transaction.atomic():
+                Cart.objects.create(user_id=user_id, menuitem_id=menuitem_id, quantity=quantity,
+                                    unit_price=unit_price, price=quantity * unit_price)
+        except IntegrityError:
+            if not within_limits.update(**changes):
+                raise serializers.ValidationError({'quantity': [LIMIT_ERROR]})
+    return rows.values_list('pk', 'quantity').get()
@@ -0,0 +1,54 @@
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from .models import Cart, Order, OrderItem
+from .rollup import record_items
+
+
+# Order.total is DecimalField(max_digits=6, decimal_places=2)
+MAX_TOTAL = Decimal('10000')
+
+
+class EmptyCartError(Exception):
+    pass
+
+
+class CartTotalTooLargeError(Exception):
+    pass
+
+
+def checkout_cart(user):
+    # Turns the user's cart into an Order with its OrderItems.
+    # The number of queries does not depend on the size of the cart.
+    with transaction.atomic():
+        cart = Cart.objects.filter(user=user)
+
+        # Lock the cart rows in primary key order so concurrent checkouts
+        # by the same user queue up behind each other instead of deadlocking.
+        rows = list(
+            cart.select_for_update()
+            .order_by('pk')
+            .values_list('menuitem_id', 'quantity', 'unit_price', 'price')
+        )
+        if not rows:
+            # Empty, or emptied by a checkout that held the lock before us
+            raise EmptyCartError()
+
+        total = cart.aggregate(total=Sum('price'))['total']
+        if total >= MAX_TOTAL:
+            raise CartTotalTooLargeError()
+        order = Order.objects.create(user=user, total=total, date=timezone.localdate())
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, menuitem_id=menuitem_id, quantity=quantity,
+                      unit_price=unit_price, price=price)
+            for menuitem_id, quantity, unit_price, price in rows
+        ])
+        # bulk_create skips post_save, so update the sales rollup here
+        record_items(order.date, order.status, [
+            (menuitem_id, quantity, price) for menuitem_id, quantity, unit_price, price in rows
+        ])
+        cart.delete()
+    return order
@@ -0,0 +1,84 @@
+import heapq
+
+from django.contrib.auth.models import User
+from django.db import connections, router, transaction
+from django.db.models import Count
+
+from .events import get_broker, order_event
+from .models import Order
+from .roles import DELIVERY_CREW
+
+BATCH_SIZE = 1000
+
+
+def dispatch_pending_orders(limit=None):
+    """
+    Assigns pending, unassigned orders to the least loaded delivery crew.
+
+    Oldest orders go first. Crew members, pending orders and the current
+    load of every crew member are read with three queries; the assignment
+    is worked out with a heap keyed by (load, crew id) and written with
+    bulk_update. Returns a list of (order id, crew id) pairs.
+
+    Pending orders are locked (skipping rows another dispatch holds) where
+    the database supports it; SQLite serializes the whole transaction. The
+    update is also restricted to orders that are still unassigned, so an
+    order is never handed to two crew members.
+    """
+    alias = router.db_for_write(Order)
+    features = connections[alias].features
+    with transaction.atomic(using=alias):
+        crew_ids = list(
+            User.objects.using(alias)
+            .filter(groups__name=DELIVERY_CREW, is_active=True)
+            .order_by('pk')
+            .values_list('pk', flat=True)
+        )
+        if not crew_ids:
+            return []
+
+        pending = Order.objects.using(alias).filter(status=False, delivery_crew__isnull=True)
+        orders = list(
+            pending.select_for_update(skip_locked=features.has_select_for_update_skip_locked)
+            .order_by('date', 'pk')
+            .values_list('pk', 'user_id', 'date')[:limit]
+        )
+        if not orders:
+            return []
+
+        loads = dict(
+            Order.objects.using(alias)
+            .filter(status=False, delivery_crew_id__in=crew_ids)
+            .values('delivery_crew_id')
+            .annotate(load=Count('pk'))
+            .order_by()
+            .values_list('delivery_crew_id', 'load')
+        )
+        heap = [(loads.get(crew_id, 0), crew_id) for crew_id in crew_ids]
+        heapq.heapify(heap)
+
+        assignments = []
+        for order_id, user_id, date in orders:
+            load, crew_id = heap[0]
+            heapq.heapreplace(heap, (load + 1, crew_id))
+            assignments.append(Order(pk=order_id, user_id=user_id, date=date, status=False, delivery_crew_id=crew_id))
+
+        updated = pending.bulk_update(assignments, ['delivery_crew'], batch_size=BATCH_SIZE)
+        if updated != len(assignments):
+            # Someone else assigned some of them in the meantime
+            ours = set(
+                Order.objects.using(alias)
+                .filter(pk__in=[order.pk for order in assignments])
+                .values_list('pk', 'delivery_crew_id')
+            )
+            assignments = [order for order in assignments if (order.pk, order.delivery_crew_id) in ours]
+
+        # bulk_update skips post_save, so announce the assignments here
+        events = [order_event(order) for order in assignments]
+
+        def publish():
+            broker = get_broker()
+            for event in events:
+                broker.publish(event)
+        transaction.on_commit(publish, using=alias)
+    return [(order.pk, order.delivery_crew_id) for order in assignments]
@@ -0,0 +1,160 @@
+import asyncio
+import json
+import threading
+import time
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.module_loading import import_string
+
+from .roles import DELIVERY_CREW, MANAGER
+
+
+def order_event(order):
+    return {
+        'id': order.pk,
+        'user': order.user_id,
+        'delivery_crew': order.delivery_crew_id,
+        'status': order.status,
+        'date': str(order.date),
+    }
+
+
+def visible_to(event, user_id, roles):
+    # Same rules as OrderViewSet.get_queryset
+    if MANAGER in roles:
+        return True
+    if DELIVERY_CREW in roles:
+        return event['delivery_crew'] == user_id
+    return event['user'] == user_id
+
+
+class Subscription:
+    # Queue of events for one listener, bound to the listener's event loop
+
+    max_pending = 100
+
+    def __init__(self, broker):
+        self.broker = broker
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue()
+
+    def push(self, event):
+        # Runs on the subscriber's loop; slow readers lose the oldest events
+        if self.queue.qsize() >= self.max_pending:
+            self.queue.get_nowait()
+        self.queue.put_nowait(event)
+
+    async def get(self):
+        return await self.queue.get()
+
+    async def __aenter__(self):
+        self.broker.add(self)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.broker.remove(self)
+
+
+class BaseBroker:
+    """
+    Fans order events out to the subscribers of this process.
+
+    ``publish`` may be called from any thread (signal handlers run in the
+    request thread); ``subscribe`` must be used from inside an event loop.
+    Brokers backed by an external pub/sub should override ``publish`` to send
+    the event there and call ``deliver`` for every event they receive.
+    """
+
+    def __init__(self):
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self):
+        return Subscription(self)
+
+    def add(self, subscription):
+        with self._lock:
+            self._subscribers.add(subscription)
+
+    def remove(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def deliver(self, event):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.push, event)
+            except RuntimeError:
+                # The subscriber's loop has been closed
+                self.remove(subscription)
+
+    def publish(self, event):
+        raise NotImplementedError
+
+
+class LocalBroker(BaseBroker):
+    # In-memory broker; only reaches subscribers in the same process
+
+    def publish(self, event):
+        self.deliver(event)
+
+
+class RedisBroker(BaseBroker):
+    """
+    Publishes events to a Redis channel and delivers everything received on
+    it, so listeners see changes made in any process. Needs REDIS_URL.
+
+    The listening thread starts with the first subscriber, so processes
+    that only publish never open a subscription.
+    """
+
+    channel = 'littlelemon:order-events'
+    reconnect_delay = 1
+
+    def __init__(self):
+        super().__init__()
+        import redis
+
+        self._redis = redis.Redis.from_url(settings.REDIS_URL)
+        self._listener = None
+
+    def add(self, subscription):
+        super().add(subscription)
+        with self._lock:
+            if self._listener is None:
+                self._listener = threading.Thread(target=self._listen, name='order-events', daemon=True)
+                self._listener.start()
+
+    def _listen(self):
+        import redis
+
+        while True:
+            try:
+                with self._redis.pubsub(ignore_subscribe_messages=True) as pubsub:
+                    pubsub.subscribe(self.channel)
+                    for message in pubsub.listen():
+                        self.deliver(json.loads(message['data']))
+            except redis.ConnectionError:
+                # Events published while disconnected are lost, as with
+                # any Redis pub/sub listener
+                time.sleep(self.reconnect_delay)
+
+    def publish(self, event):
+        self._redis.publish(self.channel, json.dumps(event, cls=DjangoJSONEncoder))
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                path = getattr(settings, 'ORDER_EVENTS_BROKER', 'restaurant.events.LocalBroker')
+                _broker = import_string(path)()
+    return _broker
@@ -0,0 +1,62 @@
+import csv
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Prefetch
+
+from .models import OrderItem
+
+# Orders are read from the database this many at a time, together with
+# their items, so memory use does not depend on the size of the export.
+CHUNK_SIZE = 2000
+
+ORDER_FIELDS = ['id', 'user', 'delivery_crew', 'status', 'total', 'date']
+ITEM_FIELDS = ['menuitem', 'quantity', 'unit_price', 'price']
+
+
+class Echo:
+    # File-like object whose write() just hands the line back to csv.writer
+    def write(self, value):
+        return value
+
+
+def iter_orders(queryset):
+    items = Prefetch('orderitem_set', queryset=OrderItem.objects.order_by('pk'))
+    queryset = queryset.order_by('pk').prefetch_related(items)
+    for order in queryset.iterator(chunk_size=CHUNK_SIZE):
+        row = {
+            'id': order.pk,
+            'user': order.user_id,
+            'delivery_crew': order.delivery_crew_id,
+            'status': order.status,
+            'total': order.total,
+            'date': order.date,
+        }
+        row['items'] = [
+            {
+                'menuitem': item.menuitem_id,
+                'quantity': item.quantity,
+                'unit_price': item.unit_price,
+                'price': item.price,
+            }
+            for item in order.orderitem_set.all()
+        ]
+        yield row
+
+
+def iter_ndjson(queryset):
+    # One order per line, with its items nested
+    encoder = DjangoJSONEncoder(separators=(',', ':'))
+    for row in iter_orders(queryset):
+        yield encoder.encode(row) + '\n'
+
+
+def iter_csv(queryset):
+    # One line per order item; orders without items get a single line
+    writer = csv.writer(Echo())
+    yield writer.writerow(ORDER_FIELDS + ITEM_FIELDS)
+    for row in iter_orders(queryset):
+        order = [row[field] for field in ORDER_FIELDS]
+        if not row['items']:
+            yield writer.writerow(order + [''] * len(ITEM_FIELDS))
+        for item in row['items']:
+            yield writer.writerow(order + [item[field] for field in ITEM_FIELDS])
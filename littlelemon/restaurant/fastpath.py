@@ -0,0 +1,167 @@
+from collections import defaultdict
+
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+from rest_framework.response import Response
+from rest_framework.settings import ISO_8601, api_settings
+
+from .models import Category, MenuItem
+
+# Models whose __str__ is their title, so a StringRelatedField pointing at
+# them can be read from the <relation>__title column
+TITLE_MODELS = (Category, MenuItem)
+
+# serializer class -> ValuesSerializer, or None when it cannot be compiled
+_compiled = {}
+
+
+class Unsupported(Exception):
+    pass
+
+
+def _convert(field):
+    # Returns a function turning a non-null column value into what the
+    # field's to_representation returns, or None when it is the value itself
+    if type(field) in (serializers.IntegerField, serializers.BooleanField) or isinstance(field, serializers.CharField):
+        # Columns already come back as int, bool and str
+        return None
+    if isinstance(field, serializers.DecimalField):
+        coerce_to_string = getattr(field, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING)
+        if not coerce_to_string or field.localize or field.normalize_output or field.decimal_places is None:
+            return field.to_representation
+        exponent = -field.decimal_places
+
+        def decimal(value):
+            # Database values normally have the column's scale already
+            if value.as_tuple().exponent == exponent:
+                return format(value, 'f')
+            return field.to_representation(value)
+        return decimal
+    if isinstance(field, serializers.DateField):
+        output_format = getattr(field, 'format', api_settings.DATE_FORMAT)
+        if isinstance(output_format, str) and output_format.lower() == ISO_8601:
+            return lambda value: value.isoformat()
+        return field.to_representation
+    raise Unsupported(field)
+
+
+class ValuesSerializer:
+    """
+    Read-only twin of a ModelSerializer that works on .values() rows.
+
+    Builds the same dicts, key for key and value for value, as
+    ``serializer_class(instances, many=True).data`` without creating model
+    instances or running each field's get_attribute/to_representation.
+    Nested many=True serializers on reverse foreign keys are filled in with
+    one extra query per page.
+    """
+
+    def __init__(self, serializer_class):
+        serializer = serializer_class()
+        model = serializer_class.Meta.model
+        self.model = model
+        self.pk = model._meta.pk.attname
+        # (key, column, converter) or (key, None, nested ValuesSerializer)
+        self.fields = []
+        self.columns = {field.attname for field in model._meta.concrete_fields}
+        for field in serializer.fields.values():
+            if field.write_only:
+                continue
+            if field.source == '*' or len(field.source_attrs) != 1:
+                raise Unsupported(field)
+            name = field.source
+            if isinstance(field, serializers.ListSerializer):
+                self.fields.append((field.field_name, None, self.nested(model, name, field.child)))
+                continue
+            try:
+                model_field = model._meta.get_field(name)
+            except FieldDoesNotExist:
+                raise Unsupported(field)
+            if isinstance(field, serializers.PrimaryKeyRelatedField):
+                if not model_field.many_to_one or field.pk_field is not None:
+                    raise Unsupported(field)
+                column, convert = model_field.attname, None
+            elif isinstance(field, serializers.StringRelatedField):
+                if not model_field.many_to_one or model_field.related_model not in TITLE_MODELS:
+                    raise Unsupported(field)
+                column, convert = f'{name}__title', None
+            elif model_field.is_relation or type(field) is serializers.ModelField:
+                raise Unsupported(field)
+            else:
+                column, convert = model_field.attname, _convert(field)
+            self.columns.add(column)
+            self.fields.append((field.field_name, column, convert))
+
+    def nested(self, model, accessor, child):
+        # Only reverse foreign keys (order.orderitem_set) are supported
+        name = accessor[:-len('_set')] if accessor.endswith('_set') else accessor
+        try:
+            relation = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            raise Unsupported(accessor)
+        if not relation.one_to_many or not isinstance(child, serializers.ModelSerializer):
+            raise Unsupported(accessor)
+        compiled = ValuesSerializer(type(child))
+        compiled.parent_column = relation.field.attname
+        compiled.columns.add(relation.field.attname)
+        return compiled
+
+    def values(self, queryset):
+        # Prefetches are pointless (and unsupported) on a values() queryset
+        return queryset.prefetch_related(None).values(*self.columns)
+
+    def represent(self, rows):
+        nested = {}
+        for key, column, child in self.fields:
+            if column is None:
+                ids = [row[self.pk] for row in rows]
+                nested[key] = child.group(ids)
+        return [self.represent_row(row, nested) for row in rows]
+
+    def group(self, parent_ids):
+        # One query for the children of every parent row, in primary key order
+        groups = defaultdict(list)
+        if not parent_ids:
+            return groups
+        rows = list(
+            self.values(self.model._default_manager.filter(**{f'{self.parent_column}__in': parent_ids}))
+            .order_by(self.model._meta.pk.name)
+        )
+        for row, data in zip(rows, self.represent(rows)):
+            groups[row[self.parent_column]].append(data)
+        return groups
+
+    def represent_row(self, row, nested):
+        data = {}
+        for key, column, convert in self.fields:
+            if column is None:
+                data[key] = nested[key].get(row[self.pk], [])
+                continue
+            value = row[column]
+            data[key] = value if value is None or convert is None else convert(value)
+        return data
+
+
+def compile_serializer(serializer_class):
+    if serializer_class not in _compiled:
+        try:
+            _compiled[serializer_class] = ValuesSerializer(serializer_class)
+        except Unsupported:
+            _compiled[serializer_class] = None
+    return _compiled[serializer_class]
+
+
+class FastListMixin:
+    # Serves list() from .values() rows through a ValuesSerializer, falling
+    # back to the regular serializer when it uses fields that cannot be
+    # read from columns. The response body is identical either way.
+
+    def list(self, request, *args, **kwargs):
+        compiled = compile_serializer(self.get_serializer_class())
+        if compiled is None:
+            return super().list(request, *args, **kwargs)
+        queryset = compiled.values(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(compiled.represent(page))
+        return Response(compiled.represent(list(queryset)))
@@ -0,0 +1,159 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+from rest_framework import status
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.response import Response
+
+# Idempotency-Key support for unsafe requests.
+#
+# The first request with a given key claims it in the cache with an atomic
+# add. Its response is stored under the same cache entry once rendered, and
+# requests repeating the key get that response back without running the
+# permission checks, validation or writes again. A duplicate that arrives
+# while the first request is still running polls the entry until the
+# response is stored. Entries are per user and expire after
+# IDEMPOTENCY_TTL seconds. Keys are exact across processes when the cache
+# is shared (Redis), and within one process on local memory.
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+POLL_INTERVAL = 0.05
+
+IN_FLIGHT = 'in-flight'
+DONE = 'done'
+
+
+def get_cache():
+    return caches[getattr(settings, 'IDEMPOTENCY_CACHE_ALIAS', 'default')]
+
+
+def cache_key(user_id, key):
+    return f'idempotency:{user_id}:{hashlib.sha256(key.encode()).hexdigest()}'
+
+
+def fingerprint(request):
+    # Reusing a key for a different request is an error, not a replay
+    digest = hashlib.sha256(f'{request.method} {request.get_full_path()}\n'.encode())
+    digest.update(request.body)
+    return digest.hexdigest()
+
+
+class Replay(Exception):
+    # Raised from initial() to answer with a stored or error response
+    def __init__(self, response):
+        self.response = response
+
+
+class Claim:
+    """
+    The right to run a request for a key, held while it executes.
+    """
+
+    def __init__(self, cache, key, fingerprint):
+        self.cache = cache
+        self.key = key
+        self.fingerprint = fingerprint
+
+    def store(self, response):
+        entry = (DONE, self.fingerprint, response.status_code, response.get('Content-Type'), response.content)
+        self.cache.set(self.key, entry, getattr(settings, 'IDEMPOTENCY_TTL', 60 * 60 * 24))
+
+    def release(self):
+        # Lets a retry run the request again
+        self.cache.delete(self.key)
+
+
+def stored_response(entry):
+    _, _, status_code, content_type, content = entry
+    response = HttpResponse(content, status=status_code, content_type=content_type)
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def claim(user_id, key, request_fingerprint, cache=None):
+    """
+    Claims ``key`` for the user, waiting while another request holds it.
+
+    Returns a Claim when the request should run, or raises Replay with the
+    stored response, or with an error response when the key was used for a
+    different request or the original request takes too long.
+    """
+    cache = cache or get_cache()
+    entry_key = cache_key(user_id, key)
+    lock_timeout = getattr(settings, 'IDEMPOTENCY_LOCK_TIMEOUT', 60)
+    deadline = time.monotonic() + getattr(settings, 'IDEMPOTENCY_WAIT', 10)
+    while True:
+        if cache.add(entry_key, (IN_FLIGHT, request_fingerprint), lock_timeout):
+            return Claim(cache, entry_key, request_fingerprint)
+        entry = cache.get(entry_key)
+        if entry is None:
+            # Released or expired in the meantime
+            continue
+        if entry[1] != request_fingerprint:
+            raise Replay(Response(
+                {"error": f"This {HEADER} was already used for a different request."},
+                status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            ))
+        if entry[0] == DONE:
+            raise Replay(stored_response(entry))
+        if time.monotonic() >= deadline:
+            raise Replay(Response(
+                {"error": f"A request with this {HEADER} is still being processed."},
+                status=status.HTTP_409_CONFLICT,
+            ))
+        time.sleep(POLL_INTERVAL)
+
+
+def should_store(response):
+    # Authentication, permission and throttling failures come from checks
+    # the retry should repeat; so do server errors
+    return response.status_code < 500 and response.status_code not in (401, 403, 429)
+
+
+class IdempotencyMixin:
+    # Honors the Idempotency-Key header on a viewset's unsafe methods
+
+    def dispatch(self, request, *args, **kwargs):
+        self.idempotency_claim = None
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        except BaseException:
+            if self.idempotency_claim is not None:
+                self.idempotency_claim.release()
+            raise
+
+    def initial(self, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if key and request.method not in SAFE_METHODS:
+            if len(key) > MAX_KEY_LENGTH:
+                raise Replay(Response(
+                    {"error": f"{HEADER} must be at most {MAX_KEY_LENGTH} characters."},
+                    status=status.HTTP_400_BAD_REQUEST,
+                ))
+            self.perform_authentication(request)
+            if request.user.is_authenticated:
+                self.idempotency_claim = claim(request.user.pk, key, fingerprint(request))
+        super().initial(request, *args, **kwargs)
+
+    def handle_exception(self, exc):
+        if isinstance(exc, Replay):
+            return exc.response
+        return super().handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        current, self.idempotency_claim = self.idempotency_claim, None
+        if current is None:
+            return response
+        if not should_store(response) or getattr(response, 'streaming', False):
+            current.release()
+        elif hasattr(response, 'add_post_render_callback') and not response.is_rendered:
+            # Stored once the response body exists
+            response.add_post_render_callback(current.store)
+        else:
+            current.store(response)
+        return response
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from restaurant.archive import archive_orders, default_cutoff
+
+
+class Command(BaseCommand):
+    help = (
+        'Moves delivered orders older than the cutoff, with their items, to '
+        'the archive tables in batches of orders. Every batch is committed on '
+        'its own, so an interrupted run is resumed by running it again.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--before',
+            help='Archive orders dated before this day (YYYY-MM-DD), defaults to ORDER_ARCHIVE_AFTER_DAYS ago',
+        )
+        parser.add_argument('--batch-size', type=int, help='Orders moved per transaction')
+
+    def handle(self, *args, **options):
+        before = self.parse(options['before']) if options['before'] else default_cutoff()
+        if options['batch_size'] is not None and options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1.')
+
+        orders = items = 0
+        for batch_orders, batch_items, last_id in archive_orders(before, options['batch_size']):
+            orders += batch_orders
+            items += batch_items
+            self.stdout.write(f'{batch_orders} orders, {batch_items} items (up to order {last_id})')
+        self.stdout.write(self.style.SUCCESS(f'Done, {orders} orders and {items} items dated before {before} archived.'))
+
+    def parse(self, value):
+        try:
+            parsed = parse_date(value)
+        except ValueError:
+            parsed = None
+        if parsed is None:
+            raise CommandError(f'Invalid date "{value}", expected YYYY-MM-DD.')
+        return parsed
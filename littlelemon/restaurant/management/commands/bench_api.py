@@ -0,0 +1,366 @@
+import asyncio
+import io
+import json
+import random
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group, User
+from django.core.asgi import get_asgi_application
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+from django.db import connection
+from django.test.utils import override_settings
+
+from restaurant.metrics import registry
+from restaurant.models import Category, MenuItem, Order, OrderItem
+from restaurant.roles import CUSTOMER, DELIVERY_CREW, MANAGER, invalidate_roles
+from restaurant.rollup import rebuild
+from restaurant.search import index_menu_items
+
+from .loadtest_async import asgi_request, unthrottled
+
+PASSWORD = 'bench-pass-123'
+DEFAULT_MIX = 'browse=60,cart_add=20,order_list=15,order_status=5'
+ADJECTIVES = ['Lemon', 'Grilled', 'Roasted', 'Spicy', 'Greek', 'Smoked', 'Garlic', 'Herb']
+DISHES = ['Salad', 'Soup', 'Chicken', 'Fish', 'Pasta', 'Tart', 'Pie', 'Bread', 'Lamb', 'Rice']
+BATCH_SIZE = 1000
+
+
+def wsgi_request(app, method, path, token=None, body=None):
+    # Drives the WSGI application in-process; returns (status, body bytes)
+    path, _, query = path.partition('?')
+    data = json.dumps(body).encode() if body is not None else b''
+    environ = {
+        'REQUEST_METHOD': method,
+        'SCRIPT_NAME': '',
+        'PATH_INFO': path,
+        'QUERY_STRING': query,
+        'SERVER_NAME': 'localhost',
+        'SERVER_PORT': '80',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'REMOTE_ADDR': '127.0.0.1',
+        'HTTP_HOST': 'localhost',
+        'CONTENT_LENGTH': str(len(data)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': 'http',
+        'wsgi.input': io.BytesIO(data),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    if token:
+        environ['HTTP_AUTHORIZATION'] = f'Bearer {token}'
+    if body is not None:
+        environ['CONTENT_TYPE'] = 'application/json'
+    statuses = []
+
+    def start_response(status, headers, exc_info=None):
+        statuses.append(int(status.split()[0]))
+
+    result = app(environ, start_response)
+    try:
+        content = b''.join(result)
+    finally:
+        if hasattr(result, 'close'):
+            result.close()
+    return statuses[0], content
+
+
+def percentiles(latencies):
+    if len(latencies) < 2:
+        cuts = [latencies[0] if latencies else 0] * 99
+    else:
+        cuts = statistics.quantiles(latencies, n=100)
+    return {
+        'p50_ms': round(cuts[49] * 1000, 2),
+        'p95_ms': round(cuts[94] * 1000, 2),
+        'p99_ms': round(cuts[98] * 1000, 2),
+    }
+
+
+def parse_mix(value):
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        if name not in ('browse', 'cart_add', 'order_list', 'order_status') or not weight.isdigit():
+            raise CommandError(f'Invalid --mix entry "{part}".')
+        mix[name] = int(weight)
+    return mix
+
+
+class Command(BaseCommand):
+    help = (
+        'Seeds a throwaway database with configurable volumes and drives a '
+        'seeded mix of menu browsing, cart adds, order listing and order '
+        'status updates through the WSGI and ASGI applications in-process. '
+        'Prints throughput, latency percentiles and queries per request as '
+        'JSON to compare between commits.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--categories', type=int, default=10)
+        parser.add_argument('--menu-items', type=int, default=1000)
+        parser.add_argument('--managers', type=int, default=2)
+        parser.add_argument('--crew', type=int, default=10, help='Delivery crew users')
+        parser.add_argument('--customers', type=int, default=50)
+        parser.add_argument('--orders', type=int, default=5000)
+        parser.add_argument('--items-per-order', type=int, default=3)
+        parser.add_argument('--requests', type=int, default=2000, help='Requests per server')
+        parser.add_argument('--concurrency', type=int, default=16)
+        parser.add_argument('--mix', type=parse_mix, default=DEFAULT_MIX,
+                            help=f'Scenario weights (default {DEFAULT_MIX})')
+        parser.add_argument('--servers', nargs='+', choices=['wsgi', 'asgi'], default=['wsgi', 'asgi'])
+        parser.add_argument('--seed', type=int, default=1, help='Random seed for data and traffic')
+        parser.add_argument('--output', help='Write the JSON report to this file')
+
+    def handle(self, *args, **options):
+        if isinstance(options['mix'], str):
+            options['mix'] = parse_mix(options['mix'])
+        if options['items_per_order'] > options['menu_items']:
+            raise CommandError('--items-per-order cannot exceed --menu-items.')
+
+        # Production-like settings: no DEBUG query log, every request
+        # measured for the per-route query counts, fast password checks
+        overrides = override_settings(
+            DEBUG=False,
+            ALLOWED_HOSTS=['localhost'],
+            PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+            PERF_SAMPLE_RATE=1.0,
+            PERF_SLOW_REQUEST_MS=None,
+        )
+        results = []
+        with unthrottled(), overrides:
+            for server in options['servers']:
+                results.append(self.run_server(server, options))
+
+        report = {
+            'commit': self.commit(),
+            'config': {
+                key: options[key]
+                for key in ('categories', 'menu_items', 'managers', 'crew', 'customers', 'orders',
+                            'items_per_order', 'requests', 'concurrency', 'mix', 'seed')
+            },
+            'results': results,
+        }
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+        else:
+            self.stdout.write(output)
+
+    def run_server(self, server, options):
+        # Every server starts from the same freshly seeded database
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            for cache in caches.all():
+                cache.clear()
+            invalidate_roles()
+            rng = random.Random(options['seed'])
+            context = self.seed(options, rng)
+            plan = self.plan(options, rng, context)
+            if server == 'wsgi':
+                samples, elapsed, logins = self.drive_wsgi(plan, options['concurrency'])
+            else:
+                samples, elapsed, logins = asyncio.run(self.drive_asgi(plan, options['concurrency']))
+            return self.summarize(server, samples, elapsed, logins)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def seed(self, options, rng):
+        password = make_password(PASSWORD)
+        users = {}
+        for role, count in ((MANAGER, options['managers']), (DELIVERY_CREW, options['crew']),
+                            (CUSTOMER, options['customers'])):
+            group = Group.objects.create(name=role)
+            prefix = role.lower().replace(' ', '-')
+            users[role] = User.objects.bulk_create([
+                User(username=f'bench-{prefix}-{i}', password=password) for i in range(count)
+            ])
+            User.groups.through.objects.bulk_create([
+                User.groups.through(user_id=user.pk, group_id=group.pk) for user in users[role]
+            ])
+        if not users[CUSTOMER]:
+            raise CommandError('At least one customer is needed.')
+
+        categories = Category.objects.bulk_create([
+            Category(slug=f'category-{i}', title=f'Category {i}') for i in range(options['categories'])
+        ])
+        items = MenuItem.objects.bulk_create([
+            MenuItem(
+                title=f'{rng.choice(ADJECTIVES)} {rng.choice(DISHES)} {i}',
+                price=Decimal(rng.randint(300, 3000)) / 100,
+                featured=rng.random() < 0.2,
+                category=rng.choice(categories),
+            )
+            for i in range(options['menu_items'])
+        ], batch_size=BATCH_SIZE)
+
+        today = date.today()
+        crew = users[DELIVERY_CREW]
+        orders, lines = [], []
+        for _ in range(options['orders']):
+            chosen = rng.sample(items, options['items_per_order'])
+            quantities = [rng.randint(1, 3) for _ in chosen]
+            orders.append(Order(
+                user=rng.choice(users[CUSTOMER]),
+                delivery_crew=rng.choice(crew) if crew and rng.random() < 0.8 else None,
+                status=rng.random() < 0.5,
+                total=sum(item.price * quantity for item, quantity in zip(chosen, quantities)),
+                date=today - timedelta(days=rng.randint(0, 365)),
+            ))
+            lines.append(list(zip(chosen, quantities)))
+        orders = Order.objects.bulk_create(orders, batch_size=BATCH_SIZE)
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, menuitem=item, quantity=quantity,
+                      unit_price=item.price, price=item.price * quantity)
+            for order, order_lines in zip(orders, lines)
+            for item, quantity in order_lines
+        ], batch_size=BATCH_SIZE)
+
+        # bulk_create skips the signals that maintain these
+        index_menu_items()
+        for _ in rebuild():
+            pass
+
+        return {
+            'categories': [category.pk for category in categories],
+            'items': [item.pk for item in items],
+            'customers': [user.username for user in users[CUSTOMER]],
+            'crew': [user.username for user in crew],
+            'crew_orders': [
+                (order.delivery_crew.username, order.pk) for order in orders if order.delivery_crew
+            ],
+        }
+
+    def plan(self, options, rng, context):
+        # The same seed produces the same requests, in the same order
+        names = list(options['mix'])
+        weights = [options['mix'][name] for name in names]
+        plan = []
+        for _ in range(options['requests']):
+            scenario = rng.choices(names, weights)[0]
+            customer = rng.choice(context['customers'])
+            if scenario == 'browse':
+                path = rng.choice([
+                    '/menu-items/?page_size=20',
+                    f'/menu-items/?category={rng.choice(context["categories"] or [0])}',
+                    f'/menu-items/?search={rng.choice(DISHES).lower()}',
+                    f'/menu-items/?ordering=-price&page={rng.randint(1, 5)}',
+                    '/menu-items/?featured=true&ordering=price',
+                ])
+                plan.append((scenario, customer, 'GET', path, None))
+            elif scenario == 'cart_add':
+                body = {'menuitem': rng.choice(context['items']), 'quantity': 1}
+                plan.append((scenario, customer, 'POST', '/cart/', body))
+            elif scenario == 'order_list':
+                user = rng.choice(context['crew']) if context['crew'] and rng.random() < 0.3 else customer
+                plan.append((scenario, user, 'GET', '/orders/?page_size=20', None))
+            elif context['crew_orders']:
+                crew, order_id = rng.choice(context['crew_orders'])
+                plan.append((scenario, crew, 'PATCH', f'/orders/{order_id}/', {'status': rng.random() < 0.5}))
+        return plan
+
+    def login(self, status, content, username):
+        if status != 200:
+            raise CommandError(f'Could not obtain a token for {username}: HTTP {status}')
+        return json.loads(content)['access']
+
+    def drive_wsgi(self, plan, concurrency):
+        app = get_wsgi_application()
+        tokens, logins = {}, []
+        for username in sorted({entry[1] for entry in plan}):
+            started = time.perf_counter()
+            status, content = wsgi_request(app, 'POST', '/api/token/', body={'username': username, 'password': PASSWORD})
+            logins.append(time.perf_counter() - started)
+            tokens[username] = self.login(status, content, username)
+        registry.clear()
+
+        def one(entry):
+            scenario, username, method, path, body = entry
+            started = time.perf_counter()
+            status, _ = wsgi_request(app, method, path, tokens[username], body)
+            return scenario, status, time.perf_counter() - started
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as pool:
+            samples = list(pool.map(one, plan))
+        return samples, time.perf_counter() - started, logins
+
+    async def drive_asgi(self, plan, concurrency):
+        app = get_asgi_application()
+        tokens, logins = {}, []
+        for username in sorted({entry[1] for entry in plan}):
+            started = time.perf_counter()
+            status, content = await asgi_request(app, 'POST', '/api/token/', body={'username': username, 'password': PASSWORD})
+            logins.append(time.perf_counter() - started)
+            tokens[username] = self.login(status, content, username)
+        registry.clear()
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def one(entry):
+            scenario, username, method, path, body = entry
+            async with semaphore:
+                started = time.perf_counter()
+                status, _ = await asgi_request(app, method, path, tokens[username], body)
+                return scenario, status, time.perf_counter() - started
+
+        started = time.perf_counter()
+        samples = await asyncio.gather(*(one(entry) for entry in plan))
+        return samples, time.perf_counter() - started, logins
+
+    def summarize(self, server, samples, elapsed, logins):
+        by_scenario = defaultdict(list)
+        errors = defaultdict(int)
+        for scenario, status, latency in samples:
+            by_scenario[scenario].append(latency)
+            if status >= 400:
+                errors[scenario] += 1
+
+        # Per-route query counts come from the request metrics middleware
+        routes = defaultdict(dict)
+        for (metric, route, method), (count, total) in registry.totals().items():
+            if metric == 'db_queries':
+                routes[f'{method} {route}']['requests'] = count
+                routes[f'{method} {route}']['queries_per_request'] = round(total / count, 2)
+            elif metric == 'db_duration':
+                routes[f'{method} {route}']['db_ms_per_request'] = round(total / count * 1000, 3)
+
+        return {
+            'server': server,
+            'requests': len(samples),
+            'errors': sum(errors.values()),
+            'throughput_rps': round(len(samples) / elapsed, 1) if elapsed else None,
+            **percentiles([latency for _, _, latency in samples]),
+            'login': {'requests': len(logins), **percentiles(logins)},
+            'scenarios': {
+                scenario: {
+                    'requests': len(latencies),
+                    'errors': errors[scenario],
+                    **percentiles(latencies),
+                }
+                for scenario, latencies in sorted(by_scenario.items())
+            },
+            'routes': dict(sorted(routes.items())),
+        }
+
+    def commit(self):
+        # Identifies the code under test when reports are compared
+        try:
+            result = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+                                    capture_output=True, text=True, check=True)
+        except (OSError, subprocess.CalledProcessError):
+            return None
+        return result.stdout.strip()
@@ -0,0 +1,94 @@
+import json
+import time
+from datetime import date
+from decimal import Decimal
+
+from django.contrib.auth.models import Group, User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Count, Q
+
+from restaurant.dispatch import dispatch_pending_orders
+from restaurant.models import Order
+from restaurant.roles import DELIVERY_CREW
+
+
+class Command(BaseCommand):
+    help = (
+        'Assigns a backlog of pending orders to the delivery crew with the '
+        'batch dispatch engine and with a per-order loop that recounts every '
+        'crew member\'s load before each assignment, and reports the time, '
+        'query count and resulting load spread of both. Runs against a '
+        'throwaway test database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=10000)
+        parser.add_argument('--crew', type=int, default=25)
+
+    def handle(self, *args, **options):
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            self.seed(options['crew'])
+            results = [
+                self.measure('engine', dispatch_pending_orders, options['orders']),
+                self.measure('naive', self.naive, options['orders']),
+            ]
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+        self.stdout.write(json.dumps(results, indent=2))
+
+    def seed(self, crew):
+        group = Group.objects.get_or_create(name=DELIVERY_CREW)[0]
+        self.customer = User.objects.create(username='bench-customer')
+        members = User.objects.bulk_create([User(username=f'bench-crew-{i}') for i in range(crew)])
+        group.user_set.add(*members)
+
+    def measure(self, name, dispatch, orders):
+        Order.objects.all().delete()
+        Order.objects.bulk_create([
+            Order(user=self.customer, total=Decimal('12.50'), date=date(2025, 1, 1 + i % 28))
+            for i in range(orders)
+        ], batch_size=1000)
+        # CaptureQueriesContext keeps only the last 9000 queries
+        queries = []
+
+        def count(execute, sql, params, many, context):
+            queries.append(sql)
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(count):
+            started = time.perf_counter()
+            assigned = len(dispatch())
+            elapsed = time.perf_counter() - started
+        loads = list(
+            User.objects.filter(groups__name=DELIVERY_CREW)
+            .annotate(load=Count('orders', filter=Q(orders__status=False)))
+            .values_list('load', flat=True)
+        )
+        return {
+            'strategy': name,
+            'orders': orders,
+            'assigned': assigned,
+            'seconds': round(elapsed, 3),
+            'queries': len(queries),
+            'load_min': min(loads),
+            'load_max': max(loads),
+        }
+
+    def naive(self):
+        # What a view looping over orders would do: count, pick, save
+        assignments = []
+        with transaction.atomic():
+            for order in Order.objects.filter(status=False, delivery_crew__isnull=True).order_by('date', 'pk'):
+                crew = (
+                    User.objects.filter(groups__name=DELIVERY_CREW, is_active=True)
+                    .annotate(load=Count('orders', filter=Q(orders__status=False)))
+                    .order_by('load', 'pk')
+                    .first()
+                )
+                order.delivery_crew = crew
+                order.save(update_fields=['delivery_crew'])
+                assignments.append((order.pk, crew.pk))
+        return assignments
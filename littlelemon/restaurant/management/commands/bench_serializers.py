@@ -0,0 +1,102 @@
+import json
+import time
+from datetime import date
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from rest_framework.renderers import JSONRenderer
+
+from restaurant.fastpath import compile_serializer
+from restaurant.models import Cart, Category, MenuItem, Order, OrderItem
+from restaurant.prefetch import optimize_queryset
+from restaurant.renderers import FastJSONRenderer
+from restaurant.serializers import CartSerializer, MenuItemSerializer, OrderSerializer
+
+
+class Command(BaseCommand):
+    help = (
+        'Measures the per-row cost of listing menu items, cart lines and '
+        'orders through the ModelSerializer and JSONRenderer against the '
+        '.values() fast path and FastJSONRenderer, and checks that both '
+        'produce the same bytes. Runs against a throwaway test database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=[1000, 10000])
+        parser.add_argument('--repeat', type=int, default=3, help='Runs per case; the fastest is kept')
+
+    def handle(self, *args, **options):
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            results = []
+            for rows in options['rows']:
+                self.seed(rows)
+                results += self.benchmark(rows, options['repeat'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+        self.stdout.write(json.dumps(results, indent=2))
+
+    def seed(self, rows):
+        # Tops every table up to ``rows`` rows; orders get two items each
+        user = User.objects.get_or_create(username='bench-customer')[0]
+        category = Category.objects.get_or_create(slug='mains', title='Mains')[0]
+        MenuItem.objects.bulk_create([
+            MenuItem(title=f'Dish {i}', price=Decimal(500 + i % 2000) / 100, featured=i % 3 == 0, category=category)
+            for i in range(MenuItem.objects.count(), rows)
+        ], batch_size=1000)
+        items = list(MenuItem.objects.order_by('pk')[:rows])
+        Cart.objects.bulk_create([
+            Cart(user=user, menuitem=item, quantity=2, unit_price=item.price, price=item.price * 2)
+            for item in items[Cart.objects.count():]
+        ], batch_size=1000)
+        orders = Order.objects.bulk_create([
+            Order(user=user, total=Decimal('12.50'), date=date(2025, 1, 1 + i % 28))
+            for i in range(Order.objects.count(), rows)
+        ], batch_size=1000)
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, menuitem=item, quantity=1, unit_price=item.price, price=item.price)
+            for order in orders for item in items[:2]
+        ], batch_size=1000)
+
+    def benchmark(self, rows, repeat):
+        cases = [
+            (MenuItemSerializer, MenuItem.objects.order_by('pk')[:rows]),
+            (CartSerializer, Cart.objects.order_by('pk')[:rows]),
+            (OrderSerializer, Order.objects.order_by('pk')[:rows]),
+        ]
+        results = []
+        for serializer_class, queryset in cases:
+            compiled = compile_serializer(serializer_class)
+
+            def serializer():
+                data = serializer_class(optimize_queryset(queryset, serializer_class), many=True).data
+                return JSONRenderer().render(data)
+
+            def fast():
+                return FastJSONRenderer().render(compiled.represent(list(compiled.values(queryset))))
+
+            timings = {}
+            bodies = {}
+            for name, build in (('serializer', serializer), ('fast', fast)):
+                best = None
+                for _ in range(repeat):
+                    started = time.perf_counter()
+                    bodies[name] = build()
+                    elapsed = time.perf_counter() - started
+                    best = elapsed if best is None else min(best, elapsed)
+                timings[name] = best
+            if bodies['serializer'] != bodies['fast']:
+                raise CommandError(f'{serializer_class.__name__}: fast path output differs from the serializer')
+
+            results.append({
+                'serializer': serializer_class.__name__,
+                'rows': rows,
+                'bytes': len(bodies['fast']),
+                'serializer_us_per_row': round(timings['serializer'] / rows * 1e6, 2),
+                'fast_us_per_row': round(timings['fast'] / rows * 1e6, 2),
+                'speedup': round(timings['serializer'] / timings['fast'], 1),
+            })
+        return results
@@ -0,0 +1,161 @@
+import importlib.util
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from restaurant.startup import memory_kib
+
+# Run in a fresh interpreter per measurement: loads the application and the
+# URL configuration (which imports every view) and reports the time and
+# memory that took
+PROBE = '''
+import json, os, sys, time
+started = time.perf_counter()
+os.environ['DJANGO_SETTINGS_MODULE'] = 'littlelemon.settings'
+from littlelemon.{entry} import application
+loaded = time.perf_counter()
+from django.urls import get_resolver
+get_resolver().url_patterns
+resolved = time.perf_counter()
+from restaurant.startup import memory_kib
+print(json.dumps({{
+    'app_ms': (loaded - started) * 1000,
+    'urls_ms': (resolved - loaded) * 1000,
+    'modules': len(sys.modules),
+    **memory_kib(),
+}}))
+'''
+
+# Everything enabled, and what a lean production process loads
+CONFIGS = {
+    'full': {'ADMIN_ENABLED': '1', 'API_DOCS_ENABLED': '1'},
+    'lean': {'ADMIN_ENABLED': '0', 'API_DOCS_ENABLED': '0'},
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Measures cold start: the time and memory a new process needs to load '
+        'the application and its URLs, with and without the admin and API '
+        'docs. With --serve, also starts gunicorn with gunicorn.conf.py and '
+        'reports the time until it answers and the RSS and PSS of every '
+        'worker. Prints JSON so runs from two commits can be compared.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=5, help='Processes started per configuration; medians are reported')
+        parser.add_argument('--asgi', action='store_true', help='Load asgi.py (and serve it with uvicorn workers)')
+        parser.add_argument('--serve', action='store_true', help='Also measure a preforked gunicorn server')
+        parser.add_argument('--workers', type=int, default=2)
+
+    def handle(self, *args, **options):
+        if options['runs'] < 1:
+            raise CommandError('--runs must be at least 1.')
+        entry = 'asgi' if options['asgi'] else 'wsgi'
+        report = {
+            'entry': entry,
+            'python': sys.version.split()[0],
+            'import': {name: self.probe(entry, env, options['runs']) for name, env in CONFIGS.items()},
+        }
+        if options['serve']:
+            report['serve'] = {name: self.serve(entry, env, options['workers']) for name, env in CONFIGS.items()}
+        self.stdout.write(json.dumps(report, indent=2))
+
+    def environ(self, env):
+        return {**os.environ, **env, 'PYTHONPATH': str(settings.BASE_DIR)}
+
+    def probe(self, entry, env, runs):
+        samples = []
+        for _ in range(runs):
+            started = time.perf_counter()
+            result = subprocess.run(
+                [sys.executable, '-c', PROBE.format(entry=entry)],
+                cwd=settings.BASE_DIR, env=self.environ(env), capture_output=True, text=True,
+            )
+            if result.returncode:
+                raise CommandError(f'Loading the application failed:\n{result.stderr}')
+            sample = json.loads(result.stdout.strip().splitlines()[-1])
+            sample['process_ms'] = (time.perf_counter() - started) * 1000
+            samples.append(sample)
+        return {
+            key: round(statistics.median(sample[key] for sample in samples), 1)
+            for key in samples[0] if samples[0][key] is not None
+        }
+
+    def serve(self, entry, env, workers):
+        if importlib.util.find_spec('gunicorn') is None:
+            raise CommandError('gunicorn is not installed.')
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            port = sock.getsockname()[1]
+        # Every worker is measured, shared caches or not
+        env = {
+            **env, 'WEB_CONCURRENCY': str(workers), 'GUNICORN_BIND': f'127.0.0.1:{port}',
+            'GUNICORN_ALLOW_LOCAL_STATE': '1',
+        }
+        if entry == 'asgi':
+            env['GUNICORN_WORKER_CLASS'] = 'uvicorn.workers.UvicornWorker'
+
+        started = time.perf_counter()
+        server = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', f'littlelemon.{entry}'],
+            cwd=settings.BASE_DIR, env=self.environ(env), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            self.wait_until_serving(server, port, started + 60)
+            ready_ms = (time.perf_counter() - started) * 1000
+            pids = self.wait_for_workers(server, workers, started + 60)
+            # One request per worker is not guaranteed to land on each of
+            # them, but it loads what the first request needs somewhere
+            for _ in pids:
+                self.get(port)
+            return {
+                'ready_ms': round(ready_ms, 1),
+                'master': memory_kib(server.pid),
+                'workers': [memory_kib(pid) for pid in pids],
+            }
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+
+    def wait_until_serving(self, server, port, deadline):
+        while True:
+            if server.poll() is not None:
+                raise CommandError(f'gunicorn exited with status {server.returncode}.')
+            if time.perf_counter() > deadline:
+                raise CommandError('gunicorn did not answer within 60 seconds.')
+            try:
+                self.get(port)
+                return
+            except OSError:
+                time.sleep(0.02)
+
+    def wait_for_workers(self, server, workers, deadline):
+        while True:
+            pids = self.children(server.pid)
+            if len(pids) >= workers or time.perf_counter() > deadline:
+                return pids
+            time.sleep(0.02)
+
+    def get(self, port):
+        # Any HTTP response means a worker served the request
+        try:
+            urllib.request.urlopen(f'http://127.0.0.1:{port}/menu-items/', timeout=5).close()
+        except urllib.error.HTTPError:
+            pass
+
+    def children(self, pid):
+        try:
+            with open(f'/proc/{pid}/task/{pid}/children') as f:
+                return [int(child) for child in f.read().split()]
+        except OSError:
+            return []
@@ -0,0 +1,60 @@
+import json
+import time
+from types import SimpleNamespace
+
+from django.core.cache import caches
+from django.core.management.base import BaseCommand
+from rest_framework.throttling import UserRateThrottle
+
+from restaurant.throttling import SlidingWindowUserRateThrottle
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures the per-request cost of DRF's UserRateThrottle against the "
+        "sliding window throttle when a user already has N requests in the "
+        "current window."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--history', type=int, nargs='+', default=[1000, 1000000],
+                            help='Requests already made in the window')
+        parser.add_argument('--samples', type=int, default=20, help='Requests timed per case')
+        parser.add_argument('--cache', default='throttle', help='Cache alias to run against')
+
+    def handle(self, *args, **options):
+        cache = caches[options['cache']]
+        request = SimpleNamespace(user=SimpleNamespace(is_authenticated=True, pk=1), META={})
+        results = []
+
+        for history in options['history']:
+            # The limit is well above the history so every timed request is allowed
+            rate = f'{history * 10}/day'
+            for base in (UserRateThrottle, SlidingWindowUserRateThrottle):
+                throttle_class = type(base.__name__, (base,), {'rate': rate, 'cache': cache})
+                throttle = throttle_class()
+                key = throttle.get_cache_key(request, None)
+                cache.clear()
+                self.prefill(throttle, key, history, cache)
+
+                started = time.perf_counter()
+                for _ in range(options['samples']):
+                    assert throttle_class().allow_request(request, None)
+                elapsed = time.perf_counter() - started
+
+                results.append({
+                    'throttle': base.__name__,
+                    'history': history,
+                    'us_per_request': round(elapsed / options['samples'] * 1e6, 1),
+                })
+        cache.clear()
+        self.stdout.write(json.dumps(results, indent=2))
+
+    def prefill(self, throttle, key, history, cache):
+        # Put the cache in the state it would be in after ``history`` requests
+        now = time.time()
+        if isinstance(throttle, SlidingWindowUserRateThrottle):
+            window = int(now // throttle.duration)
+            cache.set(f'{key}:{window}', history, throttle.duration * 2)
+        else:
+            cache.set(key, [now] * history, throttle.duration)
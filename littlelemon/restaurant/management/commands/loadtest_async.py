@@ -0,0 +1,162 @@
+import asyncio
+import json
+import statistics
+import time
+from contextlib import contextmanager
+from datetime import date
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth.models import Group, User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import override_settings
+
+from restaurant.authentication import RoleTokenObtainPairSerializer
+from restaurant.models import Category, MenuItem, Order
+from restaurant.roles import CUSTOMER
+
+
+async def asgi_request(app, method, path, token=None, body=None):
+    # Drives the ASGI application in-process; returns (status, body bytes)
+    path, _, query = path.partition('?')
+    data = json.dumps(body).encode() if body is not None else b''
+    headers = [(b'host', b'localhost')]
+    if token:
+        headers.append((b'authorization', f'Bearer {token}'.encode()))
+    if body is not None:
+        headers += [(b'content-type', b'application/json'), (b'content-length', str(len(data)).encode())]
+    scope = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': method,
+        'scheme': 'http',
+        'path': path,
+        'raw_path': path.encode(),
+        'query_string': query.encode(),
+        'root_path': '',
+        'headers': headers,
+        'client': ('127.0.0.1', 50000),
+        'server': ('localhost', 80),
+    }
+    response = {'body': b''}
+    body_sent = False
+
+    async def receive():
+        nonlocal body_sent
+        if body_sent:
+            # Nothing more to say; Django cancels this once it has responded
+            await asyncio.Event().wait()
+        body_sent = True
+        return {'type': 'http.request', 'body': data, 'more_body': False}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            response['status'] = message['status']
+        elif message['type'] == 'http.response.body':
+            response['body'] += message.get('body', b'')
+
+    await app(scope, receive, send)
+    return response['status'], response['body']
+
+
+async def asgi_get(app, path, token):
+    status, _ = await asgi_request(app, 'GET', path, token)
+    return status
+
+
+@contextmanager
+def unthrottled():
+    # Lifts every throttle scope for the duration of a benchmark
+    rates = settings.REST_FRAMEWORK['DEFAULT_THROTTLE_RATES']
+    saved = dict(rates)
+    rates.update({scope: '100000000/day' for scope in rates})
+    try:
+        yield
+    finally:
+        rates.clear()
+        rates.update(saved)
+
+
+async def run(app, path, token, requests, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    async def one():
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            status = await asgi_get(app, path, token)
+            latencies.append(time.perf_counter() - started)
+            if status != 200:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    elapsed = time.perf_counter() - started
+
+    cuts = statistics.quantiles(latencies, n=100)
+    return {
+        'path': path,
+        'requests': requests,
+        'errors': errors,
+        'throughput_rps': round(requests / elapsed, 1),
+        'p50_ms': round(cuts[49] * 1000, 2),
+        'p95_ms': round(cuts[94] * 1000, 2),
+        'p99_ms': round(cuts[98] * 1000, 2),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Compares throughput and tail latency of the async read endpoints with '
+        'MenuItemViewSet/OrderViewSet under the same concurrency, through the '
+        'ASGI application and a throwaway test database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help='Requests per endpoint')
+        parser.add_argument('--concurrency', type=int, default=50)
+        parser.add_argument('--menu-items', type=int, default=200, help='Menu items to seed')
+
+    def handle(self, *args, **options):
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            results = self.benchmark(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+        self.stdout.write(json.dumps(results, indent=2))
+
+    def seed(self, menu_items):
+        category = Category.objects.create(slug='mains', title='Mains')
+        MenuItem.objects.bulk_create([
+            MenuItem(title=f'Dish {i}', price=Decimal('5.00') + i % 20, featured=i % 3 == 0, category=category)
+            for i in range(menu_items)
+        ])
+        customer = User.objects.create_user('loadtest-customer')
+        customer.groups.add(Group.objects.create(name=CUSTOMER))
+        order = Order.objects.create(user=customer, total=Decimal('10.00'), date=date.today())
+        return str(RoleTokenObtainPairSerializer.get_token(customer).access_token), order
+
+    def benchmark(self, options):
+        from littlelemon.asgi import application
+
+        token, order = self.seed(options['menu_items'])
+        pairs = [
+            ('/menu-items/?page_size=20', '/async/menu-items/?page_size=20'),
+            (f'/orders/{order.pk}/', f'/async/orders/{order.pk}/status/'),
+        ]
+
+        # Lift the throttles and the menu response cache so both sides do
+        # the same amount of work on every request
+        with unthrottled(), override_settings(MENU_CACHE_TIMEOUT=0):
+            results = []
+            for sync_path, async_path in pairs:
+                for path in (sync_path, async_path):
+                    results.append(asyncio.run(run(
+                        application, path, token, options['requests'], options['concurrency'],
+                    )))
+        return {'concurrency': options['concurrency'], 'results': results}
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from restaurant.rollup import rebuild
+
+
+class Command(BaseCommand):
+    help = (
+        'Rebuilds or backfills the DailySales rollup from orders, in batches of '
+        'days. Use --start to resume an interrupted run from the last batch '
+        'it reported.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', help='First day (YYYY-MM-DD), defaults to the oldest order')
+        parser.add_argument('--end', help='Last day (YYYY-MM-DD), defaults to the newest order')
+        parser.add_argument('--batch-days', type=int, default=31, help='Days recomputed per transaction')
+
+    def handle(self, *args, **options):
+        start, end = (self.parse(options[name]) for name in ('start', 'end'))
+        if options['batch_days'] < 1:
+            raise CommandError('--batch-days must be at least 1.')
+
+        total = 0
+        for first_day, last_day, rows in rebuild(start, end, options['batch_days']):
+            total += rows
+            self.stdout.write(f'{first_day} .. {last_day}: {rows} rows')
+        self.stdout.write(self.style.SUCCESS(f'Done, {total} rollup rows written.'))
+
+    def parse(self, value):
+        if value is None:
+            return None
+        try:
+            parsed = parse_date(value)
+        except ValueError:
+            parsed = None
+        if parsed is None:
+            raise CommandError(f'Invalid date "{value}", expected YYYY-MM-DD.')
+        return parsed
@@ -0,0 +1,158 @@
+import logging
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Per-route request metrics, kept in process memory.
+#
+# Each (metric, route, method) keeps its count and sum plus the most recent
+# PERF_WINDOW samples, from which p50/p95/p99 are computed when the metrics
+# are scraped. Recording a sample is O(1). Every worker process keeps its
+# own numbers, so counts and sums add up across workers but quantiles do not.
+
+METRICS = {
+    'duration': ('littlelemon_request_duration_seconds', 'Wall time spent handling the request'),
+    'db_queries': ('littlelemon_request_db_queries', 'SQL queries run for the request'),
+    'db_duration': ('littlelemon_request_db_duration_seconds', 'Time spent in SQL queries'),
+    'serialization': ('littlelemon_request_serialization_seconds', 'Time spent rendering the response body'),
+    'size': ('littlelemon_response_size_bytes', 'Response body size'),
+}
+QUANTILES = (0.5, 0.95, 0.99)
+
+_current = ContextVar('restaurant_request_stats', default=None)
+
+
+class Summary:
+    def __init__(self, window):
+        self.count = 0
+        self.total = 0
+        self.samples = deque(maxlen=window)
+
+    def observe(self, value):
+        self.count += 1
+        self.total += value
+        self.samples.append(value)
+
+    def quantiles(self):
+        values = sorted(self.samples)
+        if not values:
+            return {q: 0 for q in QUANTILES}
+        return {q: values[min(int(q * len(values)), len(values) - 1)] for q in QUANTILES}
+
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.summaries = {}
+
+    def observe(self, route, method, values):
+        window = getattr(settings, 'PERF_WINDOW', 1024)
+        with self.lock:
+            for metric, value in values.items():
+                key = (metric, route, method)
+                summary = self.summaries.get(key)
+                if summary is None:
+                    summary = self.summaries[key] = Summary(window)
+                summary.observe(value)
+
+    def totals(self):
+        # {(metric, route, method): (count, sum)}
+        with self.lock:
+            return {key: (summary.count, summary.total) for key, summary in self.summaries.items()}
+
+    def clear(self):
+        with self.lock:
+            self.summaries.clear()
+
+    def render(self):
+        # Prometheus text exposition format, one summary per metric
+        with self.lock:
+            items = sorted(
+                (key, summary.count, summary.total, summary.quantiles())
+                for key, summary in self.summaries.items()
+            )
+        lines = []
+        for metric, (name, help_text) in METRICS.items():
+            rows = [row for row in items if row[0][0] == metric]
+            if not rows:
+                continue
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} summary')
+            for (_, route, method), count, total, quantiles in rows:
+                labels = f'route="{_escape(route)}",method="{method}"'
+                for q, value in quantiles.items():
+                    lines.append(f'{name}{{{labels},quantile="{q}"}} {value:g}')
+                lines.append(f'{name}_sum{{{labels}}} {total:g}')
+                lines.append(f'{name}_count{{{labels}}} {count}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+class RequestStats:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = []
+        self.render_started = None
+        self.serialization = 0.0
+
+
+def start_request():
+    stats = RequestStats()
+    return stats, _current.set(stats)
+
+
+def finish_request(request, response, stats, token):
+    _current.reset(token)
+    duration = time.perf_counter() - stats.started
+    match = request.resolver_match
+    route = match.view_name if match is not None else 'unresolved'
+    db_duration = sum(elapsed for elapsed, _ in stats.queries)
+    values = {
+        'duration': duration,
+        'db_queries': len(stats.queries),
+        'db_duration': db_duration,
+        'serialization': stats.serialization,
+    }
+    if not response.streaming:
+        values['size'] = len(response.content)
+    registry.observe(route, request.method, values)
+
+    slow_ms = getattr(settings, 'PERF_SLOW_REQUEST_MS', None)
+    if slow_ms is not None and duration * 1000 >= slow_ms:
+        top = sorted(stats.queries, key=lambda query: query[0], reverse=True)
+        top = top[:getattr(settings, 'PERF_SLOW_TOP_QUERIES', 5)]
+        logger.warning(
+            'Slow request %s %s (%s): %.1fms, %d queries in %.1fms%s',
+            request.method, request.path, route, duration * 1000, len(stats.queries), db_duration * 1000,
+            ''.join(f'\n  {elapsed * 1000:.1f}ms {sql[:500]}' for elapsed, sql in top),
+        )
+
+
+def record_query(execute, sql, params, many, context):
+    # Installed on every connection; only times queries of sampled requests.
+    # The stats travel in a context variable so queries run by sync_to_async
+    # threads are attributed to the request that started them.
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries.append((time.perf_counter() - started, sql))
+
+
+def install_query_recorder(connection):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"')
@@ -0,0 +1,151 @@
+import random
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:  # optional, gzip only without it
+    brotli = None
+
+from . import metrics
+from .routers import replica_reads
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class ReplicaReadMiddleware:
+    # Marks safe requests so ReadReplicaRouter may serve them from the replica
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with replica_reads(request.method in SAFE_METHODS):
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        with replica_reads(request.method in SAFE_METHODS):
+            return await self.get_response(request)
+
+
+class PerfMetricsMiddleware:
+    # Records per-route timings for a PERF_SAMPLE_RATE share of requests;
+    # see restaurant.metrics
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'PERF_SAMPLE_RATE', 1.0)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def sampled(self):
+        return self.sample_rate >= 1 or random.random() < self.sample_rate
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.sampled():
+            return self.get_response(request)
+        stats, token = metrics.start_request()
+        request._perf_stats = stats
+        response = self.get_response(request)
+        metrics.finish_request(request, response, stats, token)
+        return response
+
+    async def __acall__(self, request):
+        if not self.sampled():
+            return await self.get_response(request)
+        stats, token = metrics.start_request()
+        request._perf_stats = stats
+        response = await self.get_response(request)
+        metrics.finish_request(request, response, stats, token)
+        return response
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered after the view returns; time that step
+        stats = getattr(request, '_perf_stats', None)
+        if stats is not None:
+            stats.render_started = time.perf_counter()
+
+            def rendered(response):
+                stats.serialization += time.perf_counter() - stats.render_started
+
+            response.add_post_render_callback(rendered)
+        return response
+
+
+def accepted_encodings(header):
+    # Accept-Encoding as {coding: q}, e.g. "br;q=1.0, gzip;q=0.8, *;q=0"
+    encodings = {}
+    for part in header.split(','):
+        coding, _, params = part.strip().partition(';')
+        if not coding:
+            continue
+        q = 1.0
+        name, _, value = params.strip().partition('=')
+        if name.strip() == 'q':
+            try:
+                q = float(value)
+            except ValueError:
+                q = 0.0
+        encodings[coding.strip().lower()] = q
+    return encodings
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """
+    Compresses text and JSON responses with brotli or gzip.
+
+    Responses smaller than COMPRESSION_MIN_SIZE are left alone. Brotli is
+    used when the brotli package is installed and the client rates it at
+    least as high as gzip; streamed responses are only ever gzipped and
+    server-sent event streams are never compressed.
+    """
+
+    def process_response(self, request, response):
+        if response.has_header('Content-Encoding') or not self.compressible(response):
+            return response
+        patch_vary_headers(response, ('Accept-Encoding',))
+
+        encodings = accepted_encodings(request.headers.get('Accept-Encoding', ''))
+        br, gzip = encodings.get('br', 0), encodings.get('gzip', 0)
+        if brotli is not None and not response.streaming and br > 0 and br >= gzip:
+            return self.compress_brotli(response)
+        if gzip > 0:
+            return super().process_response(request, response)
+        return response
+
+    def compressible(self, response):
+        content_type = response.get('Content-Type', '').split(';')[0].strip().lower()
+        if content_type == 'text/event-stream':
+            return False
+        if not (content_type.startswith('text/') or 'json' in content_type
+                or 'javascript' in content_type or 'xml' in content_type):
+            return False
+        return response.streaming or len(response.content) >= getattr(settings, 'COMPRESSION_MIN_SIZE', 1024)
+
+    def compress_brotli(self, response):
+        quality = getattr(settings, 'COMPRESSION_BROTLI_QUALITY', 5)
+        compressed = brotli.compress(response.content, quality=quality)
+        if len(compressed) >= len(response.content):
+            return response
+        response.content = compressed
+        response.headers['Content-Length'] = str(len(compressed))
+        # Same weak ETag handling as GZipMiddleware
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = 'br'
+        return response
@@ -0,0 +1,34 @@
+from django.db import migrations
+
+FTS_TABLE = 'restaurant_menuitem_fts'
+
+
+def create_search_index(apps, schema_editor):
+    # FTS5 only exists on SQLite; PostgreSQL uses its own full text search
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(title, category, prefix='2 3 4')"
+    )
+    schema_editor.execute(
+        f'INSERT INTO {FTS_TABLE} (rowid, title, category) '
+        'SELECT m.id, m.title, c.title FROM restaurant_menuitem m '
+        'JOIN restaurant_category c ON c.id = m.category_id'
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurant', '0004_dailysales'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,36 @@
+from django.db import migrations
+
+FTS_TABLE = 'restaurant_menuitem_fts'
+
+
+def create_search_index(apps, schema_editor):
+    # PostgreSQL counterpart of the FTS5 table from 0005: one weighted
+    # tsvector per menu item, searched through a GIN index
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        f'CREATE TABLE {FTS_TABLE} (menuitem_id bigint PRIMARY KEY, document tsvector NOT NULL)'
+    )
+    schema_editor.execute(f'CREATE INDEX {FTS_TABLE}_document_idx ON {FTS_TABLE} USING GIN (document)')
+    schema_editor.execute(
+        f'INSERT INTO {FTS_TABLE} (menuitem_id, document) '
+        "SELECT m.id, setweight(to_tsvector('simple', m.title), 'A') || setweight(to_tsvector('simple', c.title), 'B') "
+        'FROM restaurant_menuitem m JOIN restaurant_category c ON c.id = m.category_id'
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurant', '0008_partial_status_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
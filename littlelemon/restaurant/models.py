@@ -5,12 +5,28 @@ class Category(models.Model):
     slug = models.SlugField()
     title = models.CharField(max_length=255, db_index=True)
 
+    def __str__(self):
+        return self.title
+
 class MenuItem(models.Model):
     title = models.CharField(max_length=255, db_index=True)
     price = models.DecimalField(max_digits=6, decimal_places=2, db_index=True)
     featured = models.BooleanField(db_index=True)
     category = models.ForeignKey(Category, on_delete=models.PROTECT)
 
+    class Meta:
+        indexes = [
+            # Keyset pagination on ?ordering=price
+            models.Index(fields=['price', 'id'], name='menuitem_price_id_idx'),
+            # ?featured=true by price. SQLite cannot search an index on a
+            # bare boolean (the filter is WHERE "featured"), so the rows
+            # are picked by a partial index instead
+            models.Index(fields=['price', 'id'], condition=models.Q(featured=True), name='menuitem_featured_price_idx'),
+        ]
+
+    def __str__(self):
+        return self.title
+
 class Cart(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     menuitem = models.ForeignKey(MenuItem, on_delete=models.CASCADE)
@@ -24,10 +40,36 @@ class Cart(models.Model):
 class Order(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     delivery_crew = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='orders')
-    status = models.BooleanField(db_index=True, default=0)
+    status = models.BooleanField(default=0)
     total = models.DecimalField(max_digits=6, decimal_places=2)
     date = models.DateField(db_index=True)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored status and date so the sales rollup can see
+        # them change
+        instance._loaded_status = instance.__dict__.get('status')
+        instance._loaded_date = instance.__dict__.get('date')
+        return instance
+
+    class Meta:
+        indexes = [
+            # Keyset pagination on the default newest-first ordering
+            models.Index(fields=['date', 'id'], name='order_date_id_idx'),
+            # Role scoped lists: customers, delivery crew and the manager
+            # dashboard filter on status and order by date
+            models.Index(fields=['user', 'status', 'date'], name='order_user_status_date_idx'),
+            models.Index(fields=['delivery_crew', 'status', 'date'], name='order_crew_status_date_idx'),
+            # The manager's ?status= lists. Django filters booleans with
+            # WHERE NOT "status" / WHERE "status", which SQLite cannot
+            # search a (status, date) index with, so each value gets a
+            # partial index holding only its own rows. status is in the
+            # key so SQLite can count those rows from the index alone
+            models.Index(fields=['date', 'id', 'status'], condition=models.Q(status=False), name='order_pending_date_idx'),
+            models.Index(fields=['date', 'id', 'status'], condition=models.Q(status=True), name='order_delivered_date_idx'),
+        ]
+
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE)
     menuitem = models.ForeignKey(MenuItem, on_delete=models.CASCADE)
@@ -35,5 +77,66 @@ class OrderItem(models.Model):
     unit_price = models.DecimalField(max_digits=6, decimal_places=2)
     price = models.DecimalField(max_digits=6, decimal_places=2)
 
+    # Fields the sales rollup is computed from
+    rollup_fields = ('order_id', 'menuitem_id', 'quantity', 'price')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored values so the sales rollup can move them
+        instance._loaded_item = instance.rollup_values()
+        return instance
+
+    def rollup_values(self):
+        # None when a field is deferred, as the stored value is unknown
+        values = tuple(self.__dict__.get(field) for field in self.rollup_fields)
+        return None if None in values else values
+
+    class Meta:
+        unique_together = ('order', 'menuitem')
+
+class RoleVersion(models.Model):
+    # Bumped whenever the user's groups change. Tokens carry the version
+    # their role claims were read at and are refused once it is outdated.
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='role_version')
+    version = models.PositiveIntegerField(default=0)
+
+class DailySales(models.Model):
+    # Sales rollup per day and menu item, maintained by restaurant.rollup
+    date = models.DateField()
+    menuitem = models.ForeignKey(MenuItem, on_delete=models.CASCADE)
+    quantity = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    delivered_quantity = models.IntegerField(default=0)
+    delivered_revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = ('date', 'menuitem')
+
+class ArchivedOrder(models.Model):
+    # Delivered orders moved out of Order by restaurant.archive. Rows keep
+    # their original ids, so live and archived orders never collide.
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    delivery_crew = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='+')
+    status = models.BooleanField(default=True)
+    total = models.DecimalField(max_digits=6, decimal_places=2)
+    date = models.DateField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['date', 'id'], name='archivedorder_date_id_idx'),
+            models.Index(fields=['user', 'date'], name='archivedorder_user_date_idx'),
+            models.Index(fields=['delivery_crew', 'date'], name='archivedorder_crew_date_idx'),
+        ]
+
+class ArchivedOrderItem(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    order = models.ForeignKey(ArchivedOrder, on_delete=models.CASCADE)
+    menuitem = models.ForeignKey(MenuItem, on_delete=models.CASCADE)
+    quantity = models.SmallIntegerField()
+    unit_price = models.DecimalField(max_digits=6, decimal_places=2)
+    price = models.DecimalField(max_digits=6, decimal_places=2)
+
     class Meta:
         unique_together = ('order', 'menuitem')
@@ -0,0 +1,218 @@
+import base64
+import heapq
+import json
+from operator import itemgetter
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination, _positive_int
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def get_page_size(query_params, default):
+    # Client selectable page size, capped by the MAX_PAGE_SIZE setting
+    try:
+        return _positive_int(
+            query_params['page_size'],
+            strict=True,
+            cutoff=getattr(settings, 'MAX_PAGE_SIZE', 100),
+        )
+    except (KeyError, ValueError):
+        return default
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination on (ordering fields..., pk).
+
+    Each page is fetched with a WHERE on the last row of the previous page
+    instead of an OFFSET, and no COUNT(*) is run, so every page costs the
+    same no matter how deep into the result set it is.
+    """
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor.'
+
+    # Used when the request has no usable ordering; views may override it
+    # with a ``keyset_ordering`` attribute.
+    default_ordering = ('-pk',)
+
+    def __init__(self, page_size):
+        self.page_size = page_size
+
+    def get_ordering(self, queryset, view):
+        ordering = [str(term) for term in queryset.query.order_by]
+        if not ordering or not all(self.is_keyset_field(queryset.model, term) for term in ordering):
+            ordering = list(getattr(view, 'keyset_ordering', self.default_ordering))
+
+        # The primary key makes the ordering total, so ties cannot be skipped
+        names = {term.lstrip('-') for term in ordering}
+        if not names & {'pk', 'id', queryset.model._meta.pk.name}:
+            ordering.append('-pk' if ordering[0].startswith('-') else 'pk')
+        return ordering
+
+    def is_keyset_field(self, model, term):
+        name = term.lstrip('-')
+        if name == 'pk':
+            return True
+        try:
+            field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            return False
+        # Only local, non-null columns can be compared against a cursor
+        return field.concrete and not field.null and not field.is_relation
+
+    def field_for(self, model, term):
+        name = term.lstrip('-')
+        return model._meta.pk if name == 'pk' else model._meta.get_field(name)
+
+    def decode_cursor(self, request, model, ordering):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            values = json.loads(base64.urlsafe_b64decode(encoded.encode()).decode())
+            if len(values) != len(ordering):
+                raise ValueError
+            return [self.field_for(model, term).to_python(value) for term, value in zip(ordering, values)]
+        except Exception:
+            raise NotFound(self.invalid_cursor_message)
+
+    def row_values(self, obj, attnames):
+        # Rows are model instances, or dicts from a .values() queryset
+        if isinstance(obj, dict):
+            return [obj[attname] for attname in attnames]
+        return [getattr(obj, attname) for attname in attnames]
+
+    def encode_cursor(self, obj, ordering, model):
+        values = self.row_values(obj, [self.field_for(model, term).attname for term in ordering])
+        encoded = json.dumps(values, cls=DjangoJSONEncoder).encode()
+        return base64.urlsafe_b64encode(encoded).decode()
+
+    def after(self, ordering, values):
+        # Lexicographic "comes after" for mixed ascending/descending fields:
+        # (a > x) OR (a = x AND b > y) OR (a = x AND b = y AND c > z) ...
+        condition = Q()
+        equal = {}
+        for term, value in zip(ordering, values):
+            name = term.lstrip('-')
+            lookup = f'{name}__lt' if term.startswith('-') else f'{name}__gt'
+            condition |= Q(**equal, **{lookup: value})
+            equal[name] = value
+        return condition
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        ordering = self.get_ordering(queryset, view)
+        queryset = queryset.order_by(*ordering)
+
+        values = self.decode_cursor(request, queryset.model, ordering)
+        if values is not None:
+            queryset = queryset.filter(self.after(ordering, values))
+
+        # One extra row tells us whether there is a next page
+        rows = list(queryset[:self.page_size + 1])
+        self.has_next = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        self.next_cursor = self.encode_cursor(rows[-1], ordering, queryset.model) if self.has_next else None
+        return rows
+
+    def paginate_merged(self, querysets, request, ordering):
+        """
+        Pages through several querysets as if they were one, e.g. live and
+        archived orders. Each is read with the same cursor condition and
+        limit, and the rows are merged on ``ordering``, which must end with
+        the primary key and sort every term the same way. Returns (index of
+        the queryset, row) pairs.
+        """
+        self.request = request
+        model = querysets[0].model
+        values = self.decode_cursor(request, model, ordering)
+        attnames = [self.field_for(model, term).attname for term in ordering]
+        streams = []
+        for index, queryset in enumerate(querysets):
+            queryset = queryset.order_by(*ordering)
+            if values is not None:
+                queryset = queryset.filter(self.after(ordering, values))
+            streams.append([(self.row_values(row, attnames), index, row) for row in queryset[:self.page_size + 1]])
+        merged = heapq.merge(*streams, key=itemgetter(0), reverse=ordering[0].startswith('-'))
+        rows = [(index, row) for _, index, row in merged][:self.page_size + 1]
+        self.has_next = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        self.next_cursor = self.encode_cursor(rows[-1][1], ordering, model) if self.has_next else None
+        return rows
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+
+class DefaultPagination(PageNumberPagination):
+    """
+    Page number pagination with a few opt-in query parameters:
+
+    - ``page_size`` picks the page size, up to ``MAX_PAGE_SIZE``
+    - ``count=false`` skips the COUNT(*) query
+    - ``cursor`` switches to keyset pagination (empty for the first page)
+    """
+    page_size_query_param = 'page_size'
+    count_query_param = 'count'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.mode = 'page'
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+
+        if KeysetPagination.cursor_query_param in request.query_params:
+            self.mode = 'cursor'
+            self.keyset = KeysetPagination(page_size)
+            return self.keyset.paginate_queryset(queryset, request, view)
+
+        if request.query_params.get(self.count_query_param, '').lower() in ('0', 'false', 'no'):
+            self.mode = 'uncounted'
+            return self.paginate_without_count(queryset, request, page_size)
+
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_page_size(self, request):
+        return get_page_size(request.query_params, self.page_size)
+
+    def paginate_without_count(self, queryset, request, page_size):
+        try:
+            self.page_number = _positive_int(request.query_params.get(self.page_query_param, 1), strict=True)
+        except ValueError:
+            raise NotFound(self.invalid_page_message)
+        offset = (self.page_number - 1) * page_size
+        rows = list(queryset[offset:offset + page_size + 1])
+        self.has_next = len(rows) > page_size
+        return rows[:page_size]
+
+    def get_paginated_response(self, data):
+        if self.mode == 'cursor':
+            return self.keyset.get_paginated_response(data)
+        if self.mode == 'uncounted':
+            return Response({
+                'next': self.uncounted_link(self.page_number + 1) if self.has_next else None,
+                'previous': self.uncounted_link(self.page_number - 1) if self.page_number > 1 else None,
+                'results': data,
+            })
+        return super().get_paginated_response(data)
+
+    def uncounted_link(self, page_number):
+        url = self.request.build_absolute_uri()
+        if page_number == 1:
+            return remove_query_param(url, self.page_query_param)
+        return replace_query_param(url, self.page_query_param, page_number)
@@ -0,0 +1,25 @@
+from rest_framework.permissions import BasePermission
+
+from .roles import MANAGER, DELIVERY_CREW, CUSTOMER, has_role
+
+
+class HasRole(BasePermission):
+    role = None
+
+    def has_permission(self, request, view):
+        return has_role(request.user, self.role)
+
+
+class IsManager(HasRole):
+    role = MANAGER
+    message = "Only Managers can perform this action."
+
+
+class IsDeliveryCrew(HasRole):
+    role = DELIVERY_CREW
+    message = "Only Delivery Crew can perform this action."
+
+
+class IsCustomer(HasRole):
+    role = CUSTOMER
+    message = "Only Customers can perform this action."
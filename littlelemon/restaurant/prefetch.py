@@ -0,0 +1,78 @@
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+
+# serializer class -> (select_related lookups, prefetch_related lookups)
+_lookup_cache = {}
+
+
+def _relation(model, name):
+    # Returns the related model if ``name`` is a relation on ``model``
+    try:
+        field = model._meta.get_field(name)
+    except FieldDoesNotExist:
+        # Reverse relations without a related_name are exposed as <name>_set
+        if not name.endswith("_set"):
+            return None
+        try:
+            field = model._meta.get_field(name[:-len("_set")])
+        except FieldDoesNotExist:
+            return None
+    if not field.is_relation:
+        return None
+    return field
+
+
+def _walk(serializer, model, prefix, in_prefetch, select, prefetch):
+    for field in serializer.fields.values():
+        if field.source == "*" or field.write_only:
+            continue
+
+        # Follow dotted sources ("menuitem.category") one relation at a time
+        current_model, path, relation = model, prefix, None
+        for attr in field.source_attrs:
+            relation = _relation(current_model, attr)
+            if relation is None:
+                break
+            path = f"{path}__{attr}" if path else attr
+            current_model = relation.related_model
+        if relation is None:
+            continue
+
+        many = relation.many_to_many or relation.one_to_many
+        if isinstance(field, serializers.PrimaryKeyRelatedField) and not many and len(field.source_attrs) == 1:
+            # Served from the local <name>_id column
+            continue
+
+        target = prefetch if (many or in_prefetch) else select
+        target.append(path)
+
+        if isinstance(field, serializers.ListSerializer):
+            _walk(field.child, current_model, path, True, select, prefetch)
+        elif isinstance(field, serializers.BaseSerializer):
+            _walk(field, current_model, path, many or in_prefetch, select, prefetch)
+
+
+def related_lookups(serializer_class):
+    # Works out what select_related/prefetch_related a serializer needs
+    if serializer_class not in _lookup_cache:
+        select, prefetch = [], []
+        _walk(serializer_class(), serializer_class.Meta.model, "", False, select, prefetch)
+        _lookup_cache[serializer_class] = (select, prefetch)
+    return _lookup_cache[serializer_class]
+
+
+def optimize_queryset(queryset, serializer_class):
+    select, prefetch = related_lookups(serializer_class)
+    if select:
+        queryset = queryset.select_related(*select)
+    if prefetch:
+        queryset = queryset.prefetch_related(*prefetch)
+    return queryset
+
+
+class AutoPrefetchMixin:
+    # Eager loads every relation the viewset's serializer is going to read.
+    # Hooked into filter_queryset so viewsets keep overriding get_queryset.
+
+    def filter_queryset(self, queryset):
+        return optimize_queryset(super().filter_queryset(queryset), self.get_serializer_class())
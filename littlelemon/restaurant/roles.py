@@ -0,0 +1,160 @@
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import F
+
+from .models import RoleVersion
+
+# Group names used for role based access control
+MANAGER = "Manager"
+DELIVERY_CREW = "Delivery Crew"
+CUSTOMER = "Customer"
+
+# Process-local cache of user id -> (expires_at, frozenset of group names).
+# Entries are dropped as soon as group membership changes (see signals.py),
+# the TTL only bounds staleness for changes made by other processes.
+_role_cache = {}
+_role_cache_lock = threading.Lock()
+
+
+def _ttl():
+    return getattr(settings, "ROLE_CACHE_TTL", 60)
+
+
+def _max_entries():
+    return getattr(settings, "ROLE_CACHE_MAX_ENTRIES", 10000)
+
+
+def get_roles(user):
+    # Returns the group names of a user, loaded at most once per request
+    if user is None or not user.is_authenticated:
+        return frozenset()
+
+    roles = getattr(user, "_restaurant_roles", None)
+    if roles is not None:
+        return roles
+
+    now = time.monotonic()
+    entry = _role_cache.get(user.pk)
+    if entry is not None and entry[0] > now:
+        roles = entry[1]
+    else:
+        roles = frozenset(user.groups.values_list("name", flat=True))
+        with _role_cache_lock:
+            if len(_role_cache) >= _max_entries():
+                _role_cache.clear()
+            _role_cache[user.pk] = (now + _ttl(), roles)
+
+    # Memoize on the user instance so the rest of the request is free
+    user._restaurant_roles = roles
+    return roles
+
+
+def has_role(user, role):
+    return role in get_roles(user)
+
+
+def is_manager(user):
+    return has_role(user, MANAGER)
+
+
+def is_delivery_crew(user):
+    return has_role(user, DELIVERY_CREW)
+
+
+def is_customer(user):
+    return has_role(user, CUSTOMER)
+
+
+def invalidate_roles(user_ids=None):
+    # Drop cached roles for the given users, or for everybody when None
+    with _role_cache_lock:
+        if user_ids is None:
+            _role_cache.clear()
+        else:
+            for user_id in user_ids:
+                _role_cache.pop(user_id, None)
+
+
+# Role changes bump a per-user version number in the database. JWTs carry
+# the version their role claims were read at, and authentication compares
+# it with the stored one on every request, so tokens issued before a change
+# are refused by every worker straight away. The stored version and the
+# is_active flag are read through the ROLE_STATE_CACHE_ALIAS cache (shared
+# with REDIS_URL), falling back to the database on a miss; changes drop the
+# cached entries.
+
+
+def mark_roles_changed(user_ids=None):
+    # Bumps the role version of the given users, or of everybody when None
+    versions = RoleVersion.objects.all() if user_ids is None else RoleVersion.objects.filter(user_id__in=user_ids)
+    versions.update(version=F("version") + 1)
+    missing = User.objects.filter(role_version__isnull=True)
+    if user_ids is not None:
+        missing = missing.filter(pk__in=user_ids)
+    RoleVersion.objects.bulk_create(
+        [RoleVersion(user_id=user_id, version=1) for user_id in missing.values_list("pk", flat=True)],
+        ignore_conflicts=True,
+    )
+    forget_role_states(user_ids)
+
+
+def role_version(user_id):
+    return RoleVersion.objects.filter(user_id=user_id).values_list("version", flat=True).first() or 0
+
+
+def _state_cache():
+    return caches[getattr(settings, "ROLE_STATE_CACHE_ALIAS", "default")]
+
+
+def _state_key(user_id):
+    return f"role_state:{user_id}"
+
+
+def _state_timeout():
+    return getattr(settings, "ROLE_STATE_CACHE_TIMEOUT", 60)
+
+
+def _state_query(user_id):
+    return User.objects.filter(pk=user_id).values_list("is_active", "role_version__version")
+
+
+def role_state(user_id):
+    # (is_active, role version) of a user, or None if the user no longer
+    # exists. Cached, so a warm request runs no query.
+    cache = _state_cache()
+    state = cache.get(_state_key(user_id))
+    if state is None:
+        row = _state_query(user_id).first()
+        if row is None:
+            return None
+        state = (row[0], row[1] or 0)
+        cache.set(_state_key(user_id), state, _state_timeout())
+    return state
+
+
+async def arole_state(user_id):
+    cache = _state_cache()
+    state = await cache.aget(_state_key(user_id))
+    if state is None:
+        row = await _state_query(user_id).afirst()
+        if row is None:
+            return None
+        state = (row[0], row[1] or 0)
+        await cache.aset(_state_key(user_id), state, _state_timeout())
+    return state
+
+
+def forget_role_states(user_ids=None):
+    # Drops the cached state of the given users, or of everybody when None.
+    # Again after commit, in case a request cached the old row meanwhile.
+    if user_ids is None:
+        user_ids = list(User.objects.values_list("pk", flat=True))
+    keys = [_state_key(user_id) for user_id in user_ids]
+    cache = _state_cache()
+    cache.delete_many(keys)
+    transaction.on_commit(lambda: cache.delete_many(keys))
@@ -0,0 +1,173 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import IntegrityError, connections, router, transaction
+from django.db.models import F, Max, Min, Q, Sum
+
+from .models import ArchivedOrder, ArchivedOrderItem, DailySales, Order, OrderItem
+
+# Incremental maintenance of the DailySales rollup.
+#
+# Changes are expressed as deltas per (date, menu item) and applied with a
+# single INSERT ... ON CONFLICT DO UPDATE that adds to the stored totals, so
+# the cost depends on the size of the change, never on the order history.
+# Writes that bypass model signals (queryset.update, raw SQL) are not seen;
+# the rebuild_sales_rollup command recomputes any date range from scratch.
+
+FIELDS = ('quantity', 'revenue', 'delivered_quantity', 'delivered_revenue')
+UPSERT_BATCH_SIZE = 100
+
+
+def _add_items(deltas, order_date, delivered, items, sign):
+    for menuitem_id, quantity, price in items:
+        delta = deltas[(order_date, menuitem_id)]
+        delta[0] += sign * quantity
+        delta[1] += sign * price
+        if delivered:
+            delta[2] += sign * quantity
+            delta[3] += sign * price
+
+
+def record_items(order_date, delivered, items, sign=1):
+    # items: iterable of (menuitem_id, quantity, price) for one order
+    deltas = defaultdict(lambda: [0, 0, 0, 0])
+    _add_items(deltas, order_date, delivered, items, sign)
+    apply_deltas(deltas)
+
+
+def record_order_change(order, old_date, old_status):
+    # Moves the order's items from the totals of its stored date and status
+    # to those of its new ones
+    items = list(
+        OrderItem.objects.filter(order_id=order.pk)
+        .values('menuitem_id')
+        .annotate(quantity=Sum('quantity'), revenue=Sum('price'))
+        .values_list('menuitem_id', 'quantity', 'revenue')
+        .order_by()
+    )
+    deltas = defaultdict(lambda: [0, 0, 0, 0])
+    _add_items(deltas, old_date, old_status, items, -1)
+    _add_items(deltas, order.date, order.status, items, 1)
+    apply_deltas(deltas)
+
+
+def record_item_change(previous, current):
+    # previous and current: (order_id, menuitem_id, quantity, price) of an
+    # edited OrderItem, before and after the edit
+    orders = {
+        pk: (day, status) for pk, day, status in
+        Order.objects.filter(pk__in={previous[0], current[0]}).values_list('pk', 'date', 'status')
+    }
+    deltas = defaultdict(lambda: [0, 0, 0, 0])
+    for (order_id, *item), sign in ((previous, -1), (current, 1)):
+        if order_id in orders:
+            _add_items(deltas, *orders[order_id], [item], sign)
+    apply_deltas(deltas)
+
+
+def apply_deltas(deltas):
+    deltas = {key: delta for key, delta in deltas.items() if any(delta)}
+    if not deltas:
+        return
+    connection = connections[router.db_for_write(DailySales)]
+    if connection.vendor in ('sqlite', 'postgresql'):
+        _upsert(connection, deltas)
+    else:
+        _update_or_create(deltas)
+
+
+def _upsert(connection, deltas):
+    qn = connection.ops.quote_name
+    table = qn(DailySales._meta.db_table)
+    columns = ', '.join(qn(column) for column in ('date', 'menuitem_id') + FIELDS)
+    updates = ', '.join(f'{qn(field)} = {table}.{qn(field)} + excluded.{qn(field)}' for field in FIELDS)
+    placeholders = '(' + ', '.join(['%s'] * (2 + len(FIELDS))) + ')'
+
+    items = list(deltas.items())
+    with connection.cursor() as cursor:
+        for start in range(0, len(items), UPSERT_BATCH_SIZE):
+            batch = items[start:start + UPSERT_BATCH_SIZE]
+            params = []
+            for (day, menuitem_id), (quantity, revenue, delivered_quantity, delivered_revenue) in batch:
+                params += [
+                    connection.ops.adapt_datefield_value(day),
+                    menuitem_id,
+                    quantity,
+                    connection.ops.adapt_decimalfield_value(revenue),
+                    delivered_quantity,
+                    connection.ops.adapt_decimalfield_value(delivered_revenue),
+                ]
+            cursor.execute(
+                f'INSERT INTO {table} ({columns}) VALUES {", ".join([placeholders] * len(batch))} '
+                f'ON CONFLICT ({qn("date")}, {qn("menuitem_id")}) DO UPDATE SET {updates}',
+                params,
+            )
+
+
+def _update_or_create(deltas):
+    # Fallback for databases without ON CONFLICT
+    for (day, menuitem_id), delta in deltas.items():
+        changes = {field: F(field) + value for field, value in zip(FIELDS, delta)}
+        rows = DailySales.objects.filter(date=day, menuitem_id=menuitem_id)
+        if rows.update(**changes):
+            continue
+        try:
+            with transaction.atomic():
+                DailySales.objects.create(date=day, menuitem_id=menuitem_id, **dict(zip(FIELDS, delta)))
+        except IntegrityError:
+            rows.update(**changes)
+
+
+def rebuild(start=None, end=None, batch_days=31):
+    """
+    Recomputes the rollup from live and archived orders between start and end.
+
+    Works through the range in batches of ``batch_days`` days, one
+    transaction each, and yields (first_day, last_day, rows) after every
+    batch so an interrupted run can be resumed from the last batch.
+    """
+    if start is None or end is None:
+        # Cover every day with orders or with (possibly stale) rollup rows
+        days = [
+            day
+            for bounds in (
+                Order.objects.aggregate(first=Min('date'), last=Max('date')),
+                ArchivedOrder.objects.aggregate(first=Min('date'), last=Max('date')),
+                DailySales.objects.aggregate(first=Min('date'), last=Max('date')),
+            )
+            for day in bounds.values() if day is not None
+        ]
+        if not days:
+            return
+        start = start or min(days)
+        end = end or max(days)
+
+    delivered = Q(order__status=True)
+    day = start
+    while day <= end:
+        last_day = min(day + timedelta(days=batch_days - 1), end)
+        totals = defaultdict(lambda: [0, 0, 0, 0])
+        for model in (OrderItem, ArchivedOrderItem):
+            rows = (
+                model.objects.filter(order__date__range=(day, last_day))
+                .values('order__date', 'menuitem_id')
+                .annotate(
+                    sum_quantity=Sum('quantity'),
+                    sum_revenue=Sum('price'),
+                    sum_delivered_quantity=Sum('quantity', filter=delivered, default=0),
+                    sum_delivered_revenue=Sum('price', filter=delivered, default=0),
+                )
+                .order_by()
+            )
+            for row in rows.iterator():
+                total = totals[(row['order__date'], row['menuitem_id'])]
+                for index, field in enumerate(FIELDS):
+                    total[index] += row[f'sum_{field}']
+        with transaction.atomic():
+            DailySales.objects.filter(date__range=(day, last_day)).delete()
+            created = DailySales.objects.bulk_create([
+                DailySales(date=row_date, menuitem_id=menuitem_id, **dict(zip(FIELDS, total)))
+                for (row_date, menuitem_id), total in totals.items()
+            ], batch_size=1000)
+        yield day, last_day, len(created)
+        day = last_day + timedelta(days=1)
@@ -0,0 +1,45 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+REPLICA_ALIAS = 'replica'
+
+# Models whose reads can tolerate replication lag
+REPLICA_MODELS = frozenset({'restaurant.category', 'restaurant.menuitem'})
+
+_replica_reads = ContextVar('restaurant_replica_reads', default=False)
+
+
+@contextmanager
+def replica_reads(enabled=True):
+    # Scopes replica routing to the current request (thread or task)
+    token = _replica_reads.set(enabled)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+class ReadReplicaRouter:
+    """
+    Sends menu and category reads to the replica during safe requests.
+
+    Reads made while handling a write stay on the primary so a view never
+    validates against rows it has not replicated yet.
+    """
+
+    def db_for_read(self, model, **hints):
+        if _replica_reads.get() and model._meta.label_lower in REPLICA_MODELS:
+            return REPLICA_ALIAS
+        return None
+
+    def db_for_write(self, model, **hints):
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db == REPLICA_ALIAS:
+            return False
+        return None
@@ -0,0 +1,164 @@
+import re
+
+from django.db import connection
+from django.db.models.expressions import RawSQL
+from rest_framework import filters
+
+from .models import MenuItem
+
+# Full text menu search.
+#
+# Menu item and category titles are mirrored into a search table and kept
+# in sync from model signals: an FTS5 table on SQLite (migration 0005), and
+# a table of tsvector documents with a GIN index on PostgreSQL (migration
+# 0009). The category title lives in another table, so a generated column
+# could not hold it. Other databases fall back to SearchFilter's icontains
+# lookups.
+
+FTS_TABLE = 'restaurant_menuitem_fts'
+
+# Item titles rank above category titles; 'simple' keeps words as typed
+PG_DOCUMENT = "setweight(to_tsvector('simple', m.title), 'A') || setweight(to_tsvector('simple', c.title), 'B')"
+
+# Aliases of databases known to have the search table
+_fts_databases = set()
+
+
+def search_backend():
+    if connection.vendor not in ('sqlite', 'postgresql'):
+        return None
+    if connection.alias not in _fts_databases:
+        if FTS_TABLE not in connection.introspection.table_names():
+            return None
+        _fts_databases.add(connection.alias)
+    return connection.vendor
+
+
+def match_expression(text):
+    # "sou pi" -> '"sou"* "pi"*': every word must match, as a prefix
+    words = re.findall(r'\w+', text)
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def index_menu_items(ids=None):
+    # (Re)indexes the given menu items, or all of them when ids is None
+    backend = search_backend()
+    if backend == 'postgresql':
+        _index_postgresql(ids)
+    if backend != 'sqlite':
+        return
+    rows = MenuItem.objects.values_list('id', 'title', 'category__title')
+    if ids is not None:
+        ids = list(ids)
+        rows = rows.filter(id__in=ids)
+    with connection.cursor() as cursor:
+        if ids is None:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        else:
+            cursor.executemany(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [(pk,) for pk in ids])
+        cursor.executemany(
+            f'INSERT INTO {FTS_TABLE} (rowid, title, category) VALUES (%s, %s, %s)',
+            list(rows),
+        )
+
+
+def _index_postgresql(ids):
+    select = (
+        f'INSERT INTO {FTS_TABLE} (menuitem_id, document) SELECT m.id, {PG_DOCUMENT} '
+        'FROM restaurant_menuitem m JOIN restaurant_category c ON c.id = m.category_id'
+    )
+    with connection.cursor() as cursor:
+        if ids is None:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+            cursor.execute(select)
+        else:
+            ids = list(ids)
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE menuitem_id = ANY(%s)', [ids])
+            cursor.execute(f'{select} WHERE m.id = ANY(%s)', [ids])
+
+
+def index_category(category_id):
+    if search_backend() is None:
+        return
+    index_menu_items(MenuItem.objects.filter(category_id=category_id).values_list('id', flat=True))
+
+
+def unindex_menu_item(pk):
+    backend = search_backend()
+    if backend is None:
+        return
+    column = 'rowid' if backend == 'sqlite' else 'menuitem_id'
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE {column} = %s', [pk])
+
+
+def autocomplete(text, limit=10):
+    # Best (id, title) prefix matches for a search box
+    backend = search_backend()
+    if backend == 'sqlite':
+        match = match_expression(text)
+        if not match:
+            return []
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid, title FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s ORDER BY rank LIMIT %s',
+                [match, limit],
+            )
+            return cursor.fetchall()
+    queryset = search_menu_items(MenuItem.objects.all(), text)
+    if queryset is None:
+        queryset = MenuItem.objects.filter(title__istartswith=text.strip()).order_by('title')
+    return list(queryset.values_list('id', 'title')[:limit])
+
+
+def search_menu_items(queryset, text):
+    """
+    Filters menu items to prefix matches of every word of ``text`` in the
+    item or category title, best matches first. Returns None when no full
+    text backend is available.
+    """
+    backend = search_backend()
+    if backend == 'sqlite':
+        match = match_expression(text)
+        if not match:
+            return queryset
+        matches = RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [match])
+        rank = RawSQL(
+            f'SELECT bm25({FTS_TABLE}) FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s AND rowid = "restaurant_menuitem"."id"',
+            [match],
+        )
+        # bm25() is lower for better matches
+        return queryset.filter(id__in=matches).annotate(search_rank=rank).order_by('search_rank', 'id')
+
+    if backend == 'postgresql':
+        words = re.findall(r'\w+', text)
+        if not words:
+            return queryset
+        # Prefix match on every word, looked up in the GIN index
+        query = ' & '.join(f'{word}:*' for word in words)
+        matches = RawSQL(
+            f"SELECT menuitem_id FROM {FTS_TABLE} WHERE document @@ to_tsquery('simple', %s)",
+            [query],
+        )
+        rank = RawSQL(
+            f"SELECT ts_rank(document, to_tsquery('simple', %s)) FROM {FTS_TABLE} "
+            f'WHERE menuitem_id = "restaurant_menuitem"."id"',
+            [query],
+        )
+        return queryset.filter(id__in=matches).annotate(search_rank=rank).order_by('-search_rank', 'id')
+
+    return None
+
+
+class MenuSearchFilter(filters.SearchFilter):
+    # SearchFilter backed by the full text index, with ranked prefix matches
+
+    def filter_queryset(self, request, queryset, view):
+        text = ' '.join(self.get_search_terms(request))
+        if not text:
+            return queryset
+        result = search_menu_items(queryset, text)
+        if result is None:
+            return super().filter_queryset(request, queryset, view)
+        return result
@@ -1,5 +1,7 @@
+from django.db import IntegrityError, transaction
 from rest_framework import serializers
-from .models import Category, MenuItem, Cart, Order, OrderItem
+from .carts import LIMIT_ERROR, line_fits
+from .models import Category, MenuItem, Cart, Order, OrderItem, ArchivedOrder, ArchivedOrderItem
 
 # Category Serializer
 class CategorySerializer(serializers.ModelSerializer):
@@ -17,15 +19,47 @@ class MenuItemSerializer(serializers.ModelSerializer):
 
 # Cart Serializer
 class CartSerializer(serializers.ModelSerializer):
-    menu_item = serializers.StringRelatedField()  # Displays menu item name
+    menu_item = serializers.StringRelatedField(source='menuitem')  # Displays menu item name
 
     class Meta:
         model = Cart
         fields = '__all__'
+        # The user comes from the request and the price is always quantity * unit_price;
+        # unit_price defaults to the menu item's price
+        read_only_fields = ['user', 'price']
+        extra_kwargs = {
+            'quantity': {'min_value': 1},
+            'unit_price': {'required': False},
+        }
+
+    def validate(self, attrs):
+        # New lines go through add_to_cart; this checks PUT and PATCH, where
+        # the unique (menuitem, user) validator is gone with user read-only
+        if self.instance is not None:
+            menuitem = attrs.get('menuitem', self.instance.menuitem)
+            if menuitem != self.instance.menuitem:
+                if Cart.objects.filter(user_id=self.instance.user_id, menuitem=menuitem).exists():
+                    raise serializers.ValidationError({'menuitem': ['This menu item is already in the cart.']})
+                # Switching items without a price takes the new item's
+                attrs.setdefault('unit_price', menuitem.price)
+            quantity = attrs.get('quantity', self.instance.quantity)
+            if not line_fits(quantity, attrs.get('unit_price', self.instance.unit_price)):
+                raise serializers.ValidationError({'quantity': [LIMIT_ERROR]})
+        return attrs
+
+    def update(self, instance, validated_data):
+        quantity = validated_data.get('quantity', instance.quantity)
+        validated_data['price'] = quantity * validated_data.get('unit_price', instance.unit_price)
+        try:
+            with transaction.atomic():
+                return super().update(instance, validated_data)
+        except IntegrityError:
+            # Lost a race with an add of the same item
+            raise serializers.ValidationError({'menuitem': ['This menu item is already in the cart.']})
 
 # OrderItem Serializer
 class OrderItemSerializer(serializers.ModelSerializer):
-    menu_item = serializers.StringRelatedField()  # Displays menu item name
+    menu_item = serializers.StringRelatedField(source='menuitem')  # Displays menu item name
 
     class Meta:
         model = OrderItem
@@ -33,8 +67,23 @@ class OrderItemSerializer(serializers.ModelSerializer):
 
 # Order Serializer
 class OrderSerializer(serializers.ModelSerializer):
-    items = OrderItemSerializer(many=True, read_only=True)  # Nested serializer
+    items = OrderItemSerializer(source='orderitem_set', many=True, read_only=True)  # Nested serializer
 
     class Meta:
         model = Order
         fields = '__all__'
+
+# Archived orders, read alongside live ones with ?include_archived=1
+class ArchivedOrderItemSerializer(serializers.ModelSerializer):
+    menu_item = serializers.StringRelatedField(source='menuitem')
+
+    class Meta:
+        model = ArchivedOrderItem
+        fields = '__all__'
+
+class ArchivedOrderSerializer(serializers.ModelSerializer):
+    items = ArchivedOrderItemSerializer(source='archivedorderitem_set', many=True, read_only=True)
+
+    class Meta:
+        model = ArchivedOrder
+        fields = '__all__'
@@ -0,0 +1,120 @@
+from django.contrib.auth.models import Group, User
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from .caching import bump_menu_version
+from .events import get_broker, order_event
+from .metrics import install_query_recorder
+from .models import Category, MenuItem, Order, OrderItem
+from .roles import forget_role_states, invalidate_roles, mark_roles_changed
+from .rollup import record_item_change, record_items, record_order_change
+from .search import index_category, index_menu_items, unindex_menu_item
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def group_membership_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if not action.startswith("post_"):
+        return
+    if reverse:
+        # Called from the Group side (group.user_set.add(...))
+        user_ids = pk_set
+    else:
+        user_ids = [instance.pk]
+    invalidate_roles(user_ids)
+    mark_roles_changed(user_ids)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, created=False, **kwargs):
+    # A renamed or deleted group can affect any user
+    if created:
+        return
+    invalidate_roles()
+    mark_roles_changed()
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance, created=False, **kwargs):
+    # is_active is part of the cached user state
+    if not created:
+        forget_role_states([instance.pk])
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=MenuItem)
+@receiver(post_delete, sender=MenuItem)
+def menu_changed(sender, **kwargs):
+    bump_menu_version()
+
+
+@receiver(post_save, sender=Order)
+def order_saved(sender, instance, **kwargs):
+    # Only announce changes that were actually committed
+    event = order_event(instance)
+    transaction.on_commit(lambda: get_broker().publish(event))
+
+
+@receiver(post_save, sender=Order)
+def order_sales_changed(sender, instance, created, raw=False, **kwargs):
+    # Keep the sales rollup in step with Order.status and Order.date
+    previous_status = getattr(instance, '_loaded_status', None)
+    previous_date = getattr(instance, '_loaded_date', None) or instance.date
+    if (
+        not created and not raw and previous_status is not None
+        and (previous_date, previous_status) != (instance.date, instance.status)
+    ):
+        record_order_change(instance, previous_date, previous_status)
+    instance._loaded_status = instance.status
+    instance._loaded_date = instance.date
+
+
+@receiver(post_save, sender=OrderItem)
+def order_item_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    current = instance.rollup_values()
+    if created:
+        order = instance.order
+        record_items(order.date, order.status, [(instance.menuitem_id, instance.quantity, instance.price)])
+    else:
+        # Edits move the old values out and the new ones in
+        previous = getattr(instance, '_loaded_item', None)
+        if previous is not None and current is not None and previous != current:
+            record_item_change(previous, current)
+    instance._loaded_item = current
+
+
+@receiver(post_delete, sender=OrderItem)
+def order_item_deleted(sender, instance, **kwargs):
+    order = Order.objects.filter(pk=instance.order_id).values('date', 'status').first()
+    if order is not None:
+        record_items(order['date'], order['status'], [(instance.menuitem_id, instance.quantity, instance.price)], sign=-1)
+
+
+@receiver(post_save, sender=MenuItem)
+def menu_item_indexed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        index_menu_items([instance.pk])
+
+
+@receiver(post_delete, sender=MenuItem)
+def menu_item_unindexed(sender, instance, **kwargs):
+    unindex_menu_item(instance.pk)
+
+
+@receiver(post_save, sender=Category)
+def category_indexed(sender, instance, created, raw=False, **kwargs):
+    # Items carry their category title in the search index
+    if not created and not raw:
+        index_category(instance.pk)
+
+
+@receiver(connection_created)
+def connection_opened(sender, connection, **kwargs):
+    # Time SQL queries for the request metrics
+    install_query_recorder(connection)
@@ -0,0 +1,30 @@
+# Process memory readings for the startup benchmark and the gunicorn worker
+# logs. Kept free of Django imports so the server config can use it before
+# the app is loaded.
+
+
+def memory_kib(pid='self'):
+    """
+    Returns the resident (rss) and proportional (pss) memory of a process in
+    KiB, or None for values the platform does not expose (only Linux does).
+
+    Forked workers share the pages of the preloaded app with the master
+    until they write to them. RSS counts shared pages in full for every
+    process; PSS divides them between the processes sharing them, so the
+    PSS of all workers adds up to the memory they really use.
+    """
+    return {
+        'rss_kib': _read_kib(f'/proc/{pid}/status', 'VmRSS:'),
+        'pss_kib': _read_kib(f'/proc/{pid}/smaps_rollup', 'Pss:'),
+    }
+
+
+def _read_kib(path, label):
+    try:
+        with open(path) as f:
+            for line in f:
+                if line.startswith(label):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
@@ -1,3 +1,1392 @@
-from django.test import TestCase
+import csv
+import gzip
+import io
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from datetime import date
+from decimal import Decimal
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib.auth.models import Group, User
+from django.core.cache import caches
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection, connections
+from django.http import HttpResponse
+from django.test import SimpleTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from drf_yasg.generators import OpenAPISchemaGenerator
+from rest_framework import serializers
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient, APITestCase, APITransactionTestCase
+
+from .archive import archive_orders
+from .authentication import RoleTokenObtainPairSerializer
+from .carts import _add
+from .dispatch import dispatch_pending_orders
+from .events import get_broker, visible_to
+from .fastpath import compile_serializer
+from .idempotency import Replay, claim
+from .metrics import registry
+from .middleware import accepted_encodings, brotli
+from .models import ArchivedOrder, ArchivedOrderItem, Cart, Category, DailySales, MenuItem, Order, OrderItem
+from .roles import get_roles, invalidate_roles
+from .routers import ReadReplicaRouter, replica_reads
+from .renderers import FastJSONRenderer
+from .serializers import CartSerializer, MenuItemSerializer, OrderSerializer
+from .throttling import hit
+
+
+def clear_caches():
+    for cache in caches.all():
+        cache.clear()
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class RestaurantTestCase(APITestCase):
+    def setUp(self):
+        # Throttle history, cached responses and role cache live in process memory
+        clear_caches()
+        invalidate_roles()
+        self.manager_group = Group.objects.create(name="Manager")
+        self.crew_group = Group.objects.create(name="Delivery Crew")
+        self.customer_group = Group.objects.create(name="Customer")
+        self.manager = self.make_user("manager", self.manager_group)
+        self.crew = self.make_user("crew", self.crew_group)
+        self.customer = self.make_user("customer", self.customer_group)
+        self.category = Category.objects.create(slug="mains", title="Mains")
+
+    def make_user(self, username, group=None):
+        user = User.objects.create_user(username=username, password="pass12345")
+        if group is not None:
+            user.groups.add(group)
+        return User.objects.get(pk=user.pk)
+
+    def assertListQueries(self, url, seed, expected, sizes=(10, 100, 1000)):
+        # Seeds ``size`` rows and checks listing them all always costs
+        # ``expected`` queries, so N+1 regressions fail regardless of volume
+        for size in sizes:
+            seed(size)
+            with mock.patch.object(PageNumberPagination, "page_size", size):
+                # Warm up per-user lookups, then drop cached responses
+                self.client.get(url)
+                clear_caches()
+                with CaptureQueriesContext(connection) as ctx:
+                    response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.data["results"]), size)
+            self.assertEqual(
+                len(ctx.captured_queries), expected,
+                f"{url} with {size} rows ran {len(ctx.captured_queries)} queries, expected {expected}",
+            )
+
+    def login(self, user):
+        # Fresh instance so per-request memoization is not shared between calls
+        self.client.force_authenticate(user=User.objects.get(pk=user.pk))
+
+
+class RoleTests(RestaurantTestCase):
+    def test_roles_are_loaded_once(self):
+        user = User.objects.get(pk=self.manager.pk)
+        with CaptureQueriesContext(connection) as ctx:
+            get_roles(user)
+            get_roles(user)
+            get_roles(User.objects.get(pk=self.manager.pk))
+        # One lookup for the user, one for the groups; the rest is cached
+        self.assertEqual(len(ctx.captured_queries), 2)
+        self.assertEqual(get_roles(user), frozenset({"Manager"}))
+
+    def test_membership_change_invalidates_cache(self):
+        self.assertEqual(get_roles(User.objects.get(pk=self.customer.pk)), frozenset({"Customer"}))
+        self.login(self.manager)
+        response = self.client.post(f"/users/{self.customer.pk}/assign_to_delivery_crew/")
+        self.assertEqual(response.status_code, 200)
+        roles = get_roles(User.objects.get(pk=self.customer.pk))
+        self.assertEqual(roles, frozenset({"Customer", "Delivery Crew"}))
+
+    def test_reverse_membership_change_invalidates_cache(self):
+        get_roles(User.objects.get(pk=self.customer.pk))
+        self.manager_group.user_set.add(self.customer)
+        self.assertIn("Manager", get_roles(User.objects.get(pk=self.customer.pk)))
+
+    def test_manager_only_endpoints(self):
+        self.login(self.customer)
+        self.assertEqual(self.client.get("/manager-only/").status_code, 403)
+        response = self.client.post("/menu-items/", {"title": "Soup", "price": "4.50", "featured": False, "category": self.category.pk})
+        self.assertEqual(response.status_code, 403)
+        self.login(self.manager)
+        self.assertEqual(self.client.get("/manager-only/").status_code, 200)
+
+    def test_only_crew_or_manager_update_orders(self):
+        order = Order.objects.create(user=self.customer, delivery_crew=self.crew, total=Decimal("10.00"), date="2025-01-01")
+        self.login(self.customer)
+        self.assertEqual(self.client.patch(f"/orders/{order.pk}/", {"status": True}).status_code, 403)
+        self.login(self.crew)
+        self.assertEqual(self.client.patch(f"/orders/{order.pk}/", {"status": True}).status_code, 200)
+        order.refresh_from_db()
+        self.assertTrue(order.status)
+
+
+class CheckoutTests(RestaurantTestCase):
+    def fill_cart(self, count):
+        for i in range(count):
+            item = MenuItem.objects.create(title=f"Dish {i}", price=Decimal("2.50"), featured=False, category=self.category)
+            Cart.objects.create(user=self.customer, menuitem=item, quantity=2, unit_price=item.price, price=item.price * 2)
+
+    def checkout_queries(self, count):
+        Cart.objects.all().delete()
+        self.fill_cart(count)
+        self.login(self.customer)
+        invalidate_roles()
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post("/orders/checkout/")
+        self.assertEqual(response.status_code, 201)
+        return len(ctx.captured_queries)
+
+    def test_checkout_moves_cart_into_order(self):
+        self.fill_cart(3)
+        self.login(self.customer)
+        response = self.client.post("/orders/checkout/")
+        self.assertEqual(response.status_code, 201)
+        order = Order.objects.get(pk=response.data["id"])
+        self.assertEqual(order.total, Decimal("15.00"))
+        self.assertEqual(order.user, self.customer)
+        self.assertEqual(OrderItem.objects.filter(order=order).count(), 3)
+        self.assertFalse(Cart.objects.filter(user=self.customer).exists())
+
+    def test_checkout_query_count_is_constant(self):
+        self.assertEqual(self.checkout_queries(2), self.checkout_queries(40))
+
+    def test_checkout_total_over_the_column_limit(self):
+        items = MenuItem.objects.bulk_create([
+            MenuItem(title=f"Platter {i}", price=Decimal("999.00"), featured=False, category=self.category)
+            for i in range(12)
+        ])
+        Cart.objects.bulk_create([
+            Cart(user=self.customer, menuitem=item, quantity=9, unit_price=item.price, price=9 * item.price)
+            for item in items
+        ])
+        self.login(self.customer)
+        self.assertEqual(self.client.post("/orders/checkout/").status_code, 400)
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(Cart.objects.filter(user=self.customer).count(), 12)
+
+    def test_checkout_empty_cart(self):
+        self.login(self.customer)
+        self.assertEqual(self.client.post("/orders/checkout/").status_code, 400)
+        self.assertFalse(Order.objects.exists())
+
+
+class MenuCacheTests(RestaurantTestCase):
+    def setUp(self):
+        super().setUp()
+        MenuItem.objects.create(title="Soup", price=Decimal("4.50"), featured=False, category=self.category)
+        self.login(self.customer)
+
+    def test_second_list_is_served_from_cache(self):
+        first = self.client.get("/menu-items/?ordering=price")
+        with CaptureQueriesContext(connection) as ctx:
+            second = self.client.get("/menu-items/?ordering=price")
+        self.assertEqual(len(ctx.captured_queries), 0)
+        self.assertEqual(first.data, second.data)
+        self.assertEqual(first["ETag"], second["ETag"])
+
+    def test_query_parameters_are_part_of_the_key(self):
+        first = self.client.get("/menu-items/?search=Soup")
+        second = self.client.get("/menu-items/?search=Pie")
+        self.assertNotEqual(first["ETag"], second["ETag"])
+        self.assertEqual(second.data["count"], 0)
+
+    def test_if_none_match_returns_304(self):
+        etag = self.client.get("/categories/")["ETag"]
+        response = self.client.get("/categories/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_writes_invalidate_cached_responses(self):
+        before = self.client.get("/menu-items/")
+        MenuItem.objects.update(title="Stew")
+        MenuItem.objects.get().save()
+        after = self.client.get("/menu-items/")
+        self.assertNotEqual(before["ETag"], after["ETag"])
+        self.assertEqual(after.data["results"][0]["title"], "Stew")
+
+
+class QueryCountTests(RestaurantTestCase):
+    def seed_menu_items(self, size):
+        missing = size - MenuItem.objects.count()
+        MenuItem.objects.bulk_create([
+            MenuItem(title=f"Dish {i}", price=Decimal("3.00"), featured=False,
+                     category=Category.objects.create(slug=f"c{size}-{i}", title=f"Category {i}"))
+            for i in range(missing)
+        ])
+
+    def seed_orders(self, size):
+        self.seed_menu_items(3)
+        items = list(MenuItem.objects.all()[:3])
+        missing = size - Order.objects.count()
+        orders = Order.objects.bulk_create([
+            Order(user=self.customer, total=Decimal("9.00"), date=date(2025, 1, 1)) for _ in range(missing)
+        ])
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, menuitem=item, quantity=1, unit_price=item.price, price=item.price)
+            for order in orders for item in items
+        ])
+
+    def test_menu_item_list(self):
+        self.login(self.customer)
+        # COUNT plus one SELECT joined to category
+        self.assertListQueries("/menu-items/", self.seed_menu_items, 2)
+
+    def test_order_list(self):
+        self.login(self.manager)
+        # COUNT, orders, and order items joined to their menu items
+        self.assertListQueries("/orders/", self.seed_orders, 3)
+
+    def test_order_items_are_nested(self):
+        self.seed_orders(1)
+        self.login(self.customer)
+        order = self.client.get("/orders/").data["results"][0]
+        self.assertEqual(len(order["items"]), 3)
+        self.assertEqual(order["items"][0]["menu_item"], "Dish 0")
+
+
+class PaginationTests(RestaurantTestCase):
+    def setUp(self):
+        super().setUp()
+        # Several orders share a date so the id tiebreaker matters
+        Order.objects.bulk_create([
+            Order(user=self.customer, total=Decimal("5.00"), date=date(2025, 1, 1 + i // 3)) for i in range(10)
+        ])
+        self.login(self.manager)
+
+    def walk(self, url):
+        seen = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn("count", response.data)
+            seen += [row["id"] for row in response.data["results"]]
+            url = response.data["next"]
+        return seen
+
+    def test_cursor_walks_every_order_newest_first(self):
+        expected = list(Order.objects.order_by("-date", "-id").values_list("id", flat=True))
+        self.assertEqual(self.walk("/orders/?cursor=&page_size=3"), expected)
+
+    def test_cursor_follows_requested_ordering(self):
+        expected = list(Order.objects.order_by("date", "id").values_list("id", flat=True))
+        self.assertEqual(self.walk("/orders/?cursor=&page_size=4&ordering=date"), expected)
+
+    def test_invalid_cursor(self):
+        self.assertEqual(self.client.get("/orders/?cursor=bogus").status_code, 404)
+
+    def test_page_size_is_capped(self):
+        with self.settings(MAX_PAGE_SIZE=4):
+            response = self.client.get("/orders/?page_size=50")
+        self.assertEqual(len(response.data["results"]), 4)
+        self.assertEqual(response.data["count"], 10)
+
+    def test_count_can_be_skipped(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get("/orders/?count=false&page_size=4&page=3")
+        self.assertNotIn("COUNT", " ".join(q["sql"] for q in ctx.captured_queries))
+        self.assertEqual(len(response.data["results"]), 2)
+        self.assertIsNone(response.data["next"])
+        self.assertIn("page=2", response.data["previous"])
+
+
+class ExportTests(RestaurantTestCase):
+    def setUp(self):
+        super().setUp()
+        item = MenuItem.objects.create(title="Soup", price=Decimal("4.50"), featured=False, category=self.category)
+        self.other = self.make_user("other", self.customer_group)
+        self.mine = Order.objects.create(user=self.customer, total=Decimal("9.00"), date=date(2025, 1, 1))
+        OrderItem.objects.create(order=self.mine, menuitem=item, quantity=2, unit_price=item.price, price=Decimal("9.00"))
+        Order.objects.create(user=self.customer, total=Decimal("1.00"), date=date(2025, 3, 1), status=True)
+        Order.objects.create(user=self.other, total=Decimal("2.00"), date=date(2025, 1, 1))
+
+    def export(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return b"".join(response.streaming_content).decode()
+
+    def test_ndjson_is_scoped_to_the_user(self):
+        self.login(self.customer)
+        lines = [json.loads(line) for line in self.export("/orders/export/").splitlines()]
+        self.assertEqual(len(lines), 2)
+        self.assertEqual(lines[0]["id"], self.mine.pk)
+        self.assertEqual(lines[0]["items"][0]["quantity"], 2)
+        self.assertEqual(lines[0]["total"], "9.00")
+
+    def test_csv_with_filters(self):
+        self.login(self.manager)
+        rows = list(csv.reader(self.export("/orders/export/?output=csv&date_to=2025-01-31&status=false").splitlines()))
+        self.assertEqual(rows[0][:2], ["id", "user"])
+        self.assertEqual(len(rows), 3)
+
+    def test_invalid_filters(self):
+        self.login(self.manager)
+        self.assertEqual(self.client.get("/orders/export/?date_from=yesterday").status_code, 400)
+        self.assertEqual(self.client.get("/orders/export/?status=maybe").status_code, 400)
+
+
+class RoleClaimTests(RestaurantTestCase):
+    def token_for(self, username):
+        response = self.client.post("/api/token/", {"username": username, "password": "pass12345"})
+        self.assertEqual(response.status_code, 200)
+        return response.data["access"]
+
+    def get(self, url, token):
+        return self.client.get(url, HTTP_AUTHORIZATION=f"Bearer {token}")
+
+    def test_reads_only_check_the_user_state(self):
+        token = self.token_for("manager")
+        invalidate_roles()
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.get("/manager-only/", token)
+        self.assertEqual(response.status_code, 200)
+        # is_active and the role version, nothing else
+        self.assertEqual(len(ctx.captured_queries), 1)
+        # Then from the cache
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.get("/manager-only/", token).status_code, 200)
+        self.assertEqual(len(ctx.captured_queries), 0)
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.get("/orders/", token).status_code, 200)
+        tables = " ".join(q["sql"] for q in ctx.captured_queries)
+        self.assertNotIn("auth_group", tables)
+
+    def test_claims_drive_authorization(self):
+        token = self.token_for("customer")
+        self.assertEqual(self.get("/manager-only/", token).status_code, 403)
+
+    def test_role_change_revokes_tokens(self):
+        token = self.token_for("customer")
+        self.assertEqual(self.get("/orders/", token).status_code, 200)
+        # The group change drops the cached user state
+        self.crew_group.user_set.add(self.customer)
+        self.assertEqual(self.get("/orders/", token).status_code, 401)
+        self.assertEqual(self.client.post("/orders/checkout/", HTTP_AUTHORIZATION=f"Bearer {token}").status_code, 401)
+        self.assertEqual(self.get("/orders/", self.token_for("customer")).status_code, 200)
+
+    def test_group_rename_revokes_every_token(self):
+        token = self.token_for("crew")
+        self.manager_group.name = "Managers"
+        self.manager_group.save()
+        self.assertEqual(self.get("/orders/", token).status_code, 401)
+
+    def test_inactive_users_are_rejected(self):
+        token = self.token_for("customer")
+        self.assertEqual(self.get("/orders/", token).status_code, 200)
+        self.customer.is_active = False
+        self.customer.save()
+        self.assertEqual(self.get("/orders/", token).status_code, 401)
+        self.assertEqual(self.client.post("/orders/checkout/", HTTP_AUTHORIZATION=f"Bearer {token}").status_code, 401)
+
+
+    def test_djoser_gets_the_full_user(self):
+        self.customer.email = "customer@example.com"
+        self.customer.save()
+        response = self.get("/auth/users/me/", self.token_for("customer"))
+        self.assertEqual(response.data["email"], "customer@example.com")
+
+
+class AsyncViewTests(RestaurantTestCase):
+    def setUp(self):
+        super().setUp()
+        self.soup = MenuItem.objects.create(title="Soup", price=Decimal("4.50"), featured=True, category=self.category)
+        MenuItem.objects.create(title="Pie", price=Decimal("6.00"), featured=False, category=self.category)
+        self.order = Order.objects.create(user=self.customer, total=Decimal("9.00"), date=date(2025, 1, 1))
+
+    def get(self, url, user):
+        token = RoleTokenObtainPairSerializer.get_token(user).access_token
+        return self.client.get(url, HTTP_AUTHORIZATION=f"Bearer {token}")
+
+    def test_menu_items_match_the_sync_serializer(self):
+        response = self.get("/async/menu-items/?featured=true", self.customer)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["results"], [dict(MenuItemSerializer(self.soup).data)])
+
+    def test_menu_items_keyset_paging(self):
+        first = self.get("/async/menu-items/?page_size=1", self.customer).json()
+        second = self.get(f"/async/menu-items/?page_size=1&after={first['next_after']}", self.customer).json()
+        self.assertEqual([first["results"][0]["title"], second["results"][0]["title"]], ["Soup", "Pie"])
+        self.assertIsNone(second["next_after"])
+
+    def test_order_status_visibility(self):
+        url = f"/async/orders/{self.order.pk}/status/"
+        self.assertEqual(self.get(url, self.customer).json()["status"], False)
+        self.assertEqual(self.get(url, self.manager).status_code, 200)
+        self.assertEqual(self.get(url, self.crew).status_code, 404)
+
+    def test_requires_authentication(self):
+        self.assertEqual(self.client.get("/async/menu-items/").status_code, 401)
+
+    def test_category_filter(self):
+        response = self.get(f"/async/menu-items/?category={self.category.pk}", self.customer)
+        self.assertEqual(len(response.json()["results"]), 2)
+        self.assertEqual(self.get("/async/menu-items/?category=mains", self.customer).status_code, 400)
+
+    def test_throttled(self):
+        for _ in range(5):
+            self.assertEqual(self.get("/async/menu-items/", self.customer).status_code, 200)
+        response = self.get("/async/menu-items/", self.customer)
+        self.assertEqual(response.status_code, 429)
+        self.assertIn("Retry-After", response)
+
+
+class OrderEventTests(RestaurantTestCase):
+    def setUp(self):
+        super().setUp()
+        self.other = self.make_user("other", self.customer_group)
+        self.order = Order.objects.create(user=self.customer, total=Decimal("9.00"), date=date(2025, 1, 1))
+        self.token = RoleTokenObtainPairSerializer.get_token(self.customer).access_token
+
+    async def test_stream_only_carries_visible_orders(self):
+        response = await self.async_client.get(
+            "/async/orders/events/?timeout=1", headers={"Authorization": f"Bearer {self.token}"},
+        )
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        chunks = aiter(response.streaming_content)
+        self.assertEqual(await anext(chunks), b": connected\n\n")
+
+        broker = get_broker()
+        broker.publish({"id": 99, "user": self.other.pk, "delivery_crew": None, "status": False, "date": "2025-01-01"})
+        broker.publish({"id": self.order.pk, "user": self.customer.pk, "delivery_crew": None, "status": True, "date": "2025-01-01"})
+        chunk = (await anext(chunks)).decode()
+        self.assertTrue(chunk.startswith(f"event: order\nid: {self.order.pk}\n"))
+        self.assertEqual(json.loads(chunk.split("data: ")[1])["status"], True)
+
+    def test_refused_under_wsgi(self):
+        response = self.client.get("/async/orders/events/", HTTP_AUTHORIZATION=f"Bearer {self.token}")
+        self.assertEqual(response.status_code, 501)
+
+    def test_committed_saves_are_published(self):
+        self.order.status = True
+        with mock.patch.object(get_broker(), "publish") as publish:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.order.save()
+        event = publish.call_args.args[0]
+        self.assertEqual((event["id"], event["status"], event["user"]), (self.order.pk, True, self.customer.pk))
+
+    def test_visibility_rules(self):
+        event = {"id": 1, "user": self.customer.pk, "delivery_crew": self.crew.pk}
+        self.assertTrue(visible_to(event, self.manager.pk, {"Manager"}))
+        self.assertTrue(visible_to(event, self.crew.pk, {"Delivery Crew"}))
+        self.assertTrue(visible_to(event, self.customer.pk, {"Customer"}))
+        self.assertFalse(visible_to(event, self.other.pk, {"Customer"}))
+
+
+class QueryPlanTests(RestaurantTestCase):
+    """
+    Runs EXPLAIN QUERY PLAN on every query the order and menu item lists
+    issue for their filter/ordering combinations, and fails on table scans
+    of filtered queries, including walks in index order, which still read
+    every row to apply the filter. Scans of a partial index only read the
+    rows it holds, so they pass. Unfiltered lists may walk a table in index
+    or rowid order, since their LIMIT stops the walk after one page.
+    """
+    order_urls = [
+        "/orders/",
+        "/orders/?status=false",
+        "/orders/?status=true&ordering=date",
+        "/orders/?date=2025-01-15",
+        "/orders/?ordering=-date&status=false",
+        "/orders/?cursor=&status=false",
+    ]
+    menu_urls = [
+        "/menu-items/?category={category}",
+        "/menu-items/?category={category}&ordering=price",
+        "/menu-items/?featured=true&ordering=-price",
+        "/menu-items/?price=5.00",
+        "/menu-items/?ordering=price",
+        "/menu-items/?ordering=title",
+        "/menu-items/?cursor=&ordering=price",
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        # A realistic spread: many customers, a few crew members, a year of orders
+        customers = User.objects.bulk_create([User(username=f"c{i}") for i in range(200)])
+        crew = User.objects.bulk_create([User(username=f"d{i}") for i in range(10)])
+        categories = Category.objects.bulk_create([Category(slug=f"s{i}", title=f"Category {i}") for i in range(20)])
+        MenuItem.objects.bulk_create([
+            MenuItem(title=f"Dish {i}", price=Decimal(5 + i % 30), featured=i % 7 == 0, category=categories[i % 20])
+            for i in range(1000)
+        ])
+        Order.objects.bulk_create([
+            Order(user=customers[i % 200], delivery_crew=crew[i % 10] if i % 4 else None, status=i % 3 == 0,
+                  total=Decimal("20.00"), date=date(2025, 1, 1 + i % 28))
+            for i in range(20000)
+        ])
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+        cls.sample_customer = customers[0]
+        cls.sample_crew = crew[0]
+        cls.sample_category = categories[0]
+
+    def full_scans(self, url, tables):
+        clear_caches()
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+
+        partial = {
+            index.name for model in (MenuItem, Order) if model._meta.db_table in tables
+            for index in model._meta.indexes if index.condition is not None
+        }
+        scans = []
+        with connection.cursor() as cursor:
+            for query in ctx.captured_queries:
+                sql = query["sql"]
+                if not sql.startswith("SELECT") or not any(f'"{table}"' in sql for table in tables):
+                    continue
+                cursor.execute("EXPLAIN QUERY PLAN " + sql)
+                for row in cursor.fetchall():
+                    detail = row[-1]
+                    words = detail.split(" ")
+                    if words[0] != "SCAN" or words[1] not in tables or " WHERE " not in sql:
+                        continue
+                    if words[-1] not in partial:
+                        scans.append(f"{detail} <- {sql}")
+        return scans
+
+    def assertNoFullScans(self, user, urls, tables):
+        self.login(user)
+        for url in urls:
+            self.assertEqual(self.full_scans(url, tables), [], url)
+
+    def test_customer_orders(self):
+        self.assertNoFullScans(self.sample_customer, self.order_urls, ["restaurant_order"])
+
+    def test_delivery_crew_orders(self):
+        self.crew_group.user_set.add(self.sample_crew)
+        self.assertNoFullScans(self.sample_crew, self.order_urls, ["restaurant_order"])
+
+    def test_manager_orders(self):
+        self.assertNoFullScans(self.manager, self.order_urls, ["restaurant_order"])
+
+    def test_menu_items(self):
+        urls = [url.format(category=self.sample_category.pk) for url in self.menu_urls]
+        self.assertNoFullScans(self.customer, urls, ["restaurant_menuitem"])
+
+
+class ThrottleTests(RestaurantTestCase):
+    def test_sliding_window(self):
+        results = [hit("t", 5, 60, now=120 + i) for i in range(6)]
+        self.assertEqual(results[:5], [None] * 5)
+        self.assertEqual(results[5], 120 + 60 - 125)
+        # Just after the window rolls over the previous one still counts fully
+        self.assertIsNotNone(hit("t", 5, 60, now=181))
+        # Half way through, 5 * 0.5 + 1 requests is under the limit of 5
+        self.assertIsNone(hit("t", 5, 60, now=210))
+
+    def test_rejected_requests_do_not_count(self):
+        for i in range(5):
+            self.assertIsNone(hit("t", 5, 60, now=120 + i))
+        # A client hammering the limit does not push it further away
+        for i in range(100):
+            self.assertIsNotNone(hit("t", 5, 60, now=130 + i * 0.1))
+        self.assertIsNone(hit("t", 5, 60, now=210))
+
+    def test_viewset_throttle(self):
+        self.login(self.customer)
+        for _ in range(5):
+            self.assertEqual(self.client.get("/cart/").status_code, 200)
+        response = self.client.get("/cart/")
+        self.assertEqual(response.status_code, 429)
+        self.assertTrue(caches["throttle"].get(f"throttle:burst:{self.customer.pk}:{int(time.time() // 60)}"))
+
+
+class BulkMenuTests(RestaurantTestCase):
+    def setUp(self):
+        super().setUp()
+        self.soup = MenuItem.objects.create(title="Soup", price=Decimal("4.50"), featured=False, category=self.category)
+        Category.objects.create(slug="desserts", title="Desserts")
+        self.login(self.manager)
+
+    def test_creates_and_updates_in_constant_queries(self):
+        rows = [{"title": f"Cake {i}", "price": "3.00", "category": "desserts"} for i in range(300)]
+        rows.append({"id": self.soup.pk, "title": "Soup of the day", "price": "5.00", "featured": True, "category": "mains"})
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post("/menu-items/bulk/", rows, format="json")
+        self.assertEqual(response.data, {"created": 300, "updated": 1})
+        # Lookups, batched writes and the search index; never one per row
+        self.assertLess(len(ctx.captured_queries), 15)
+        self.soup.refresh_from_db()
+        self.assertEqual((self.soup.title, self.soup.featured), ("Soup of the day", True))
+        self.assertEqual(MenuItem.objects.filter(category__slug="desserts").count(), 300)
+
+    def test_csv(self):
+        body = "id,title,price,featured,category\n,Pie,6.00,true,desserts\n"
+        response = self.client.post("/menu-items/bulk/", body, content_type="text/csv")
+        self.assertEqual(response.data, {"created": 1, "updated": 0})
+
+    def test_updates_without_featured_keep_the_flag(self):
+        MenuItem.objects.filter(pk=self.soup.pk).update(featured=True)
+        response = self.client.post("/menu-items/bulk/", [
+            {"id": self.soup.pk, "title": "Soup", "price": "5.00", "category": "mains"},
+            {"title": "Pie", "price": "6.00", "category": "desserts"},
+        ], format="json")
+        self.assertEqual(response.data, {"created": 1, "updated": 1})
+        self.assertEqual(
+            dict(MenuItem.objects.values_list("title", "featured")), {"Soup": True, "Pie": False},
+        )
+        body = f"id,title,price,featured,category\n{self.soup.pk},Soup,5.50,,mains\n"
+        self.client.post("/menu-items/bulk/", body, content_type="text/csv")
+        self.soup.refresh_from_db()
+        self.assertEqual((self.soup.price, self.soup.featured), (Decimal("5.50"), True))
+
+    def test_errors_are_reported_per_row_and_nothing_is_written(self):
+        rows = [
+            {"title": "Pie", "price": "6.00", "category": "desserts"},
+            {"title": "Tart", "price": "abc", "category": "desserts"},
+            {"title": "Flan", "price": "2.00", "category": "nope"},
+            {"id": 999999, "title": "Ghost", "price": "1.00", "category": "mains"},
+        ]
+        response = self.client.post("/menu-items/bulk/", rows, format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([error["row"] for error in response.data["errors"]], [1, 2, 3])
+        self.assertFalse(MenuItem.objects.filter(title="Pie").exists())
+
+    def test_keeps_menu_cache_consistent(self):
+        self.assertEqual(self.client.get("/menu-items/").data["count"], 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post("/menu-items/bulk/", [{"title": "Pie", "price": "6.00", "category": "desserts"}], format="json")
+        self.assertEqual(self.client.get("/menu-items/").data["count"], 2)
+
+    def test_managers_only(self):
+        self.login(self.customer)
+        self.assertEqual(self.client.post("/menu-items/bulk/", [], format="json").status_code, 403)
+
+
+class SalesRollupTests(RestaurantTestCase):
+    def setUp(self):
+        super().setUp()
+        self.soup = MenuItem.objects.create(title="Soup", price=Decimal("4.00"), featured=False, category=self.category)
+        self.pie = MenuItem.objects.create(title="Pie", price=Decimal("6.00"), featured=False, category=self.category)
+
+    def place_order(self, day, *lines):
+        order = Order.objects.create(user=self.customer, total=Decimal("0"), date=day)
+        for item, quantity in lines:
+            OrderItem.objects.create(order=order, menuitem=item, quantity=quantity,
+                                     unit_price=item.price, price=item.price * quantity)
+        return order
+
+    def rollup(self):
+        return {
+            (row.date, row.menuitem_id): (row.quantity, row.revenue, row.delivered_quantity, row.delivered_revenue)
+            for row in DailySales.objects.all()
+        }
+
+    def test_incremental_updates_match_a_rebuild(self):
+        first = self.place_order(date(2025, 1, 1), (self.soup, 2), (self.pie, 1))
+        self.place_order(date(2025, 1, 1), (self.soup, 1))
+        third = self.place_order(date(2025, 1, 2), (self.pie, 3))
+
+        first = Order.objects.get(pk=first.pk)
+        first.status = True
+        first.save()
+        third.delete()
+
+        incremental = self.rollup()
+        self.assertEqual(incremental[(date(2025, 1, 1), self.soup.pk)], (3, Decimal("12.00"), 2, Decimal("8.00")))
+        self.assertEqual(incremental[(date(2025, 1, 2), self.pie.pk)], (0, Decimal("0.00"), 0, Decimal("0.00")))
+
+        call_command("rebuild_sales_rollup", "--batch-days", "1", stdout=io.StringIO())
+        rebuilt = self.rollup()
+        nonzero = {key: value for key, value in incremental.items() if any(value)}
+        self.assertEqual(rebuilt, nonzero)
+
+    def assertMatchesRebuild(self):
+        incremental = {key: value for key, value in self.rollup().items() if any(value)}
+        call_command("rebuild_sales_rollup", stdout=io.StringIO())
+        self.assertEqual(self.rollup(), incremental)
+
+    def test_moving_an_order_to_another_day(self):
+        order = self.place_order(date(2025, 1, 1), (self.soup, 2), (self.pie, 1))
+        self.login(self.manager)
+        response = self.client.patch(f"/orders/{order.pk}/", {"date": "2025-01-05", "status": True})
+        self.assertEqual(response.status_code, 200)
+        rollup = self.rollup()
+        self.assertEqual(rollup[(date(2025, 1, 1), self.soup.pk)], (0, Decimal("0.00"), 0, Decimal("0.00")))
+        self.assertEqual(rollup[(date(2025, 1, 5), self.soup.pk)], (2, Decimal("8.00"), 2, Decimal("8.00")))
+        self.assertMatchesRebuild()
+
+    def test_editing_an_item(self):
+        order = self.place_order(date(2025, 1, 1), (self.soup, 2))
+        other = self.place_order(date(2025, 1, 2))
+        item = OrderItem.objects.get(order=order)
+        item.quantity, item.price = 3, Decimal("12.00")
+        item.save()
+        self.assertEqual(self.rollup()[(date(2025, 1, 1), self.soup.pk)][:2], (3, Decimal("12.00")))
+        item.order, item.menuitem = other, self.pie
+        item.save()
+        self.assertEqual(self.rollup()[(date(2025, 1, 2), self.pie.pk)][:2], (3, Decimal("12.00")))
+        self.assertMatchesRebuild()
+
+    def test_checkout_updates_the_rollup(self):
+        Cart.objects.create(user=self.customer, menuitem=self.pie, quantity=2, unit_price=self.pie.price, price=Decimal("12.00"))
+        self.login(self.customer)
+        self.client.post("/orders/checkout/")
+        row = DailySales.objects.get(menuitem=self.pie)
+        self.assertEqual((row.quantity, row.revenue), (2, Decimal("12.00")))
+
+    def test_analytics_endpoint(self):
+        self.place_order(date(2025, 1, 1), (self.soup, 2), (self.pie, 1))
+        self.place_order(date(2025, 2, 1), (self.pie, 1))
+        self.login(self.manager)
+
+        by_day = self.client.get("/analytics/sales/?date_to=2025-01-31").data["results"]
+        self.assertEqual([(row["date"], row["revenue"]) for row in by_day], [(date(2025, 1, 1), Decimal("14.00"))])
+
+        by_item = self.client.get("/analytics/sales/?by=menuitem").data["results"]
+        self.assertEqual({row["title"]: row["quantity"] for row in by_item}, {"Soup": 2, "Pie": 2})
+
+        by_category = self.client.get("/analytics/sales/?by=category").data["results"]
+        self.assertEqual([(row["title"], row["revenue"]) for row in by_category], [("Mains", Decimal("20.00"))])
+
+        self.assertEqual(self.client.get("/analytics/sales/?by=week").status_code, 400)
+        self.login(self.customer)
+        self.assertEqual(self.client.get("/analytics/sales/").status_code, 403)
+
+
+class ArchiveTests(RestaurantTestCase):
+    def setUp(self):
+        super().setUp()
+        self.soup = MenuItem.objects.create(title="Soup", price=Decimal("4.00"), featured=False, category=self.category)
+
+    def place_order(self, day, delivered=True, user=None):
+        order = Order.objects.create(user=user or self.customer, total=Decimal("8.00"), date=day, status=delivered)
+        OrderItem.objects.create(order=order, menuitem=self.soup, quantity=2, unit_price=Decimal("4.00"), price=Decimal("8.00"))
+        return order
+
+    def rollup(self):
+        return set(DailySales.objects.values_list("date", "menuitem_id", "quantity", "revenue", "delivered_quantity", "delivered_revenue"))
+
+    def test_only_old_delivered_orders_move(self):
+        old = self.place_order(date(2024, 1, 1))
+        pending = self.place_order(date(2024, 1, 2), delivered=False)
+        recent = self.place_order(date(2025, 6, 1))
+        rollup = self.rollup()
+
+        call_command("archive_orders", "--before", "2025-01-01", "--batch-size", "1", stdout=io.StringIO())
+        self.assertEqual(set(Order.objects.values_list("pk", flat=True)), {pending.pk, recent.pk})
+        self.assertEqual(list(OrderItem.objects.filter(order=old.pk)), [])
+        archived = ArchivedOrder.objects.get()
+        self.assertEqual((archived.pk, archived.user_id, archived.date, archived.status), (old.pk, self.customer.pk, old.date, True))
+        self.assertEqual(ArchivedOrderItem.objects.get().order_id, old.pk)
+
+        # Archived sales still count, and a rebuild reads the archive too
+        self.assertEqual(self.rollup(), rollup)
+        call_command("rebuild_sales_rollup", stdout=io.StringIO())
+        self.assertEqual(self.rollup(), rollup)
+
+    def test_interrupted_runs_resume(self):
+        orders = [self.place_order(date(2024, 1, day)) for day in (1, 2, 3)]
+        run = archive_orders(date(2025, 1, 1), batch_size=2)
+        self.assertEqual(next(run), (2, 2, orders[1].pk))
+        run.close()
+        self.assertEqual(Order.objects.get().pk, orders[2].pk)
+        self.assertEqual(list(archive_orders(date(2025, 1, 1), batch_size=2)), [(1, 1, orders[2].pk)])
+        self.assertEqual(ArchivedOrder.objects.count(), 3)
+
+    def test_include_archived_merges_live_and_archived_orders(self):
+        dates = [date(2024, 1, 1), date(2024, 3, 1), date(2024, 5, 1), date(2025, 2, 1)]
+        orders = [self.place_order(day) for day in dates]
+        self.place_order(date(2024, 2, 1), user=self.manager)
+        list(archive_orders(date(2024, 4, 1)))
+        self.login(self.customer)
+
+        live = self.client.get("/orders/").data["results"]
+        self.assertEqual([row["id"] for row in live], [orders[3].pk, orders[2].pk])
+
+        ids = []
+        url = "/orders/?include_archived=1&page_size=3"
+        while url:
+            page = self.client.get(url).data
+            ids += [row["id"] for row in page["results"]]
+            url = page["next"]
+        self.assertEqual(ids, [order.pk for order in reversed(orders)])
+
+        response = self.client.get("/orders/?include_archived=1&ordering=date&date=2024-01-01")
+        self.assertEqual(response.data["results"], [{
+            "id": orders[0].pk,
+            "items": [{
+                "id": ArchivedOrderItem.objects.get(order=orders[0].pk).pk,
+                "menu_item": "Soup", "quantity": 2, "unit_price": "4.00", "price": "8.00",
+                "order": orders[0].pk, "menuitem": self.soup.pk,
+            }],
+            "status": True, "total": "8.00", "date": "2024-01-01",
+            "user": self.customer.pk, "delivery_crew": None,
+        }])
+
+
+class MenuSearchTests(RestaurantTestCase):
+    def setUp(self):
+        super().setUp()
+        desserts = Category.objects.create(slug="desserts", title="Desserts")
+        self.soup = MenuItem.objects.create(title="Tomato Soup", price=Decimal("4.50"), featured=False, category=self.category)
+        self.pie = MenuItem.objects.create(title="Lemon Pie", price=Decimal("6.00"), featured=False, category=desserts)
+        self.tart = MenuItem.objects.create(title="Lemon Tart", price=Decimal("5.00"), featured=False, category=desserts)
+        self.login(self.customer)
+
+    def titles(self, url):
+        return [row["title"] for row in self.client.get(url).data["results"]]
+
+    def test_prefix_search(self):
+        self.assertEqual(self.titles("/menu-items/?search=tom"), ["Tomato Soup"])
+        self.assertEqual(self.titles("/menu-items/?search=lem+ta"), ["Lemon Tart"])
+
+    def test_category_titles_are_searchable_and_kept_in_sync(self):
+        self.assertEqual(self.titles("/menu-items/?search=dess&ordering=price"), ["Lemon Tart", "Lemon Pie"])
+        self.category.title = "Starters"
+        self.category.save()
+        self.assertEqual(self.titles("/menu-items/?search=starters"), ["Tomato Soup"])
+
+    def test_index_follows_writes(self):
+        self.soup.title = "Onion Soup"
+        self.soup.save()
+        self.tart.delete()
+        self.assertEqual(self.titles("/menu-items/?search=tomato"), [])
+        self.assertEqual(self.titles("/menu-items/?search=oni"), ["Onion Soup"])
+        self.assertEqual(self.titles("/menu-items/?search=tart"), [])
+
+    def test_autocomplete(self):
+        response = self.client.get("/menu-items/autocomplete/?q=lemon p")
+        self.assertEqual(response.data, [{"id": self.pie.pk, "title": "Lemon Pie"}])
+
+    def test_search_uses_the_index(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get("/menu-items/?search=lemon")
+        sql = " ".join(query["sql"] for query in ctx.captured_queries)
+        self.assertIn("MATCH", sql)
+        self.assertNotIn("LIKE", sql)
+
+
+class CartUpsertTests(RestaurantTestCase):
+    def setUp(self):
+        super().setUp()
+        self.soup = MenuItem.objects.create(title="Soup", price=Decimal("4.50"), featured=False, category=self.category)
+        self.pie = MenuItem.objects.create(title="Pie", price=Decimal("6.00"), featured=False, category=self.category)
+        self.login(self.customer)
+
+    def test_adding_twice_increments_quantity(self):
+        response = self.client.post("/cart/", {"menuitem": self.soup.pk, "quantity": 2})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data["price"], "9.00")
+        response = self.client.post("/cart/", {"menuitem": self.soup.pk, "quantity": 1, "unit_price": "4.00"})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.data["quantity"], response.data["price"]), (3, "12.00"))
+        cart = Cart.objects.get(user=self.customer)
+        self.assertEqual(cart.pk, response.data["id"])
+        self.assertEqual((cart.quantity, cart.unit_price, cart.price), (3, Decimal("4.00"), Decimal("12.00")))
+
+    def test_adding_past_the_column_limits_is_rejected(self):
+        response = self.client.post("/cart/", {"menuitem": self.soup.pk, "quantity": 32000, "unit_price": "0.10"})
+        self.assertEqual(response.status_code, 201)
+        for quantity, unit_price in ((1000, "0.10"), (1, "9.99")):
+            response = self.client.post("/cart/", {"menuitem": self.soup.pk, "quantity": quantity, "unit_price": unit_price})
+            self.assertEqual(response.status_code, 400)
+        cart = Cart.objects.get(user=self.customer)
+        self.assertEqual((cart.quantity, cart.price), (32000, Decimal("3200.00")))
+        self.assertEqual(self.client.post("/cart/", {"menuitem": self.pie.pk, "quantity": 2000}).status_code, 400)
+        response = self.client.put("/cart/set/", [{"menuitem": self.pie.pk, "quantity": 2000}], format="json")
+        self.assertEqual([error["row"] for error in response.data["errors"]], [0])
+
+    def test_patch_recomputes_the_price(self):
+        line = Cart.objects.create(user=self.customer, menuitem=self.soup, quantity=1, unit_price=Decimal("4.00"), price=Decimal("4.00"))
+        response = self.client.patch(f"/cart/{line.pk}/", {"quantity": 5})
+        self.assertEqual((response.status_code, response.data["price"]), (200, "20.00"))
+        response = self.client.put(f"/cart/{line.pk}/", {"menuitem": self.pie.pk, "quantity": 2})
+        self.assertEqual((response.data["unit_price"], response.data["price"]), ("6.00", "12.00"))
+        self.assertEqual(self.client.post("/orders/checkout/").status_code, 201)
+        self.assertEqual(Order.objects.get().total, Decimal("12.00"))
+
+    def test_patch_checks_limits_and_duplicates(self):
+        line = Cart.objects.create(user=self.customer, menuitem=self.soup, quantity=1, unit_price=Decimal("4.50"), price=Decimal("4.50"))
+        Cart.objects.create(user=self.customer, menuitem=self.pie, quantity=1, unit_price=Decimal("6.00"), price=Decimal("6.00"))
+        response = self.client.patch(f"/cart/{line.pk}/", {"quantity": 3000})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("quantity", response.data)
+        response = self.client.patch(f"/cart/{line.pk}/", {"menuitem": self.pie.pk})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("menuitem", response.data)
+        line.refresh_from_db()
+        self.assertEqual((line.menuitem_id, line.quantity, line.price), (self.soup.pk, 1, Decimal("4.50")))
+
+    def test_fallback_add_checks_the_limits(self):
+        self.assertEqual(_add(self.customer.pk, self.soup.pk, 32000, Decimal("0.10"))[1], 32000)
+        self.assertEqual(_add(self.customer.pk, self.soup.pk, 700, Decimal("0.10"))[1], 32700)
+        with self.assertRaises(serializers.ValidationError):
+            _add(self.customer.pk, self.soup.pk, 100, Decimal("0.10"))
+        self.assertEqual(Cart.objects.get(user=self.customer).quantity, 32700)
+
+    def test_set_cart_reconciles_lines(self):
+        Cart.objects.create(user=self.customer, menuitem=self.soup, quantity=5, unit_price=Decimal("4.50"), price=Decimal("22.50"))
+        other = MenuItem.objects.create(title="Tart", price=Decimal("5.00"), featured=False, category=self.category)
+        Cart.objects.create(user=self.customer, menuitem=other, quantity=1, unit_price=Decimal("5.00"), price=Decimal("5.00"))
+        response = self.client.put("/cart/set/", [
+            {"menuitem": self.soup.pk, "quantity": 1},
+            {"menuitem": self.pie.pk, "quantity": 2},
+        ], format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(row["menu_item"], row["quantity"], row["price"]) for row in response.data],
+            [("Soup", 1, "4.50"), ("Pie", 2, "12.00")],
+        )
+        response = self.client.put("/cart/set/", [], format="json")
+        self.assertEqual(response.data, [])
+        self.assertFalse(Cart.objects.exists())
+
+    def test_set_cart_rejects_bad_rows(self):
+        response = self.client.put("/cart/set/", [
+            {"menuitem": self.soup.pk, "quantity": 1},
+            {"menuitem": self.soup.pk, "quantity": 2},
+            {"menuitem": 999, "quantity": 1},
+            {"menuitem": self.pie.pk, "quantity": 0},
+        ], format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([error["row"] for error in response.data["errors"]], [1, 2, 3])
+        self.assertFalse(Cart.objects.exists())
+
+    def test_set_cart_query_count_is_independent_of_size(self):
+        items = MenuItem.objects.bulk_create([
+            MenuItem(title=f"Dish {i}", price=Decimal("1.00"), featured=False, category=self.category)
+            for i in range(50)
+        ])
+        # Warm up per-user lookups
+        self.client.put("/cart/set/", [], format="json")
+        counts = []
+        for size in (5, 50):
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.put("/cart/set/", [
+                    {"menuitem": item.pk, "quantity": 1} for item in items[:size]
+                ], format="json")
+            self.assertEqual(len(response.data), size)
+            counts.append(len(ctx.captured_queries))
+        self.assertEqual(counts[0], counts[1])
+
+
+class MetricsTests(RestaurantTestCase):
+    def setUp(self):
+        super().setUp()
+        registry.clear()
+        MenuItem.objects.create(title="Soup", price=Decimal("4.50"), featured=False, category=self.category)
+        self.login(self.customer)
+        self.staff = User.objects.create_user(username="staff", password="pass12345", is_staff=True)
+
+    def metrics(self):
+        self.client.force_login(self.staff)
+        return self.client.get("/metrics/")
+
+    def metric(self, text, name):
+        for line in text.splitlines():
+            if line.startswith(name + " "):
+                return float(line.split()[-1])
+        self.fail(f"{name} not found in:\n{text}")
+
+    def test_routes_are_measured(self):
+        self.client.get("/menu-items/")
+        self.client.get("/menu-items/")
+        text = self.metrics().content.decode()
+        labels = '{route="menuitem-list",method="GET"}'
+        self.assertEqual(self.metric(text, f"littlelemon_request_duration_seconds_count{labels}"), 2)
+        self.assertGreater(self.metric(text, f"littlelemon_request_db_queries_sum{labels}"), 0)
+        self.assertGreater(self.metric(text, f"littlelemon_request_serialization_seconds_sum{labels}"), 0)
+        self.assertGreater(self.metric(text, f"littlelemon_response_size_bytes_sum{labels}"), 0)
+        self.assertIn('littlelemon_request_duration_seconds{route="menuitem-list",method="GET",quantile="0.99"}', text)
+
+    @override_settings(PERF_SLOW_REQUEST_MS=0)
+    def test_slow_requests_are_logged_with_their_queries(self):
+        with self.assertLogs("restaurant.metrics", "WARNING") as logs:
+            self.client.get("/menu-items/")
+        self.assertIn("GET /menu-items/ (menuitem-list)", logs.output[0])
+        self.assertIn("SELECT", logs.output[0])
+
+    @override_settings(PERF_SAMPLE_RATE=0)
+    def test_sampling_can_turn_metrics_off(self):
+        self.client.get("/menu-items/")
+        self.assertEqual(self.metrics().content.decode(), "\n")
+
+    def test_closed_to_everyone_but_staff(self):
+        self.assertEqual(self.client.get("/metrics/").status_code, 404)
+        self.client.force_login(self.customer)
+        self.assertEqual(self.client.get("/metrics/").status_code, 404)
+        self.client.logout()
+        for user, expected in ((self.customer, 404), (self.staff, 200)):
+            access = RoleTokenObtainPairSerializer.get_token(user).access_token
+            response = self.client.get("/metrics/", HTTP_AUTHORIZATION=f"Bearer {access}")
+            self.assertEqual(response.status_code, expected)
+
+    @override_settings(PERF_METRICS_TOKEN="secret")
+    def test_token(self):
+        self.assertEqual(self.client.get("/metrics/", HTTP_AUTHORIZATION="Bearer wrong").status_code, 404)
+        response = self.client.get("/metrics/", HTTP_AUTHORIZATION="Bearer secret")
+        self.assertEqual(response.status_code, 200)
+
+
+class FastPathTests(RestaurantTestCase):
+    def setUp(self):
+        super().setUp()
+        desserts = Category.objects.create(slug="desserts", title="Desserts — sweet")
+        self.items = [
+            MenuItem.objects.create(title="Crème brûlée", price=Decimal("6.5"), featured=True, category=desserts),
+            MenuItem.objects.create(title="Soup \u2028 of the day", price=Decimal("4.00"), featured=False, category=self.category),
+        ]
+        for item in self.items:
+            Cart.objects.create(user=self.customer, menuitem=item, quantity=2, unit_price=item.price, price=item.price * 2)
+        for crew in (None, self.crew):
+            order = Order.objects.create(user=self.customer, delivery_crew=crew, total=Decimal("10.50"), date=date(2025, 3, 1))
+            for item in self.items:
+                OrderItem.objects.create(order=order, menuitem=item, quantity=1, unit_price=item.price, price=item.price)
+        self.login(self.customer)
+
+    def assertSameBody(self, url):
+        clear_caches()
+        fast = self.client.get(url)
+        clear_caches()
+        with mock.patch("restaurant.fastpath.compile_serializer", return_value=None), \
+                mock.patch.object(FastJSONRenderer, "render", JSONRenderer.render):
+            slow = self.client.get(url)
+        self.assertEqual(fast.status_code, 200)
+        self.assertEqual(fast.content, slow.content)
+
+    def test_menu_items_match_the_serializer(self):
+        self.assertSameBody("/menu-items/?ordering=price")
+        self.assertSameBody("/menu-items/?cursor=&page_size=1")
+
+    def test_cart_matches_the_serializer(self):
+        self.assertSameBody("/cart/")
+
+    def test_orders_match_the_serializer(self):
+        self.assertSameBody("/orders/")
+        self.assertSameBody("/orders/?count=false&page_size=1")
+
+    def test_hot_serializers_compile(self):
+        for serializer_class in (MenuItemSerializer, CartSerializer, OrderSerializer):
+            self.assertIsNotNone(compile_serializer(serializer_class))
+
+    def test_renderer_matches_json_renderer(self):
+        data = {
+            "text": "é \u2028 \u2029 \x01 \" \\ /", "none": None, "flag": True, "number": 10 ** 15,
+            "decimal": Decimal("1.50"), "day": date(2025, 1, 2), 3: [1, {"nested": []}],
+        }
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+        self.assertEqual(
+            FastJSONRenderer().render(data, "application/json; indent=2"),
+            JSONRenderer().render(data, "application/json; indent=2"),
+        )
+
+
+@override_settings(COMPRESSION_MIN_SIZE=100)
+class CompressionTests(RestaurantTestCase):
+    def setUp(self):
+        super().setUp()
+        for i in range(10):
+            MenuItem.objects.create(title=f"Dish {i}", price=Decimal("4.50"), featured=False, category=self.category)
+        self.login(self.customer)
+
+    def test_gzip_is_negotiated(self):
+        response = self.client.get("/menu-items/?page_size=10", HTTP_ACCEPT_ENCODING="gzip, deflate")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", response["Vary"])
+        self.assertEqual(len(json.loads(gzip.decompress(response.content))["results"]), 10)
+        self.assertTrue(response["ETag"].startswith('W/"'))
+
+    def test_small_or_unwanted_responses_are_not_compressed(self):
+        response = self.client.get("/menu-items/?page_size=10", HTTP_ACCEPT_ENCODING="gzip;q=0")
+        self.assertFalse(response.has_header("Content-Encoding"))
+        response = self.client.get("/menu-items/?page_size=1", HTTP_ACCEPT_ENCODING="gzip")
+        self.assertFalse(response.has_header("Content-Encoding"))
+
+    @skipUnless(brotli, "brotli is not installed")
+    def test_brotli_is_preferred(self):
+        response = self.client.get("/menu-items/?page_size=10", HTTP_ACCEPT_ENCODING="gzip, br")
+        self.assertEqual(response["Content-Encoding"], "br")
+        self.assertEqual(len(json.loads(brotli.decompress(response.content))["results"]), 10)
+
+    def test_accepted_encodings(self):
+        self.assertEqual(
+            accepted_encodings("br;q=1.0, GZIP;q=0.5, identity, *;q=bad"),
+            {"br": 1.0, "gzip": 0.5, "identity": 1.0, "*": 0.0},
+        )
+
+
+class ConditionalGetTests(RestaurantTestCase):
+    def test_etag_on_api_responses(self):
+        self.login(self.customer)
+        etag = self.client.get("/orders/")["ETag"]
+        self.assertEqual(self.client.get("/orders/", HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_menu_etag_changes_with_every_menu_change(self):
+        self.login(self.customer)
+        response = self.client.get("/menu-items/")
+        etag = response["ETag"]
+        self.assertNotIn("Last-Modified", response)
+        self.assertEqual(self.client.get("/menu-items/", HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        # In the same second as the fetch above
+        with mock.patch("restaurant.caching.time.time", return_value=time.time()):
+            MenuItem.objects.create(title="Pie", price=Decimal("6.00"), featured=False, category=self.category)
+        response = self.client.get("/menu-items/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_schema_is_generated_once(self):
+        with mock.patch.object(OpenAPISchemaGenerator, "get_schema", autospec=True,
+                               side_effect=OpenAPISchemaGenerator.get_schema) as get_schema:
+            first = self.client.get("/swagger/?format=openapi")
+            second = self.client.get("/swagger/?format=openapi")
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(get_schema.call_count, 1)
+
+
+class DispatchTests(RestaurantTestCase):
+    def setUp(self):
+        super().setUp()
+        self.crew2 = self.make_user("crew2", self.crew_group)
+        # crew already has two pending deliveries; delivered ones do not count
+        for status in (False, False, True):
+            self.order(delivery_crew=self.crew, status=status)
+
+    def order(self, day=1, **kwargs):
+        return Order.objects.create(user=self.customer, total=Decimal("9.00"), date=date(2025, 1, day), **kwargs)
+
+    def pending_load(self, crew):
+        return Order.objects.filter(delivery_crew=crew, status=False).count()
+
+    def test_orders_go_to_the_least_loaded_crew(self):
+        orders = [self.order(day=day) for day in (6, 5, 4, 3, 2, 1)]
+        delivered = self.order(status=True)
+        self.login(self.manager)
+        response = self.client.post("/orders/dispatch/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["assigned"], 6)
+        # Oldest first, crew2 catches up before crew gets any
+        self.assertEqual(
+            [row["order"] for row in response.data["assignments"]],
+            [order.pk for order in reversed(orders)],
+        )
+        self.assertEqual([row["delivery_crew"] for row in response.data["assignments"][:2]], [self.crew2.pk] * 2)
+        self.assertEqual((self.pending_load(self.crew), self.pending_load(self.crew2)), (4, 4))
+        delivered.refresh_from_db()
+        self.assertIsNone(delivered.delivery_crew)
+        self.assertEqual(self.client.post("/orders/dispatch/").data["assigned"], 0)
+
+    def test_limit_and_permissions(self):
+        for day in range(1, 4):
+            self.order(day=day)
+        self.login(self.customer)
+        self.assertEqual(self.client.post("/orders/dispatch/").status_code, 403)
+        self.login(self.manager)
+        self.assertEqual(self.client.post("/orders/dispatch/?limit=0").status_code, 400)
+        self.assertEqual(self.client.post("/orders/dispatch/?limit=2").data["assigned"], 2)
+
+    def test_query_count_is_independent_of_volume(self):
+        counts = []
+        for size in (10, 100):
+            Order.objects.bulk_create([
+                Order(user=self.customer, total=Decimal("9.00"), date=date(2025, 1, 1)) for _ in range(size)
+            ])
+            with CaptureQueriesContext(connection) as ctx:
+                self.assertEqual(len(dispatch_pending_orders()), size)
+            counts.append(len(ctx.captured_queries))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_assignments_are_published(self):
+        order = self.order()
+        with mock.patch.object(get_broker(), "publish") as publish:
+            with self.captureOnCommitCallbacks(execute=True):
+                dispatch_pending_orders()
+        event = publish.call_args.args[0]
+        self.assertEqual((event["id"], event["delivery_crew"], event["user"]), (order.pk, self.crew2.pk, self.customer.pk))
+
+
+class ReplicaRouterTests(RestaurantTestCase):
+    def test_only_menu_reads_in_safe_requests_use_the_replica(self):
+        router = ReadReplicaRouter()
+        self.assertIsNone(router.db_for_read(MenuItem))
+        with replica_reads():
+            self.assertEqual(router.db_for_read(MenuItem), "replica")
+            self.assertEqual(router.db_for_read(Category), "replica")
+            self.assertIsNone(router.db_for_read(Cart))
+        with replica_reads(False):
+            self.assertIsNone(router.db_for_read(MenuItem))
+        self.assertFalse(router.allow_migrate("replica", "restaurant"))
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class CartConcurrencyTests(APITransactionTestCase):
+    # Committed data and one connection per thread, on the on-disk test database
+    threads = 8
+    items_per_thread = 5
+
+    def setUp(self):
+        clear_caches()
+        invalidate_roles()
+        customers = Group.objects.create(name="Customer")
+        category = Category.objects.create(slug="mains", title="Mains")
+        self.items = [
+            MenuItem.objects.create(title=f"Dish {i}", price=Decimal("5.00"), featured=False, category=category)
+            for i in range(self.items_per_thread)
+        ]
+        self.users = []
+        for i in range(self.threads):
+            user = User.objects.create_user(username=f"customer{i}", password="pass12345")
+            user.groups.add(customers)
+            self.users.append(user)
+
+    def fill_cart(self, user, statuses, errors):
+        client = APIClient()
+        client.force_authenticate(user=User.objects.get(pk=user.pk))
+        try:
+            for item in self.items:
+                response = client.post("/cart/", {
+                    "user": user.pk, "menuitem": item.pk, "quantity": 2,
+                    "unit_price": "5.00", "price": "10.00",
+                })
+                statuses.append(response.status_code)
+        except Exception as exc:
+            errors.append(exc)
+        finally:
+            connections.close_all()
+
+    def test_parallel_cart_writes_do_not_lock(self):
+        statuses, errors = [], []
+        workers = [
+            threading.Thread(target=self.fill_cart, args=(user, statuses, errors))
+            for user in self.users
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(statuses, [201] * self.threads * self.items_per_thread)
+        self.assertEqual(Cart.objects.count(), self.threads * self.items_per_thread)
+
+    def test_racing_adds_of_the_same_item_are_merged(self):
+        # Double taps: the same customer adds the same item at once
+        user = User.objects.get(pk=self.users[0].pk)
+        statuses = []
+
+        def add():
+            client = APIClient()
+            client.force_authenticate(user=user)
+            try:
+                statuses.append(client.post("/cart/", {"menuitem": self.items[0].pk, "quantity": 1}).status_code)
+            finally:
+                connections.close_all()
+
+        workers = [threading.Thread(target=add) for _ in range(5)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual(statuses, [201] * 5)
+        cart = Cart.objects.get()
+        self.assertEqual((cart.quantity, cart.price), (5, Decimal("25.00")))
+
+
+class StartupTests(SimpleTestCase):
+    def load_urls(self, **env):
+        # Loads the URL configuration in a fresh process and lists the
+        # optional pieces that got imported or routed
+        script = (
+            "import django, json, sys\n"
+            "django.setup()\n"
+            "from django.urls import Resolver404, get_resolver, resolve\n"
+            "get_resolver().url_patterns\n"
+            "routed = []\n"
+            "for url in ('/admin/', '/swagger/'):\n"
+            "    try:\n"
+            "        resolve(url)\n"
+            "        routed.append(url)\n"
+            "    except Resolver404:\n"
+            "        pass\n"
+            "print(json.dumps({'docs_imported': 'drf_yasg.views' in sys.modules, 'routed': routed}))\n"
+        )
+        result = subprocess.run(
+            [sys.executable, "-c", script], cwd=settings.BASE_DIR, capture_output=True, text=True, check=True,
+            env={**os.environ, "DJANGO_SETTINGS_MODULE": "littlelemon.settings", **env},
+        )
+        return json.loads(result.stdout)
+
+    def test_docs_are_imported_on_first_use(self):
+        self.assertEqual(self.load_urls(), {"docs_imported": False, "routed": ["/admin/", "/swagger/"]})
+
+    def test_admin_and_docs_can_be_disabled(self):
+        self.assertEqual(self.load_urls(ADMIN_ENABLED="0", API_DOCS_ENABLED="0"), {"docs_imported": False, "routed": []})
+
+
+class IdempotencyTests(RestaurantTestCase):
+    def setUp(self):
+        super().setUp()
+        self.soup = MenuItem.objects.create(title="Soup", price=Decimal("4.50"), featured=False, category=self.category)
+        self.login(self.customer)
+
+    def add_soup(self, key, quantity=1):
+        return self.client.post("/cart/", {"menuitem": self.soup.pk, "quantity": quantity}, headers={"Idempotency-Key": key})
+
+    def test_retries_replay_the_first_response(self):
+        first = self.add_soup("retry-1")
+        with CaptureQueriesContext(connection) as ctx:
+            second = self.add_soup("retry-1")
+        self.assertEqual((second.status_code, second.json()), (201, first.json()))
+        self.assertEqual(second["Idempotent-Replayed"], "true")
+        self.assertEqual(ctx.captured_queries, [])
+        self.assertEqual(Cart.objects.get(user=self.customer).quantity, 1)
+
+        # A new key is a new request
+        self.assertEqual(self.add_soup("retry-2").json()["quantity"], 2)
+
+    def test_key_reused_for_another_request(self):
+        self.add_soup("reused")
+        response = self.add_soup("reused", quantity=3)
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(Cart.objects.get(user=self.customer).quantity, 1)
+
+    def test_keys_are_per_user_and_failed_checks_are_not_stored(self):
+        self.login(self.crew)
+        self.assertEqual(self.add_soup("shared").status_code, 403)
+        self.login(self.customer)
+        self.assertEqual(self.add_soup("shared").status_code, 201)
+
+    def test_checkout_runs_once(self):
+        Cart.objects.create(user=self.customer, menuitem=self.soup, quantity=2, unit_price=Decimal("4.50"), price=Decimal("9.00"))
+        first = self.client.post("/orders/checkout/", headers={"Idempotency-Key": "checkout"})
+        second = self.client.post("/orders/checkout/", headers={"Idempotency-Key": "checkout"})
+        self.assertEqual((first.status_code, second.status_code), (201, 201))
+        self.assertEqual(second.json()["id"], first.data["id"])
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_duplicates_wait_for_the_request_in_flight(self):
+        first = claim(self.customer.pk, "in-flight", "fingerprint")
+        results = []
+
+        def duplicate():
+            try:
+                claim(self.customer.pk, "in-flight", "fingerprint")
+            except Replay as replay:
+                results.append(replay.response)
+
+        thread = threading.Thread(target=duplicate)
+        thread.start()
+        time.sleep(0.2)
+        self.assertEqual(results, [])
+        first.store(HttpResponse(b'{"id": 1}', status=201, content_type="application/json"))
+        thread.join(5)
+        self.assertEqual((results[0].status_code, results[0].content), (201, b'{"id": 1}'))
+
+        with override_settings(IDEMPOTENCY_WAIT=0):
+            claim(self.customer.pk, "stuck", "fingerprint")
+            with self.assertRaises(Replay) as raised:
+                claim(self.customer.pk, "stuck", "fingerprint")
+        self.assertEqual(raised.exception.response.status_code, 409)
@@ -0,0 +1,133 @@
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.connection import ConnectionProxy
+from rest_framework.throttling import AnonRateThrottle, SimpleRateThrottle, UserRateThrottle
+
+# Sliding window counter rate limiting.
+#
+# Each (scope, ident) pair keeps two integer counters in the cache: one for
+# the current fixed window and one for the previous window. The request rate
+# is estimated as
+#
+#     previous * (1 - elapsed / duration) + current
+#
+# so memory and work per request are constant, unlike DRF's default of a
+# list of every request timestamp in the window. Counting is a single
+# atomic cache increment, taken back when the request is rejected, which
+# makes limits exact across processes when the cache is shared (Redis), and
+# within one process on local memory.
+
+
+# Counters get their own cache so other cached data cannot evict them
+throttle_cache = ConnectionProxy(caches, getattr(settings, 'THROTTLE_CACHE_ALIAS', 'default'))
+
+
+def get_rate(scope):
+    # (requests, seconds) for a scope in DEFAULT_THROTTLE_RATES
+    rate = settings.REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'][scope]
+    return SimpleRateThrottle.parse_rate(None, rate)
+
+
+def window_keys(key, duration, now):
+    window = int(now // duration)
+    return window, f'{key}:{window}', f'{key}:{window - 1}'
+
+
+def get_wait(current, previous, num_requests, duration, now, window):
+    # Seconds until the estimated rate is back under the limit, or None
+    elapsed = now - window * duration
+    if previous * (1 - elapsed / duration) + current <= num_requests:
+        return None
+    if current > num_requests or not previous:
+        # Only the next window brings relief
+        return (window + 1) * duration - now
+    # The previous window's weight has to decay far enough
+    return max(duration * (1 - (num_requests - current) / previous) - elapsed, 0)
+
+
+def hit(key, num_requests, duration, cache=throttle_cache, now=None):
+    """
+    Counts a request against ``key``.
+
+    Returns the number of seconds to wait, or None if the request is allowed.
+    """
+    now = time.time() if now is None else now
+    window, current_key, previous_key = window_keys(key, duration, now)
+
+    if cache.add(current_key, 1, duration * 2):
+        current = 1
+    else:
+        try:
+            current = cache.incr(current_key)
+        except ValueError:
+            # Expired between add and incr
+            cache.set(current_key, 1, duration * 2)
+            current = 1
+    previous = cache.get(previous_key, 0)
+    wait = get_wait(current, previous, num_requests, duration, now, window)
+    if wait is not None:
+        # Rejected requests do not count, as with SimpleRateThrottle, so a
+        # client retrying in a loop is not locked out for good
+        try:
+            cache.decr(current_key)
+        except ValueError:
+            pass
+    return wait
+
+
+async def ahit(key, num_requests, duration, cache=throttle_cache, now=None):
+    now = time.time() if now is None else now
+    window, current_key, previous_key = window_keys(key, duration, now)
+
+    if await cache.aadd(current_key, 1, duration * 2):
+        current = 1
+    else:
+        try:
+            current = await cache.aincr(current_key)
+        except ValueError:
+            await cache.aset(current_key, 1, duration * 2)
+            current = 1
+    previous = await cache.aget(previous_key, 0)
+    wait = get_wait(current, previous, num_requests, duration, now, window)
+    if wait is not None:
+        try:
+            await cache.adecr(current_key)
+        except ValueError:
+            pass
+    return wait
+
+
+async def athrottle(scope, ident):
+    # Throttle check for async views; returns seconds to wait or None
+    num_requests, duration = get_rate(scope)
+    return await ahit(f'throttle:{scope}:{ident}', num_requests, duration)
+
+
+class SlidingWindowMixin:
+    # Replaces SimpleRateThrottle's timestamp history with sliding window counters
+    cache_format = 'throttle:%(scope)s:%(ident)s'
+    cache = throttle_cache
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        self.wait_seconds = hit(self.key, self.num_requests, self.duration, self.cache, self.timer())
+        return self.wait_seconds is None
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class SlidingWindowAnonRateThrottle(SlidingWindowMixin, AnonRateThrottle):
+    pass
+
+
+class SlidingWindowUserRateThrottle(SlidingWindowMixin, UserRateThrottle):
+    pass
@@ -1,54 +1,160 @@
 from django.contrib.auth.models import Group, User
-from rest_framework.decorators import api_view, permission_classes, action
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.decorators import api_view, authentication_classes, permission_classes, action
 from rest_framework.permissions import IsAuthenticated,IsAdminUser
 from rest_framework.response import Response
 from rest_framework import viewsets, status, filters
-from rest_framework.throttling import UserRateThrottle
 from django_filters.rest_framework import DjangoFilterBackend
-from .models import Category, MenuItem, Cart, Order
-from .serializers import CategorySerializer, MenuItemSerializer, CartSerializer, OrderSerializer
+from .models import Category, MenuItem, Cart, Order, ArchivedOrder, DailySales
+from .serializers import CategorySerializer, MenuItemSerializer, CartSerializer, OrderSerializer, ArchivedOrderSerializer
 from django.shortcuts import get_object_or_404
+from .authentication import RoleClaimsJWTAuthentication
+from .permissions import IsManager, IsDeliveryCrew, IsCustomer
+from .roles import DELIVERY_CREW, is_manager, is_delivery_crew
+from .checkout import MAX_TOTAL, CartTotalTooLargeError, EmptyCartError, checkout_cart
+from .carts import add_to_cart, set_cart
+from .dispatch import dispatch_pending_orders
+from .caching import MenuCacheMixin
+from .throttling import SlidingWindowUserRateThrottle
+from .bulk import import_menu_items
+from .parsers import CSVParser
+from .search import MenuSearchFilter, autocomplete
+from rest_framework.parsers import JSONParser
+from .prefetch import AutoPrefetchMixin, optimize_queryset
+from .fastpath import FastListMixin, compile_serializer
+from .idempotency import IdempotencyMixin
+from .pagination import KeysetPagination
+from .renderers import FastJSONRenderer
+from rest_framework.renderers import BrowsableAPIRenderer
+from .exports import iter_csv, iter_ndjson
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.utils.crypto import constant_time_compare
+from rest_framework.exceptions import AuthenticationFailed
 from rest_framework_simplejwt.authentication import JWTAuthentication
+from django.conf import settings
+from . import metrics
+from django.utils.dateparse import parse_date
+from django.db.models import F, Sum
 
 
 #Project done by Aayush Sapkota
 
 
+# Role claims from the token for the restaurant views; the project-wide
+# default stays JWTAuthentication, which loads the full User
+ROLE_AUTHENTICATION = [RoleClaimsJWTAuthentication, TokenAuthentication]
+
+
 # Custom Throttle Classes
-class BurstRateThrottle(UserRateThrottle):
+class BurstRateThrottle(SlidingWindowUserRateThrottle):
     scope = 'burst'
 
 
-class SustainedRateThrottle(UserRateThrottle):
+class SustainedRateThrottle(SlidingWindowUserRateThrottle):
     scope = 'sustained'
 
 
+def filter_date_range(queryset, query_params):
+    # Applies ?date_from= and ?date_to= (YYYY-MM-DD) to the date field.
+    # Returns the queryset and an error message, if any.
+    for param, lookup in (('date_from', 'date__gte'), ('date_to', 'date__lte')):
+        value = query_params.get(param)
+        if value:
+            try:
+                parsed = parse_date(value)
+            except ValueError:
+                parsed = None
+            if parsed is None:
+                return queryset, f"Invalid {param}, expected YYYY-MM-DD."
+            queryset = queryset.filter(**{lookup: parsed})
+    return queryset, None
+
+
 # Manager-only access
 @api_view(['GET'])
-@permission_classes([IsAuthenticated])
+@authentication_classes(ROLE_AUTHENTICATION)
+@permission_classes([IsAuthenticated, IsManager])
 def manager_view(request):
-    if request.user.groups.filter(name="Manager").exists():
-        return Response({"message": "Only Manager should see this."})
-    return Response({"error": "You are not authorized to view this."}, status=status.HTTP_403_FORBIDDEN)
+    return Response({"message": "Only Manager should see this."})
+
+
+# Sales analytics served from the DailySales rollup (Managers only)
+SALES_GROUPINGS = {
+    'day': (['date'], {}),
+    'menuitem': (['menuitem'], {'title': F('menuitem__title')}),
+    'category': ([], {'category': F('menuitem__category'), 'title': F('menuitem__category__title')}),
+}
+
+
+@api_view(['GET'])
+@authentication_classes(ROLE_AUTHENTICATION)
+@permission_classes([IsAuthenticated, IsManager])
+def sales_view(request):
+    # ?by=day|menuitem|category&date_from=YYYY-MM-DD&date_to=YYYY-MM-DD
+    grouping = SALES_GROUPINGS.get(request.query_params.get('by', 'day'))
+    if grouping is None:
+        return Response({"error": "by must be one of day, menuitem or category."}, status=status.HTTP_400_BAD_REQUEST)
+
+    queryset, error = filter_date_range(DailySales.objects.all(), request.query_params)
+    if error:
+        return Response({"error": error}, status=status.HTTP_400_BAD_REQUEST)
+
+    fields, expressions = grouping
+    rows = (
+        queryset.values(*fields, **expressions)
+        .annotate(
+            quantity=Sum('quantity'),
+            revenue=Sum('revenue'),
+            delivered_quantity=Sum('delivered_quantity'),
+            delivered_revenue=Sum('delivered_revenue'),
+        )
+        .order_by(*fields, *expressions)
+    )
+    return Response({"results": list(rows)})
+
+
+def can_read_metrics(request):
+    # Staff users, signed in or with an access token, and scrapers sending
+    # PERF_METRICS_TOKEN as a bearer token
+    token = getattr(settings, 'PERF_METRICS_TOKEN', None)
+    if token and constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return True
+    if request.user.is_staff:
+        return True
+    try:
+        # Loads the user, so is_staff and is_active are current
+        result = JWTAuthentication().authenticate(request)
+    except AuthenticationFailed:
+        return False
+    return result is not None and result[0].is_staff
+
+
+def metrics_view(request):
+    # Per-route request metrics in the Prometheus text format; a 404 for
+    # anyone can_read_metrics turns away, so the endpoint is not advertised
+    if not can_read_metrics(request):
+        raise Http404
+    return HttpResponse(metrics.registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
 
 
 # ViewSet for categories (open to all authenticated users)
-class CategoryViewSet(viewsets.ModelViewSet):
+class CategoryViewSet(MenuCacheMixin, AutoPrefetchMixin, viewsets.ModelViewSet):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
     permission_classes = [IsAuthenticated]
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [RoleClaimsJWTAuthentication]
     throttle_classes = [BurstRateThrottle, SustainedRateThrottle]  # Apply throttling
 
 
 # ViewSet for menu items (only Managers can modify)
-class MenuItemViewSet(viewsets.ModelViewSet):
+class MenuItemViewSet(MenuCacheMixin, FastListMixin, AutoPrefetchMixin, viewsets.ModelViewSet):
     queryset = MenuItem.objects.all()
     serializer_class = MenuItemSerializer
     permission_classes = [IsAuthenticated]
+    authentication_classes = ROLE_AUTHENTICATION
 
     # Add filtering/searching/sorting backends
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, MenuSearchFilter, filters.OrderingFilter]
     
     # Filtering fields
     filterset_fields = ['category', 'featured', 'price']
@@ -59,106 +165,232 @@ class MenuItemViewSet(viewsets.ModelViewSet):
     # Ordering fields
     ordering_fields = ['price', 'title']
 
+    # Ordering used by ?cursor= pagination when none is requested
+    keyset_ordering = ('price', 'id')
+
     # Apply throttling classes
     throttle_classes = [BurstRateThrottle, SustainedRateThrottle]
 
-    def create(self, request, *args, **kwargs):
-        if not request.user.groups.filter(name="Manager").exists():
-            return Response({"error": "Only Managers can add menu items."}, status=status.HTTP_403_FORBIDDEN)
-        return super().create(request, *args, **kwargs)
+    # orjson encoding for the hot list endpoints, same bytes as JSONRenderer
+    renderer_classes = [FastJSONRenderer, BrowsableAPIRenderer]
 
-    def update(self, request, *args, **kwargs):
-         if not request.user.groups.filter(name="Manager").exists():
-            return Response({"error": "Only Managers can update menu items."}, status=status.HTTP_403_FORBIDDEN)
-         return super().update(request, *args, **kwargs)
-
-    def destroy(self, request, *args, **kwargs):
-        if not request.user.groups.filter(name="Manager").exists():
-            return Response({"error": "Only Managers can delete menu items."}, status=status.HTTP_403_FORBIDDEN)
-        return super().destroy(request, *args, **kwargs)
-    
-    def partial_update(self, request, *args, **kwargs):
-        if not request.user.groups.filter(name="Manager").exists():
-            return Response({"error": "Only Managers can update menu items."}, status=status.HTTP_403_FORBIDDEN)
-        return super().partial_update(request, *args, **kwargs)
+    # Largest number of rows accepted by the bulk endpoint
+    bulk_max_rows = 5000
+
+    def get_permissions(self):
+        # Only Managers can modify menu items
+        if self.action in ('create', 'update', 'partial_update', 'destroy', 'bulk'):
+            return [IsAuthenticated(), IsManager()]
+        return super().get_permissions()
+
+    @action(detail=False, methods=['get'])
+    def autocomplete(self, request):
+        # Up to 10 best prefix matches for ?q=, for search boxes
+        matches = autocomplete(request.query_params.get('q', ''))
+        return Response([{"id": pk, "title": title} for pk, title in matches])
+
+    @action(detail=False, methods=['post'], parser_classes=[JSONParser, CSVParser])
+    def bulk(self, request):
+        # Create (no id) or update (with id) many menu items at once, as a
+        # JSON list or CSV with columns id,title,price,featured,category
+        rows = request.data
+        if not isinstance(rows, list):
+            return Response({"error": "Expected a list of menu items."}, status=status.HTTP_400_BAD_REQUEST)
+        if len(rows) > self.bulk_max_rows:
+            return Response({"error": f"At most {self.bulk_max_rows} rows per request."}, status=status.HTTP_400_BAD_REQUEST)
+
+        created, updated, errors = import_menu_items(rows)
+        if errors:
+            return Response({"errors": errors}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({"created": created, "updated": updated})
 
 
 # ViewSet for Cart (Only Customers can add items)
-class CartViewSet(viewsets.ModelViewSet):
+class CartViewSet(IdempotencyMixin, FastListMixin, AutoPrefetchMixin, viewsets.ModelViewSet):
     queryset = Cart.objects.all()
     serializer_class = CartSerializer
     permission_classes = [IsAuthenticated]
+    authentication_classes = ROLE_AUTHENTICATION
     
     # Apply throttling classes
     throttle_classes = [BurstRateThrottle]
 
+    # orjson encoding for the hot list endpoints, same bytes as JSONRenderer
+    renderer_classes = [FastJSONRenderer, BrowsableAPIRenderer]
+
+    # Largest number of lines accepted by the set cart endpoint
+    set_max_rows = 500
+
     def get_queryset(self):
         # Filter cart items by the logged-in user
-        return Cart.objects.filter(user=self.request.user)
-
-    def perform_create(self, serializer):
-        # Automatically associate the logged-in user with the cart item
-        serializer.save(user=self.request.user)
+        return Cart.objects.filter(user_id=self.request.user.pk)
 
     def create(self, request, *args, **kwargs):
-        if not request.user.groups.filter(name="Customer").exists():
-            return Response({"error": "Only Customers can add items to cart."}, status=status.HTTP_403_FORBIDDEN)
-        return super().create(request, *args, **kwargs)
+        # Adding an item that is already in the cart increases its quantity
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        cart = add_to_cart(request.user, data['menuitem'], data['quantity'], data.get('unit_price'))
+        return Response(self.get_serializer(cart).data, status=status.HTTP_201_CREATED)
+
+    def get_permissions(self):
+        if self.action in ('create', 'set_cart'):
+            return [IsAuthenticated(), IsCustomer()]
+        return super().get_permissions()
+
+    @action(detail=False, methods=['put'], url_path='set')
+    def set_cart(self, request):
+        # Replace the whole cart with a list of {menuitem, quantity[, unit_price]}
+        if not isinstance(request.data, list):
+            return Response({"error": "Expected a list of cart items."}, status=status.HTTP_400_BAD_REQUEST)
+        if len(request.data) > self.set_max_rows:
+            return Response({"error": f"At most {self.set_max_rows} items per request."}, status=status.HTTP_400_BAD_REQUEST)
+        errors = set_cart(request.user, request.data)
+        if errors:
+            return Response({"errors": errors}, status=status.HTTP_400_BAD_REQUEST)
+        cart = optimize_queryset(self.get_queryset().order_by('pk'), self.get_serializer_class())
+        return Response(self.get_serializer(cart, many=True).data)
 
 
 # ViewSet for Orders (Only Delivery Crew can update)
-class OrderViewSet(viewsets.ModelViewSet):
+class OrderViewSet(IdempotencyMixin, FastListMixin, AutoPrefetchMixin, viewsets.ModelViewSet):
     queryset = Order.objects.all()
     serializer_class = OrderSerializer
     permission_classes = [IsAuthenticated]
+    authentication_classes = ROLE_AUTHENTICATION
+
+    # Filtering and ordering, newest orders first by default
+    filterset_fields = ['status', 'date']
+    ordering_fields = ['date', 'status']
+    ordering = ['-date', '-id']
+
+    # Ordering used by ?cursor= pagination when none is requested
+    keyset_ordering = ('-date', '-id')
     
     # Apply throttling classes
     throttle_classes = [BurstRateThrottle]
 
+    # orjson encoding for the hot list endpoints, same bytes as JSONRenderer
+    renderer_classes = [FastJSONRenderer, BrowsableAPIRenderer]
+
     def get_queryset(self):
+        return self.visible(Order.objects.all())
+
+    def visible(self, queryset):
+        # Narrows live or archived orders down to what the user may see
         user = self.request.user
 
         # Managers can see all orders
-        if user.groups.filter(name="Manager").exists():
-            return Order.objects.all()
+        if is_manager(user):
+            return queryset
 
         # Delivery Crew can see only their assigned orders
-        elif user.groups.filter(name="Delivery Crew").exists():
-            return Order.objects.filter(delivery_crew=user)
+        elif is_delivery_crew(user):
+            return queryset.filter(delivery_crew_id=user.pk)
 
         # Customers can see only their own orders
         else:
-            return Order.objects.filter(user=user)
+            return queryset.filter(user_id=user.pk)
+
+    def list(self, request, *args, **kwargs):
+        if request.query_params.get('include_archived', '').lower() in ('1', 'true', 'yes'):
+            return self.list_with_archive(request)
+        return super().list(request, *args, **kwargs)
+
+    def list_with_archive(self, request):
+        # Live and archived orders merged newest first (oldest first with
+        # ?ordering=date), always cursor paginated since page numbers
+        # cannot be split between the two tables
+        ordering = ('date', 'id') if request.query_params.get('ordering') == 'date' else ('-date', '-id')
+        sources = [
+            (compile_serializer(OrderSerializer), self.get_queryset()),
+            (compile_serializer(ArchivedOrderSerializer), self.visible(ArchivedOrder.objects.all())),
+        ]
+        paginator = KeysetPagination(self.paginator.get_page_size(request))
+        rows = paginator.paginate_merged(
+            [compiled.values(self.filter_queryset(queryset)) for compiled, queryset in sources], request, ordering,
+        )
+        data = [None] * len(rows)
+        for index, (compiled, _) in enumerate(sources):
+            positions = [position for position, (source, _) in enumerate(rows) if source == index]
+            for position, item in zip(positions, compiled.represent([rows[position][1] for position in positions])):
+                data[position] = item
+        return paginator.get_paginated_response(data)
 
     def perform_create(self, serializer):
         # Automatically associate the logged-in user with the order
         serializer.save(user=self.request.user)
 
-    def update(self, request, *args, **kwargs):
-        order = self.get_object()
-
-        # Only Delivery Crew can update the status
-        if request.user.groups.filter(name="Delivery Crew").exists():
-            # Delivery crew can only update the status
-            serializer = self.get_serializer(order, data=request.data, partial=True)
-            serializer.is_valid(raise_exception=True)
-            serializer.save()
-            return Response(serializer.data)
-
-        # Only Managers can assign a delivery crew
-        elif request.user.groups.filter(name="Manager").exists():
-            # Managers can only assign delivery crew
-             serializer = self.get_serializer(order, data=request.data, partial=True)
-             serializer.is_valid(raise_exception=True)
-             serializer.save()
-             return Response(serializer.data)
+    def get_permissions(self):
+        # Delivery Crew update the status, Managers assign a delivery crew
+        if self.action in ('update', 'partial_update'):
+            return [IsAuthenticated(), (IsDeliveryCrew | IsManager)()]
+        # Only Managers can delete orders
+        if self.action == 'destroy':
+            return [IsAuthenticated(), IsManager()]
+        if self.action == 'checkout':
+            return [IsAuthenticated(), IsCustomer()]
+        if self.action == 'dispatch_orders':
+            return [IsAuthenticated(), IsManager()]
+        return super().get_permissions()
+
+    @action(detail=False, methods=['post'])
+    def checkout(self, request):
+        # Place an order from everything in the user's cart
+        try:
+            order = checkout_cart(request.user)
+        except EmptyCartError:
+            return Response({"error": "Your cart is empty."}, status=status.HTTP_400_BAD_REQUEST)
+        except CartTotalTooLargeError:
+            return Response(
+                {"error": f"An order must total less than {MAX_TOTAL}; split the cart into several orders."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        # Reload with the order items eager loaded for the response
+        order = optimize_queryset(Order.objects.filter(pk=order.pk), self.get_serializer_class()).get()
+        serializer = self.get_serializer(order)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    @action(detail=False, methods=['post'], url_path='dispatch')
+    def dispatch_orders(self, request):
+        # Assign every pending, unassigned order (or the oldest ?limit=N) to
+        # the least loaded delivery crew member
+        limit = request.query_params.get('limit')
+        if limit is not None and (not limit.isdigit() or int(limit) == 0):
+            return Response({"error": "limit must be a positive integer."}, status=status.HTTP_400_BAD_REQUEST)
+        assignments = dispatch_pending_orders(int(limit) if limit else None)
+        return Response({
+            "assigned": len(assignments),
+            "assignments": [{"order": order_id, "delivery_crew": crew_id} for order_id, crew_id in assignments],
+        })
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        # Stream the visible orders as NDJSON (default) or CSV.
+        # Optional filters: ?date_from=YYYY-MM-DD&date_to=YYYY-MM-DD&status=true
+        queryset, error = filter_date_range(self.get_queryset(), request.query_params)
+        if error:
+            return Response({"error": error}, status=status.HTTP_400_BAD_REQUEST)
+
+        order_status = request.query_params.get('status')
+        if order_status:
+            if order_status.lower() not in ('true', 'false', '1', '0'):
+                return Response({"error": "Invalid status, expected true or false."}, status=status.HTTP_400_BAD_REQUEST)
+            queryset = queryset.filter(status=order_status.lower() in ('true', '1'))
+
+        if request.query_params.get('output') == 'csv':
+            response = StreamingHttpResponse(iter_csv(queryset), content_type='text/csv')
+            response['Content-Disposition'] = 'attachment; filename="orders.csv"'
         else:
-            return Response({"error": "You are not authorized to update orders."}, status=status.HTTP_403_FORBIDDEN)
+            response = StreamingHttpResponse(iter_ndjson(queryset), content_type='application/x-ndjson')
+        return response
 
-    def destroy(self, request, *args, **kwargs):
-        if not request.user.groups.filter(name="Manager").exists():
-            return Response({"error": "Only Managers can delete orders."}, status=status.HTTP_403_FORBIDDEN)
-        return super().destroy(request, *args, **kwargs)
+    def update(self, request, *args, **kwargs):
+        order = self.get_object()
+        serializer = self.get_serializer(order, data=request.data, partial=True)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return Response(serializer.data)
 
 from rest_framework.decorators import action
 from rest_framework.response import Response
@@ -168,12 +400,17 @@ from django.shortcuts import get_object_or_404
 
 class UserViewSet(viewsets.ViewSet):
     permission_classes = [IsAuthenticated]
+    authentication_classes = ROLE_AUTHENTICATION
+
+    def get_permissions(self):
+        if self.action == 'assign_to_delivery_crew':
+            return [IsAuthenticated(), IsManager()]
+        return super().get_permissions()
 
     @action(detail=True, methods=['post'])
     def assign_to_delivery_crew(self, request, pk=None):
-        if not request.user.groups.filter(name="Manager").exists():
-            return Response({"error": "Only Managers can assign users to delivery crew."}, status=status.HTTP_403_FORBIDDEN)
+        # Role cache is invalidated by the m2m_changed signal on user.groups
         user = get_object_or_404(User, pk=pk)
-        delivery_crew_group = Group.objects.get(name="Delivery Crew")
+        delivery_crew_group = Group.objects.get(name=DELIVERY_CREW)
         user.groups.add(delivery_crew_group)
         return Response({"message": f"User {user.username} assigned to Delivery Crew."}, status=status.HTTP_200_OK)